@@ -0,0 +1,77 @@
+# Time back-adjusting cached prices for new dividends: PriceHistory._applyNewEvents()
+# vs per-dividend mask loop it replaced. Table is 40 years of 1d prices, with
+# 160 quarterly dividends fetched after prices.
+#
+# Run with: python -m benchmarks.bench_apply_events
+
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .context import yfc_cache_manager as yfcm
+from .context import yfc_dat as yfcd
+from .context import yfc_prices_manager as yfcp
+from .utils import make_price_history, time_fn
+
+
+def make_dividends(h, n):
+    dts = h.index[::len(h)//n][1:n+1]
+    divs = pd.DataFrame(index=dts)
+    divs["Dividends"] = 0.2
+    divs["Back Adj."] = 0.995
+    divs["FetchDate"] = h["FetchDate"].max() + pd.Timedelta("1h")
+    divs["Superseded div"] = 0.0
+    divs["Superseded back adj."] = 0.0
+    divs["Superseded div FetchDate"] = pd.NaT
+    return divs
+
+
+def apply_loop(h, divs):
+    # Old implementation: mask & .loc multiply per dividend
+    h = h.copy()
+    LastDivAdjustDt_new = h["LastDivAdjustDt"].copy()
+    for dt in divs.index:
+        div = divs.loc[dt]
+        f = (h.index < dt) & (h["LastDivAdjustDt"] < div["FetchDate"])
+        if f.any():
+            h.loc[f, "CDF"] *= div["Back Adj."]
+            LastDivAdjustDt_new[f] = np.maximum(LastDivAdjustDt_new[f], div["FetchDate"])
+    h["LastDivAdjustDt"] = LastDivAdjustDt_new
+    return h
+
+
+def main():
+    with tempfile.TemporaryDirectory() as d:
+        yfcm.SetCacheDirpath(d)
+        tkr = "BENCH"
+        print(f"{'last adjusts':>12} {'loop ms':>9} {'vector ms':>9} {'speedup':>8}")
+        for n_groups in [1, 40, 10000]:
+            h = make_price_history("1d", 40*252)
+            # Rows last adjusted in 'n_groups' batches
+            la = h["LastDivAdjustDt"].max() - pd.to_timedelta(np.arange(len(h)) * n_groups // len(h), unit="h")
+            h["LastDivAdjustDt"] = la.to_numpy()
+            divs = make_dividends(h, 160)
+            yfcm.StoreCacheDatum(tkr, "history-1d", h)
+            hm = yfcp.HistoriesManager(tkr, "NMS", "America/New_York", None, None)
+            events = hm.GetHistory("Events")
+            events.divs = divs
+            ph = hm.GetHistory(yfcd.Interval.Days1)
+
+            def apply_vector():
+                ph.h = h.copy()
+                ph._events_version = None
+                ph._applyNewEvents()
+
+            result = {}
+            t_loop = time_fn(lambda: result.update(expected=apply_loop(h, divs)), repeats=1)
+            t_vec = time_fn(apply_vector, repeats=3)
+            expected = result["expected"]
+            if not np.allclose(ph.h["CDF"].to_numpy(), expected["CDF"].to_numpy(), rtol=1e-12):
+                raise Exception("loop & vector disagree")
+            print(f"{n_groups:>12} {t_loop*1000:>9.1f} {t_vec*1000:>9.1f} {t_loop/t_vec:>7.1f}x")
+            yfcm.StoreCacheDatum(tkr, "history-1d", None)
+
+
+if __name__ == '__main__':
+    main()
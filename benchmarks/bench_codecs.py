@@ -0,0 +1,50 @@
+# Compare size & decode time of cached objects under each compression codec.
+# 'load ms' is full read from disk, in-memory cache disabled.
+#
+# Run with: python -m benchmarks.bench_codecs
+
+import tempfile
+
+import exchange_calendars as xcal
+
+from .context import yfc_cache_manager as yfcm
+from .utils import make_price_history, time_fn
+
+
+def make_objects():
+    objs = []
+    for interval, n in [("1d", 10000), ("5m", 60*78), ("1m", 30*390)]:
+        objs.append(("history-"+interval, make_price_history(interval, n)))
+    objs.append(("cal", xcal.get_calendar("XNYS", start="2000-01-01")))
+    info = {f"key{i}": (f"value {i}" if i % 2 else float(i)) for i in range(150)}
+    objs.append(("info", info))
+    return objs
+
+
+def main():
+    codecs = ["none", "zlib"]
+    for c in ["lz4", "zstd"]:
+        try:
+            yfcm._ImportCodec(c)
+            codecs.append(c)
+        except Exception:
+            print(f"Codec '{c}' not installed, skipping")
+
+    with tempfile.TemporaryDirectory() as d:
+        yfcm.SetCacheDirpath(d)
+        yfcm._option_manager.cache.memory_budget_mb = 0
+        tkr = "BENCH"
+        print(f"{'object':>12} {'codec':>6} {'save ms':>9} {'load ms':>9} {'size KB':>9}")
+        for key, obj in make_objects():
+            for codec in codecs:
+                yfcm._option_manager.cache.codec = codec
+                t_save = time_fn(lambda: yfcm.StoreCacheDatum(tkr, key, obj))
+                t_load = time_fn(lambda: yfcm.ReadCacheDatum(tkr, key))
+                fp = yfcm.GetFilepath(tkr, key)
+                size = yfcm._GetStore().getsize(fp)
+                print(f"{key:>12} {codec:>6} {t_save*1000:>9.2f} {t_load*1000:>9.2f} {size/1024:>9.1f}")
+                yfcm.StoreCacheDatum(tkr, key, None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Compare expiry check of non-final price rows: per-row IsPriceDatapointExpired()
+# loop vs IsPriceDatapointExpired_batch(). Table is one day of 1m rows.
+#
+# Run with: python -m benchmarks.bench_expiry
+
+from datetime import timedelta
+
+import numpy as np
+
+from .context import yfc_dat as yfcd
+from .context import yfc_time as yfct
+from .utils import make_price_history, time_fn
+
+
+def main():
+    exchange = "NMS"
+    yfct.SetExchangeTzName(exchange, "America/New_York")
+    interval = yfcd.Interval.Mins1
+    max_age = timedelta(seconds=30)
+    yf_lag = timedelta(0)
+
+    h = make_price_history("1m", 390)
+    starts = np.array([dt.to_pydatetime() for dt in h.index])
+    fetch_dts = h.index + timedelta(minutes=2)
+    repaired = np.full(len(h), False)
+    dt_now = h.index[-1] + timedelta(hours=1)
+
+    def loop():
+        return np.array([yfct.IsPriceDatapointExpired(starts[i], fetch_dts[i].to_pydatetime(), False, max_age, exchange, interval, yf_lag=yf_lag, dt_now=dt_now)
+                         for i in range(len(starts))])
+
+    def batch():
+        return yfct.IsPriceDatapointExpired_batch(starts, fetch_dts, repaired, max_age, exchange, interval, yf_lag=yf_lag, dt_now=dt_now)
+
+    if not np.array_equal(loop(), batch()):
+        raise Exception("loop & batch disagree")
+
+    t_loop = time_fn(loop, repeats=3)
+    t_batch = time_fn(batch, repeats=3)
+    print(f"{'method':>6} {'rows':>6} {'ms':>9}")
+    print(f"{'loop':>6} {len(starts):>6} {t_loop*1000:>9.1f}")
+    print(f"{'batch':>6} {len(starts):>6} {t_batch*1000:>9.1f}")
+    print(f"speedup = {t_loop/t_batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
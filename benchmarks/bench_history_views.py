@@ -0,0 +1,62 @@
+# Time repeated identical Ticker.history() calls, with cached adjusted view
+# vs re-adjusting on every call, and returning view itself with copy=False.
+# Also time re-adjusting only 'Close' column. Table is 10 years of 1d prices.
+#
+# Run with: python -m benchmarks.bench_history_views
+
+import tempfile
+
+from .context import yfc_cache_manager as yfcm
+from .context import yfc_dat as yfcd
+from .context import yfc_ticker as yfc
+from .utils import make_price_history, time_fn
+
+
+def main():
+    with tempfile.TemporaryDirectory() as d:
+        yfcm.SetCacheDirpath(d)
+        tkr = "BENCH"
+        h = make_price_history("1d", 10*252)
+        yfcm.StoreCacheDatum(tkr, "history-1d", h)
+        dat = yfc.Ticker(tkr)
+        dat._exchange = "NMS"
+        dat._tz = "America/New_York"
+        start = h.index[0].date()
+        end = h.index[-1].date()
+
+        def history():
+            return dat.history(start=start, end=end, adjust_splits=True, adjust_divs=True, rounding=True)
+
+        hist = history()
+        hm = dat._histories_manager
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+
+        def history_no_view():
+            ph._views = {}
+            return history()
+
+        def history_no_copy():
+            return dat.history(start=start, end=end, adjust_splits=True, adjust_divs=True, rounding=True, copy=False)
+
+        def history_close_no_view():
+            ph._views = {}
+            return dat.history(start=start, end=end, adjust_splits=True, adjust_divs=True, rounding=True, columns=["Close"])
+
+        t_view = time_fn(history, repeats=20)
+        t_no_view = time_fn(history_no_view, repeats=20)
+        ph._views = {}
+        history_no_copy()
+        t_no_copy = time_fn(history_no_copy, repeats=20)
+        t_close = time_fn(history_close_no_view, repeats=20)
+        if not hist.equals(history()):
+            raise Exception("view differs")
+        print(f"{'method':>8} {'rows':>6} {'ms':>7}")
+        print(f"{'adjust':>8} {len(hist):>6} {t_no_view*1000:>7.2f}")
+        print(f"{'view':>8} {len(hist):>6} {t_view*1000:>7.2f}")
+        print(f"{'no copy':>8} {len(hist):>6} {t_no_copy*1000:>7.2f}")
+        print(f"{'Close':>8} {len(hist):>6} {t_close*1000:>7.2f}")
+        print(f"speedup = {t_no_view/t_view:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# Compare load & save times of price histories in each cache format.
+# 'load ms' includes reading the first row, so for memory-mapped Arrow
+# it measures time-to-first-row. In-memory cache disabled.
+#
+# Run with: python -m benchmarks.bench_price_storage
+
+import os
+import tempfile
+
+from .context import yfc_cache_manager as yfcm
+from .utils import make_price_history, time_fn
+
+
+# (interval, #rows): 1d "max" ~ 40 years, 1m/5m = Yahoo max lookback
+cases = [("1d", 10000), ("5m", 60*78), ("1m", 30*390)]
+
+
+def main():
+    formats = [("pickle", "pickle", False)]
+    try:
+        import pyarrow  # noqa: F401
+        formats += [("parquet", "parquet", False), ("arrow", "arrow", False), ("arrow+mmap", "arrow", True)]
+    except ImportError:
+        print("Install Python module 'pyarrow' to benchmark columnar formats")
+
+    with tempfile.TemporaryDirectory() as d:
+        yfcm.SetCacheDirpath(d)
+        yfcm._option_manager.cache.memory_budget_mb = 0
+        tkr = "BENCH"
+        print(f"{'interval':>8} {'rows':>6} {'format':>10} {'save ms':>9} {'load ms':>9} {'size KB':>9}")
+        for interval, n in cases:
+            h = make_price_history(interval, n)
+            key = "history-"+interval
+            for label, fmt, mmap in formats:
+                yfcm._option_manager.cache.price_format = fmt
+                yfcm._option_manager.cache.mmap = mmap
+                t_save = time_fn(lambda: yfcm.StoreCacheDatum(tkr, key, h))
+                t_load = time_fn(lambda: yfcm.ReadCacheDatum(tkr, key).iloc[0])
+                size = os.path.getsize(yfcm.GetFilepath(tkr, key))
+                print(f"{interval:>8} {h.shape[0]:>6} {label:>10} {t_save*1000:>9.2f} {t_load*1000:>9.2f} {size/1024:>9.1f}")
+                yfcm.StoreCacheDatum(tkr, key, None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+_parent_dp = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_src_dp = _parent_dp
+sys.path.insert(0, _src_dp)
+
+from yfinance_cache import yfc_cache_manager, yfc_dat, yfc_prices_manager, yfc_ticker, yfc_time, yfc_utils
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from zoneinfo import ZoneInfo
+from time import perf_counter
+
+
+def make_price_history(interval="1d", n=10000, tz_name="America/New_York", seed=0):
+    # Synthetic table with same columns & dtypes as a cached YFC price history
+    tz = ZoneInfo(tz_name)
+    rng = np.random.default_rng(seed)
+    if interval in ["1d", "5d", "1wk", "1mo", "3mo"]:
+        freq = {"1d": "B", "5d": "W-MON", "1wk": "W-MON", "1mo": "MS", "3mo": "QS"}[interval]
+        idx = pd.date_range(end="2024-03-28", periods=n, freq=freq, tz=tz)
+    else:
+        itd = pd.Timedelta(interval.replace("m", "min"))
+        per_day = int(pd.Timedelta("390min") / itd)
+        days = pd.date_range(end="2024-03-28", periods=n//per_day+1, freq="B")
+        idx = pd.DatetimeIndex([d + pd.Timedelta(hours=9, minutes=30) + i*itd for d in days for i in range(per_day)])
+        idx = idx[-n:].tz_localize(tz)
+    n = len(idx)
+
+    close = 20.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    df = pd.DataFrame(index=idx)
+    df["Open"] = close * (1 + rng.normal(0, 0.002, n))
+    df["High"] = np.maximum(df["Open"], close) * 1.005
+    df["Low"] = np.minimum(df["Open"], close) * 0.995
+    df["Close"] = close
+    df["Volume"] = rng.integers(1e4, 1e7, n)
+    df["Dividends"] = 0.0
+    df["Stock Splits"] = 0.0
+    df["Final?"] = True
+    df["C-Check?"] = True
+    df["Repaired?"] = False
+    df["FetchDate"] = (df.index + pd.Timedelta("1D")).tz_convert(ZoneInfo("UTC")).tz_convert(tz)
+    df["CSF"] = 1.0
+    df["CDF"] = 1.0
+    df["LastDivAdjustDt"] = df["FetchDate"].max()
+    df["LastSplitAdjustDt"] = df["FetchDate"].max()
+    return df
+
+
+def time_fn(fn, repeats=5):
+    # Return best-of-N wall time in seconds
+    best = None
+    for i in range(repeats):
+        t0 = perf_counter()
+        fn()
+        t = perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best
@@ -6,7 +6,7 @@ _main() (
 
 	set -e
 	
-	TESTS=(cache datetime-assumptions utils time_utils)
+	TESTS=(cache datetime-assumptions utils time_utils yfc_multi)
 	for T in "${TESTS[@]}" ; do
 		echo "Running tests in tests/$T ..."
 		python -m tests.test_$T
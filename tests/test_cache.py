@@ -3,9 +3,15 @@ import unittest
 from .context import yfc_cache_manager as yfcm
 from .context import yfc_dat as yfcd
 from .context import yfc_utils as yfcu
+from .context import yfc_prices_manager as yfcp
+from .context import yfc_upgrade as yfcup
+from .utils import make_price_history
 
-import os, shutil, tempfile
-import json, pickle
+import os, shutil, tempfile, tarfile, io
+import json, pickle, hashlib, sqlite3
+import multiprocessing, threading
+import numpy as np
+import pandas as pd
 
 from time import sleep
 from datetime import datetime, date, time, timedelta
@@ -13,6 +19,37 @@ from zoneinfo import ZoneInfo
 
 from pprint import pprint
 
+try:
+    import pyarrow
+    have_pyarrow = True
+except ImportError:
+    have_pyarrow = False
+
+
+def _store_objects(cache_dp, ticker, names):
+    # Worker process for concurrent write tests
+    yfcm.SetCacheDirpath(cache_dp)
+    for n in names:
+        yfcm.StoreCacheDatum(ticker, n, 1, metadata={"k": n})
+
+
+def _read_objects(args):
+    # Pool worker for concurrent access log tests
+    cache_dp, ticker, names = args
+    yfcm.SetCacheDirpath(cache_dp)
+    for n in names:
+        yfcm.ReadCacheDatum(ticker, n)
+        yfcm._FlushAccessLog()
+
+
+def _store_same_object(args):
+    # Pool worker for concurrent write tests
+    cache_dp, ticker, i = args
+    yfcm.SetCacheDirpath(cache_dp)
+    for j in range(200):
+        yfcm.StoreCacheDatum(ticker, "tz", i*1000+j)
+
+
 class Test_Yfc_Cache(unittest.TestCase):
 
     def setUp(self):
@@ -137,9 +174,7 @@ class Test_Yfc_Cache(unittest.TestCase):
         # sleep(2)
         obj = yfcm.ReadCachePackedDatum(self.ticker, var)
         self.assertIsNone(obj)
-        with open(fp, 'rb') as inData:
-            pkl = pickle.load(inData)
-            self.assertFalse(self.ticker in pkl.keys())
+        self.assertNotIn(var, yfcm._ListPackedMembers(fp))
 
 
     def test_cache_store_types(self):
@@ -250,5 +285,771 @@ class Test_Yfc_Cache(unittest.TestCase):
         self.assertEqual(obj, value)
         self.assertEqual(mdc, {key:val2})
 
+
+    @unittest.skipUnless(have_pyarrow, "requires pyarrow")
+    def test_cache_price_format_columnar(self):
+        h = make_price_history()
+        md = {"k1": 123}
+        exp = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC")) + timedelta(hours=1)
+        for fmt in ["parquet", "arrow"]:
+            yfcm._option_manager.cache.price_format = fmt
+            yfcm.StoreCacheDatum(self.ticker, "history-1d", h, expiry=exp, metadata=md)
+
+            fp = os.path.join(yfcm.GetCacheDirpath(), self.ticker, "history-1d."+fmt)
+            self.assertTrue(os.path.isfile(fp))
+            self.assertEqual(yfcm.GetFilepath(self.ticker, "history-1d"), fp)
+
+            obj, mdc = yfcm.ReadCacheDatum(self.ticker, "history-1d", return_metadata_too=True)
+            pd.testing.assert_frame_equal(obj, h, check_freq=False)
+            self.assertIsInstance(obj.index.tz, ZoneInfo)
+            self.assertIsInstance(obj["FetchDate"].dt.tz, ZoneInfo)
+            self.assertEqual(mdc, {"k1": 123, "__expiry__": exp})
+
+    def test_cache_read_columns(self):
+        h = make_price_history()
+        md = {"k1": 123}
+        exp = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC")) + timedelta(hours=1)
+        cols = ["Close", "FetchDate"]
+        fmts = [("pickle", False)]
+        if have_pyarrow:
+            fmts += [("parquet", False), ("arrow", False), ("arrow", True)]
+        for fmt, mmap in fmts:
+            yfcm._option_manager.cache.price_format = fmt
+            yfcm._option_manager.cache.mmap = mmap
+            yfcm.StoreCacheDatum(self.ticker, "history-1d", h, expiry=exp, metadata=md)
+            yfcm._MemCacheInvalidate(yfcm.GetFilepath(self.ticker, "history-1d"))
+            for i in range(2):
+                # From file, then from memory cache
+                obj, mdc = yfcm.ReadCacheDatum(self.ticker, "history-1d", return_metadata_too=True, columns=cols)
+                pd.testing.assert_frame_equal(obj, h[cols], check_freq=False)
+                self.assertIsInstance(obj["FetchDate"].dt.tz, ZoneInfo)
+                self.assertEqual(mdc, {"k1": 123, "__expiry__": exp})
+                yfcm.ReadCacheDatum(self.ticker, "history-1d")
+            with self.assertRaises(KeyError):
+                yfcm._MemCacheInvalidate(yfcm.GetFilepath(self.ticker, "history-1d"))
+                yfcm.ReadCacheDatum(self.ticker, "history-1d", columns=["Adj Close"])
+
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 1)
+        with self.assertRaises(ValueError):
+            yfcm.ReadCacheDatum(self.ticker, self.objName, columns=cols)
+
+    @unittest.skipUnless(have_pyarrow, "requires pyarrow")
+    def test_cache_price_format_switch(self):
+        h = make_price_history()
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h, metadata={"k1": 1})
+        fp_pkl = os.path.join(yfcm.GetCacheDirpath(), self.ticker, "history-1d.pkl")
+        self.assertTrue(os.path.isfile(fp_pkl))
+
+        # Next write migrates file, and preserves metadata
+        yfcm._option_manager.cache.price_format = "parquet"
+        obj = yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        pd.testing.assert_frame_equal(obj, h, check_freq=False)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        self.assertFalse(os.path.isfile(fp_pkl))
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, "history-1d", "k1"), 1)
+
+        # Non-price objects unaffected
+        yfcm.StoreCacheDatum(self.ticker, "dividends", h[["Dividends"]])
+        self.assertTrue(os.path.isfile(os.path.join(yfcm.GetCacheDirpath(), self.ticker, "dividends.pkl")))
+
+    @unittest.skipUnless(have_pyarrow, "requires pyarrow")
+    def test_cache_price_mmap(self):
+        h = make_price_history()
+        yfcm._option_manager.cache.price_format = "arrow"
+        yfcm._option_manager.cache.mmap = True
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        self.assertTrue(yfcm.IsDatumMemoryMapped(self.ticker, "history-1d"))
+
+        obj = yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        pd.testing.assert_frame_equal(obj, h, check_freq=False)
+        self.assertFalse(obj["Close"].to_numpy().flags.writeable)
+
+        # Rewriting file must not disturb the mapped DataFrame
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h.iloc[:5])
+        pd.testing.assert_frame_equal(obj, h, check_freq=False)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "history-1d").shape[0], 5)
+
+        # PriceHistory copies before modifying
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = yfcp.HistoriesManager(self.ticker, "NMS", "America/New_York", None, None)
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        self.assertTrue(ph._h_mapped)
+        ph._ensureCachedPricesWritable()
+        self.assertFalse(ph._h_mapped)
+        ph.h.loc[ph.h.index[0], "CSF"] = 0.5
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "history-1d")["CSF"].iloc[0], 1.0)
+
+    def test_cache_segments(self):
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h = make_price_history(10)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h, metadata={"k1": 1})
+        fp = yfcm.GetFilepath(self.ticker, "history-1d")
+
+        # Modify last row, append a row, delete first row
+        h2 = h.copy()
+        h2.loc[h2.index[-1], "Close"] = 99.0
+        h2 = pd.concat([h2, make_price_history(11).iloc[-1:]])
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h2.iloc[-2:], h2.index[:1])
+        h2 = h2.iloc[1:]
+        self.assertEqual(len(yfcm._ListSegments(fp)), 1)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h2, check_freq=False)
+
+        # Later segment can restore a deleted row
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h.iloc[:1])
+        h2 = pd.concat([h.iloc[:1], h2])
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h2, check_freq=False)
+
+        # Compact
+        yfcm.CompactCacheDatum(self.ticker, "history-1d")
+        self.assertEqual(len(yfcm._ListSegments(fp)), 0)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h2, check_freq=False)
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, "history-1d", "k1"), 1)
+
+    def test_cache_segments_price_history(self):
+        yfcm._option_manager.cache.price_segments = True
+        yfcm._option_manager.cache.segment_max_count = 3
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h = make_price_history(50)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        fp = yfcm.GetFilepath(self.ticker, "history-1d")
+        fp_mtime = os.path.getmtime(fp)
+        hm = yfcp.HistoriesManager(self.ticker, "NMS", "America/New_York", None, None)
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+
+        # Unchanged table = no write
+        ph._updatedCachedPrices(h.copy())
+        self.assertEqual(len(yfcm._ListSegments(fp)), 0)
+
+        # Small change = segment
+        h = h.copy()
+        h.loc[h.index[-1], "Close"] = 99.0
+        ph._updatedCachedPrices(h)
+        self.assertEqual(len(yfcm._ListSegments(fp)), 1)
+        self.assertEqual(os.path.getmtime(fp), fp_mtime)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+
+        # Count threshold triggers compaction
+        for i in range(2):
+            h = h.copy()
+            h.loc[h.index[i], "Close"] = 50.0
+            ph._updatedCachedPrices(h)
+        self.assertEqual(len(yfcm._ListSegments(fp)), 0)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+
+        # Big change = full write
+        h = h.copy()
+        h["CDF"] = 0.9
+        ph._updatedCachedPrices(h)
+        self.assertEqual(len(yfcm._ListSegments(fp)), 0)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+
+    def test_cache_price_format_invalid(self):
+        with self.assertRaises(ValueError):
+            yfcm._option_manager.cache.price_format = "csv"
+
+    def test_cache_memory(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        fp = yfcm.GetFilepath(self.ticker, "history-1d")
+
+        # Second read served from memory, and returns independent copy
+        h1 = yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        self.assertIn(fp, yfcm._mem_cache)
+        h1["Close"] = 0.0
+        h2 = yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        pd.testing.assert_frame_equal(h2, h, check_freq=False)
+
+        # Write invalidates
+        h3 = h.copy()
+        h3["Close"] = 1.0
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h3)
+        self.assertNotIn(fp, yfcm._mem_cache)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h3, check_freq=False)
+
+        # File modified by another process
+        with open(fp, 'wb') as outData:
+            pickle.dump({"data": h, "expiry": None, "metadata": None}, outData, 4)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+
+    def test_cache_memory_packed(self):
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 1)
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "balance_sheet"))
+        fp = yfcm.GetFilepath(self.ticker, "balance_sheet")
+        self.assertIn(fp, yfcm._mem_cache)
+
+        yfcm.StoreCachePackedDatum(self.ticker, "cashflow", 2)
+        self.assertNotIn(fp, yfcm._mem_cache)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "cashflow"), 2)
+
+    def test_cache_memory_budget(self):
+        yfcm._option_manager.cache.memory_budget_mb = 0
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", make_price_history(20))
+        yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        self.assertEqual(len(yfcm._mem_cache), 0)
+
+        # Budget fits one history, so least-recently-used evicted
+        h = make_price_history(20)
+        nbytes = h.memory_usage(index=True).sum()
+        yfcm._option_manager.cache.memory_budget_mb = 1.5*nbytes/(1024*1024)
+        yfcm.StoreCacheDatum(self.ticker, "history-1wk", h)
+        yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        yfcm.ReadCacheDatum(self.ticker, "history-1wk")
+        self.assertNotIn(yfcm.GetFilepath(self.ticker, "history-1d"), yfcm._mem_cache)
+        self.assertIn(yfcm.GetFilepath(self.ticker, "history-1wk"), yfcm._mem_cache)
+
+        with self.assertRaises(ValueError):
+            yfcm._option_manager.cache.memory_budget_mb = -1
+
+    def test_cache_manifest(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h, expiry=datetime(2100, 1, 1, tzinfo=ZoneInfo("UTC")))
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 1)
+        yfcm.StoreCacheDatum("exchange-NMS", "tz", "America/New_York")
+
+        # Enabling builds manifest from existing files
+        yfcm._option_manager.cache.manifest = True
+        e = yfcm.GetCacheManifestEntry(self.ticker, "history-1d")
+        self.assertEqual(e["path"], yfcm.GetFilepath(self.ticker, "history-1d"))
+        self.assertEqual(e["expiry"], datetime(2100, 1, 1, tzinfo=ZoneInfo("UTC")))
+        self.assertEqual(e["first_ts"], h.index[0])
+        self.assertEqual(e["last_ts"], h.index[-1])
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "balance_sheet"))
+        self.assertFalse(yfcm.IsDatumCached(self.ticker, "cashflow"))
+        self.assertEqual(yfcm.GetCachedTickers(), [self.ticker])
+
+        # Maintained by writes
+        yfcm.StoreCachePackedDatum(self.ticker, "cashflow", 2)
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "cashflow"))
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "cashflow"), 2)
+        yfcm.StoreCacheDatum("MSFT", self.objName, 3)
+        self.assertEqual(yfcm.GetCachedTickers(), [self.ticker, "MSFT"])
+        yfcm.StoreCacheDatum("MSFT", self.objName, None)
+        self.assertFalse(yfcm.IsDatumCached("MSFT", self.objName))
+        self.assertIsNone(yfcm.ReadCacheDatum("MSFT", self.objName))
+
+        yfcm._option_manager.cache.price_segments = True
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h2 = make_price_history(21).iloc[-1:]
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h2)
+        e = yfcm.GetCacheManifestEntry(self.ticker, "history-1d")
+        self.assertEqual(e["first_ts"], h.index[0])
+        self.assertEqual(e["last_ts"], h2.index[-1])
+
+        # Paths relative to cache folder, so manifest still valid after moving it
+        self.assertEqual(yfcm._GetManifest().get(self.ticker, "cashflow")["path"], self.ticker+"/annuals.pkl")
+        with tempfile.TemporaryDirectory() as td:
+            cd = os.path.join(td, "moved")
+            yfcm.SetCacheDirpath(td)
+            shutil.copytree(self.tempCacheDir.name, cd)
+            yfcm.SetCacheDirpath(cd)
+            self.assertEqual(yfcm.GetCacheManifestEntry(self.ticker, "history-1d")["path"], os.path.join(cd, self.ticker, "history-1d.pkl"))
+            pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), pd.concat([h, h2]), check_freq=False)
+            yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+        # Disabling deletes manifest, because no longer maintained
+        yfcm._option_manager.cache.manifest = False
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "cashflow"))
+        self.assertFalse(os.path.isfile(yfcm._GetManifestFilepath()))
+
+    def test_cache_manifest_lazy(self):
+        h = make_price_history(20)
+        exp = datetime(2100, 1, 1, tzinfo=ZoneInfo("UTC"))
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h, expiry=exp)
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", h)
+
+        # Enabling only stats files & reads sidecars
+        decode = yfcm._DecodeData
+        read_member = yfcm._ReadPackedMember
+        def _fail(*args, **kwargs):
+            raise Exception("decoded")
+        yfcm._DecodeData = _fail
+        yfcm._ReadPackedMember = _fail
+        try:
+            yfcm._option_manager.cache.manifest = True
+            m = yfcm._GetManifest()
+        finally:
+            yfcm._DecodeData = decode
+            yfcm._ReadPackedMember = read_member
+        e = m.get(self.ticker, "history-1d")
+        self.assertFalse(e["complete"])
+        self.assertEqual(e["expiry"], exp)
+        self.assertIsNone(e["last_ts"])
+        self.assertFalse(m.get(self.ticker, "balance_sheet")["complete"])
+
+        # Appended segment doesn't make range look known
+        yfcm._option_manager.cache.price_segments = True
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h2 = make_price_history(21).iloc[-1:]
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h2)
+        self.assertIsNone(m.get(self.ticker, "history-1d")["first_ts"])
+
+        # Reads fill in range
+        yfcm.ClearMemoryCache()
+        yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        e = m.get(self.ticker, "history-1d")
+        self.assertTrue(e["complete"])
+        self.assertEqual((e["first_ts"], e["last_ts"]), (h.index[0], h2.index[-1]))
+        yfcm.ReadCachePackedDatum(self.ticker, "balance_sheet")
+        e = m.get(self.ticker, "balance_sheet")
+        self.assertTrue(e["complete"])
+        self.assertEqual(e["last_ts"], h.index[-1])
+
+        # Manifest of older version, built complete
+        yfcm._CloseManifest()
+        conn = sqlite3.connect(yfcm._GetManifestFilepath())
+        conn.execute("DROP TABLE datum")
+        conn.execute("CREATE TABLE datum (ticker TEXT NOT NULL, object TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL, expiry REAL, first_ts REAL, last_ts REAL, PRIMARY KEY (ticker, object))")
+        conn.execute("INSERT INTO datum VALUES (?,?,?,?,?,?,?,?)", (self.ticker, "history-1d", self.ticker+"/history-1d.pkl", 1, 1.0, None, 1.0, 2.0))
+        conn.commit()
+        conn.close()
+        self.assertTrue(yfcm._GetManifest().get(self.ticker, "history-1d")["complete"])
+
+    def test_cache_sqlite_backend(self):
+        yfcm._option_manager.cache.backend = "sqlite"
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 1, metadata={"k": "v"})
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 2)
+        self.assertFalse(os.path.isdir(os.path.join(self.tempCacheDir.name, self.ticker)))
+        self.assertTrue(os.path.isfile(os.path.join(self.tempCacheDir.name, "_YFC_", "cache.db")))
+
+        yfcm.ClearMemoryCache()
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, self.objName))
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 1)
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k"), "v")
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 2)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+        self.assertEqual(yfcm.GetCachedTickers(), [self.ticker])
+
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h2 = make_price_history(21).iloc[-1:]
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h2)
+        self.assertEqual(len(yfcm._ListSegments(yfcm.GetFilepath(self.ticker, "history-1d"))), 1)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), pd.concat([h, h2]), check_freq=False)
+
+        yfcm.StoreCacheDatum(self.ticker, self.objName, None)
+        self.assertFalse(yfcm.IsDatumCached(self.ticker, self.objName))
+
+        with self.assertRaises(ValueError):
+            yfcm._option_manager.cache.backend = "csv"
+
+    def test_cache_migrate_backend(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 1)
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 2)
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        h2 = make_price_history(21).iloc[-1:]
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h2)
+        h = pd.concat([h, h2])
+
+        n = yfcm.MigrateCacheBackend("sqlite", delete_source=True)
+        self.assertEqual(n, 5)  # + metadata sidecar & segment
+        self.assertEqual(yfcm.GetBackend(), "sqlite")
+        # Emptied ticker folders removed
+        self.assertFalse(os.path.exists(os.path.join(self.tempCacheDir.name, self.ticker)))
+        self.assertEqual(yfcm.GetCachedTickers(), [self.ticker])
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 2)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+
+        yfcm.MigrateCacheBackend("directory")
+        self.assertEqual(yfcm.GetBackend(), "directory")
+        self.assertTrue(os.path.isfile(yfcm.GetFilepath(self.ticker, self.objName)))
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 1)
+
+    def test_cache_codec(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 1)
+        fp = yfcm.GetFilepath(self.ticker, "history-1d")
+        size_raw = os.path.getsize(fp)
+
+        # Mixed codecs in one cache still read
+        yfcm._option_manager.cache.codec = "zlib"
+        yfcm.StoreCacheDatum(self.ticker, "history-1wk", h)
+        yfcm.StoreCachePackedDatum(self.ticker, "quarterly_cashflow", 2)
+        fp2 = yfcm.GetFilepath(self.ticker, "history-1wk")
+        with open(fp2, 'rb') as f:
+            self.assertEqual(f.read(4), yfcm.codec_magic)
+        self.assertLess(os.path.getsize(fp2), size_raw)
+
+        yfcm.ClearMemoryCache()
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1wk"), h, check_freq=False)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "quarterly_cashflow"), 2)
+
+        yfcm._option_manager.cache.codec = "auto"
+        self.assertIn(yfcm.GetCodec(), ["zlib", "lz4", "zstd"])
+        with self.assertRaises(ValueError):
+            yfcm._option_manager.cache.codec = "bz2"
+
+    def test_cache_packed_random_access(self):
+        df = pd.DataFrame({"a": [1.0, 2.0]})
+        yfcm.StoreCachePackedDatum(self.ticker, "quarterly_cashflow", df)
+        yfcm.StoreCachePackedDatum(self.ticker, "quarterly_financials", 2, metadata={"k": "v"})
+        fp = yfcm.GetFilepath(self.ticker, "quarterly_cashflow")
+        self.assertEqual(sorted(yfcm._ListPackedMembers(fp)), ["quarterly_cashflow", "quarterly_financials"])
+
+        # Replacing one member leaves sibling bytes untouched
+        table, start = yfcm._ReadPackedIndex(fp)
+        with open(fp, 'rb') as f:
+            data = f.read()
+        o, n = table["quarterly_cashflow"]
+        blob = data[start+o:start+o+n]
+        yfcm.StoreCachePackedDatum(self.ticker, "quarterly_financials", 3)
+        table, start = yfcm._ReadPackedIndex(fp)
+        with open(fp, 'rb') as f:
+            data = f.read()
+        o, n = table["quarterly_cashflow"]
+        self.assertEqual(data[start+o:start+o+n], blob)
+
+        yfcm.ClearMemoryCache()
+        pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "quarterly_cashflow"), df)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "quarterly_financials"), 3)
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, "quarterly_financials", "k"), "v")
+
+    def test_cache_packed_legacy(self):
+        # Packed files written as one pickled dict still read, and are converted on write
+        td = os.path.join(self.tempCacheDir.name, self.ticker)
+        os.makedirs(td)
+        fp = os.path.join(td, "annuals.pkl")
+        with open(fp, 'wb') as f:
+            pickle.dump({"balance_sheet": {"data": 1}, "cashflow": {"data": 2, "metadata": {"k": "v"}}}, f, 4)
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "cashflow"))
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 1)
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, "cashflow", "k"), "v")
+
+        yfcm.StoreCachePackedDatum(self.ticker, "earnings", 3)
+        with open(fp, 'rb') as f:
+            self.assertEqual(f.read(4), yfcm.packed_magic)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "cashflow"), 2)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "earnings"), 3)
+
+    def test_cache_metadata_sidecar(self):
+        md = {"k1": 1}
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123, metadata=md)
+        fp = yfcm.GetFilepath(self.ticker, self.objName)
+        mtime = os.stat(fp).st_mtime_ns
+
+        # Metadata writes don't touch payload
+        yfcm.WriteCacheMetadata(self.ticker, self.objName, "k2", 2)
+        yfcm.WriteCacheMetadata(self.ticker, self.objName, "k1", None)
+        self.assertEqual(os.stat(fp).st_mtime_ns, mtime)
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k2"), 2)
+        self.assertIsNone(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k1"))
+
+        # Deleting datum deletes its metadata
+        yfcm.StoreCacheDatum(self.ticker, self.objName, None)
+        self.assertNotIn(self.objName, yfcm._ReadSidecar(self.ticker))
+
+    def test_cache_metadata_sidecar_concurrent(self):
+        # Processes writing different objects of same ticker keep each other's metadata
+        names = [[f"obj{i}_{j}" for j in range(25)] for i in range(4)]
+        procs = [multiprocessing.Process(target=_store_objects, args=(self.tempCacheDir.name, self.ticker, n)) for n in names]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        sc = yfcm._ReadSidecar(self.ticker)
+        for n in sum(names, []):
+            self.assertEqual(sc[n]["metadata"], {"k": n})
+
+    def test_cache_concurrent_writers(self):
+        # Processes writing same file, like download() workers writing
+        # exchange schedules, don't trip over each other's temporary files
+        with multiprocessing.Pool(8) as pool:
+            pool.map(_store_same_object, [(self.tempCacheDir.name, "exchange-NMS", i) for i in range(8)])
+        yfcm.ClearMemoryCache()
+        self.assertEqual(yfcm.ReadCacheDatum("exchange-NMS", "tz") % 1000, 199)
+        td = os.path.join(self.tempCacheDir.name, "exchange-NMS")
+        self.assertEqual([f for f in os.listdir(td) if f.endswith(".tmp")], [])
+
+    def test_cache_metadata_sidecar_write_order(self):
+        # Failed payload write leaves no metadata behind
+        write_data = yfcm._WriteData
+        def _fail(*args):
+            raise IOError("disk full")
+        yfcm._WriteData = _fail
+        try:
+            with self.assertRaises(IOError):
+                yfcm.StoreCacheDatum(self.ticker, self.objName, 123, metadata={"k1": 1})
+        finally:
+            yfcm._WriteData = write_data
+        self.assertNotIn(self.objName, yfcm._ReadSidecar(self.ticker))
+
+    def test_cache_metadata_legacy(self):
+        # Metadata stored inside payload by older versions still reads,
+        # and is moved to sidecar on first metadata write
+        td = os.path.join(self.tempCacheDir.name, self.ticker)
+        os.makedirs(td)
+        with open(os.path.join(td, self.objName+".pkl"), 'wb') as f:
+            pickle.dump({"data": {"a": 1}, "metadata": {"k1": 1}}, f, 4)
+        obj, md = yfcm.ReadCacheDatum(self.ticker, self.objName, True)
+        self.assertEqual(md, {"k1": 1})
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k1"), 1)
+
+        yfcm.WriteCacheMetadata(self.ticker, self.objName, "k2", 2)
+        self.assertEqual(yfcm._ReadSidecar(self.ticker)[self.objName]["metadata"], {"k1": 1, "k2": 2})
+        obj, md = yfcm.ReadCacheDatum(self.ticker, self.objName, True)
+        self.assertEqual(md, {"k1": 1, "k2": 2})
+
+    def test_cache_read_only(self):
+        exp = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC")) - timedelta(seconds=1)
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123, expiry=exp)
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 456, expiry=exp)
+        fp = yfcm.GetFilepath(self.ticker, self.objName)
+        fp_packed = yfcm.GetFilepath(self.ticker, "balance_sheet")
+        mtimes = [os.stat(f).st_mtime_ns for f in [fp, fp_packed]]
+
+        yfcm.EnableReadOnly()
+        self.addCleanup(yfcm.DisableReadOnly)
+        yfcm.ClearStaleReads()
+
+        # Expired objects returned as-is, not deleted
+        obj, md = yfcm.ReadCacheDatum(self.ticker, self.objName, True)
+        self.assertEqual(obj, 123)
+        self.assertTrue(md["__stale__"])
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 456)
+        self.assertEqual(yfcm.GetStaleReads(), [(self.ticker, "balance_sheet"), (self.ticker, self.objName)])
+
+        # Writes ignored
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 789)
+        yfcm.StoreCacheDatum(self.ticker, "other", 789)
+        yfcm.WriteCacheMetadata(self.ticker, self.objName, "k", 1)
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", None)
+        self.assertEqual([os.stat(f).st_mtime_ns for f in [fp, fp_packed]], mtimes)
+        self.assertFalse(yfcm.IsDatumCached(self.ticker, "other"))
+        self.assertIsNone(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k"))
+        with self.assertRaises(Exception):
+            yfcm.MigrateCacheBackend("sqlite")
+
+        # Back to normal, expired objects deleted on read
+        yfcm.DisableReadOnly()
+        self.assertIsNone(yfcm.ReadCacheDatum(self.ticker, self.objName))
+        self.assertFalse(os.path.isfile(fp))
+
+    def test_cache_read_only_sqlite(self):
+        yfcm._option_manager.cache.backend = "sqlite"
+        yfcm._option_manager.cache.manifest = True
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123)
+        yfcm.EnableReadOnly()
+        self.addCleanup(yfcm.DisableReadOnly)
+
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 123)
+        self.assertEqual(yfcm.GetCachedTickers(), [self.ticker])
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 456)
+        yfcm.ClearMemoryCache()
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 123)
+
+    @unittest.skipIf(not hasattr(os, "geteuid") or os.geteuid() == 0, "root ignores file permissions")
+    def test_cache_read_only_sqlite_mount(self):
+        # Databases in WAL mode still readable when cache folder is read-only
+        yfcm._option_manager.cache.backend = "sqlite"
+        yfcm._option_manager.cache.manifest = True
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123)
+        yfcm.EnableReadOnly()
+        yfcm.ClearMemoryCache()
+
+        dps = [root for root, dirs, files in os.walk(self.tempCacheDir.name)]
+        for dp in dps:
+            os.chmod(dp, 0o555)
+        try:
+            self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 123)
+            self.assertEqual(yfcm.GetCachedTickers(), [self.ticker])
+        finally:
+            yfcm.DisableReadOnly()
+            for dp in dps:
+                os.chmod(dp, 0o755)
+
+    def test_cache_export_import(self):
+        h = make_price_history(20)
+        yfcm._option_manager.cache.price_segments = True
+        yfcm._option_manager.cache.segment_max_ratio = 100
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h.iloc[:-1])
+        yfcm.StoreCacheDatumSegment(self.ticker, "history-1d", h.iloc[-1:])
+        yfcm.StoreCacheDatum(self.ticker, "history-1h", h)
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123, metadata={"k": 1})
+        yfcm.StoreCachePackedDatum(self.ticker, "balance_sheet", 456)
+        yfcm.StoreCacheDatum("MSFT", self.objName, 789)
+        yfcm.StoreCacheDatum("exchange-NMS", self.objName, 1)
+
+        with tempfile.TemporaryDirectory() as td:
+            fp_all = os.path.join(td, "all.tar.gz")
+            fp_sub = os.path.join(td, "sub.tar")
+            n = yfcm.ExportCache(fp_all)
+            n_sub = yfcm.ExportCache(fp_sub, tickers=[self.ticker.lower()], intervals=["1d"])
+            self.assertEqual(n - n_sub, 3)  # MSFT datum & sidecar, 1h excluded
+
+            # Import subset into new cache, with different backend
+            with tempfile.TemporaryDirectory() as cd:
+                yfcm.SetCacheDirpath(cd)
+                yfcm._option_manager.cache.backend = "sqlite"
+                self.assertEqual(yfcm.ImportCache(fp_sub, threads=4), n_sub)
+                pd.testing.assert_frame_equal(yfcm.ReadCacheDatum(self.ticker, "history-1d"), h, check_freq=False)
+                self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 123)
+                self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k"), 1)
+                self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 456)
+                self.assertEqual(yfcm.ReadCacheDatum("exchange-NMS", self.objName), 1)
+                self.assertFalse(yfcm.IsDatumCached(self.ticker, "history-1h"))
+                self.assertFalse(yfcm.IsDatumCached("MSFT", self.objName))
+                yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+            # Corrupt one file, import rejects it
+            fp_bad = os.path.join(td, "bad.tar")
+            with tarfile.open(fp_sub) as src, tarfile.open(fp_bad, "w") as dst:
+                for ti in src.getmembers():
+                    data = src.extractfile(ti).read()
+                    if ti.name == self.ticker+"/"+self.objName+".json":
+                        data = data.replace(b"123", b"124")
+                    dst.addfile(ti, io.BytesIO(data))
+            with tempfile.TemporaryDirectory() as cd:
+                yfcm.SetCacheDirpath(cd)
+                with self.assertRaises(Exception) as ctx:
+                    yfcm.ImportCache(fp_bad)
+                self.assertIn("checksum mismatch", str(ctx.exception))
+                self.assertFalse(yfcm.IsDatumCached(self.ticker, self.objName))
+                yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+    def test_cache_export_reads_once(self):
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", make_price_history(20))
+        yfcm.StoreCacheDatum(self.ticker, self.objName, 123)
+        st = yfcm._GetStore()
+        reads = []
+        read = st.read
+        def _read(fp):
+            reads.append(fp)
+            return read(fp)
+        st.read = _read
+        with tempfile.TemporaryDirectory() as td:
+            n = yfcm.ExportCache(os.path.join(td, "all.tar"))
+            self.assertEqual(len(reads), n)
+            self.assertEqual(len(set(reads)), n)
+            with tarfile.open(os.path.join(td, "all.tar")) as tar:
+                files = json.loads(tar.extractfile(yfcm.archive_manifest_name).read())["files"]
+            self.assertEqual(sorted(files), [f"{self.ticker}/_metadata.pkl", f"{self.ticker}/{self.objName}.json", f"{self.ticker}/history-1d.pkl"])
+
+    def test_cache_import_v1(self):
+        # Archive written by first version: checksums in manifest
+        data = json.dumps({"data": 123}).encode()
+        name = f"{self.ticker}/{self.objName}.json"
+        manifest = {"version": 1, "backend": "directory", "files": {name: {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}}}
+        with tempfile.TemporaryDirectory() as td:
+            fp = os.path.join(td, "v1.tar")
+            with tarfile.open(fp, "w") as tar:
+                yfcm._AddArchiveMember(tar, yfcm.archive_manifest_name, json.dumps(manifest).encode())
+                yfcm._AddArchiveMember(tar, name, data)
+            self.assertEqual(yfcm.ImportCache(fp), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, self.objName), 123)
+
+    def test_cache_schema_migrate(self):
+        # Write objects as older versions did
+        h = make_price_history(20).drop(["Repaired?", "LastDivAdjustDt"], axis=1)
+        h.loc[h.index[5], "CDF"] = np.nan
+        for tkr in [self.ticker, "MSFT"]:
+            td = os.path.join(self.tempCacheDir.name, tkr)
+            os.makedirs(td)
+            with open(os.path.join(td, "history-1d.pkl"), 'wb') as f:
+                pickle.dump({"data": h}, f, 4)
+            with open(os.path.join(td, self.objName+".pkl"), 'wb') as f:
+                pickle.dump({"data": {"a": 1}, "metadata": {"k1": 1}}, f, 4)
+            with open(os.path.join(td, "annuals.pkl"), 'wb') as f:
+                pickle.dump({"balance_sheet": {"data": 2}}, f, 4)
+        self.assertEqual(yfcm.GetCacheDatumSchema(self.ticker, "history-1d"), 0)
+        self.assertFalse(yfcm.IsDatumStorageCurrent(self.ticker, "balance_sheet"))
+
+        # Interrupted migration resumes after completed tickers
+        yfc_dp = os.path.join(self.tempCacheDir.name, "_YFC_")
+        os.makedirs(yfc_dp)
+        with open(os.path.join(yfc_dp, "schema-migration-progress.txt"), 'w') as f:
+            f.write("MSFT\n")
+        n = yfcup.MigrateCacheSchema(processes=2, progress=False)
+        self.assertEqual(n, 3)
+        self.assertEqual(yfcm.GetCacheDatumSchema("MSFT", "history-1d"), 0)
+        self.assertFalse(os.path.isfile(os.path.join(yfc_dp, "schema-migration-progress.txt")))
+
+        for obj in ["history-1d", self.objName, "balance_sheet"]:
+            self.assertEqual(yfcm.GetCacheDatumSchema(self.ticker, obj), yfcm.schema_version)
+            self.assertTrue(yfcm.IsDatumStorageCurrent(self.ticker, obj))
+        h2 = yfcm.ReadCacheDatum(self.ticker, "history-1d")
+        self.assertFalse(h2["CDF"].isna().any())
+        self.assertFalse(h2["Repaired?"].any())
+        self.assertTrue((h2["LastDivAdjustDt"] == h2["FetchDate"]).all())
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, self.objName, "k1"), 1)
+        self.assertEqual(yfcm.ReadCacheDatum(self.ticker, "balance_sheet"), 2)
+
+        # Changing codec makes storage out-of-date, upgrade rewrites
+        yfcm._option_manager.cache.codec = "zlib"
+        self.assertFalse(yfcm.IsDatumStorageCurrent(self.ticker, self.objName))
+        self.assertEqual(yfcup.MigrateCacheSchema(processes=1, progress=False, resume=False), 6)
+        self.assertTrue(yfcm.IsDatumStorageCurrent(self.ticker, self.objName))
+        self.assertEqual(yfcup.MigrateCacheSchema(processes=1, progress=False), 0)
+
+    def test_cache_eviction(self):
+        h = make_price_history(20)
+        for tkr, obj in [(self.ticker, "history-1m"), (self.ticker, "history-1h"), ("MSFT", "history-5m"),
+                         (self.ticker, "history-1wk"), (self.ticker, "info"),
+                         (self.ticker, "history-1d"), (self.ticker, "dividends"), ("exchange-NMS", "schedule")]:
+            yfcm.StoreCacheDatum(tkr, obj, h)
+            sleep(0.01)
+        yfcm.ReadCacheDatum(self.ticker, "history-1m")
+
+        # Tiers: intraday, other prices, other objects, then 1d & events together
+        order = [(e[0], e[1]) for e in yfcm.EnforceCacheSizeBudget(0, dry_run=True)]
+        self.assertEqual(order, [(self.ticker, "history-1h"), ("MSFT", "history-5m"), (self.ticker, "history-1m"),
+                                 (self.ticker, "history-1wk"), (self.ticker, "info"),
+                                 (self.ticker, "dividends"), (self.ticker, "history-1d")])
+
+        # Budget just below total, so one object evicted
+        total = sum([yfcm.GetCacheDatumNbytes(t, o) for t in yfcm.GetCachedTickers(True) for o in yfcm.ListCachedObjects(t)])
+        budget = (total - 1) / (1024*1024)
+        self.assertEqual(yfcm.EnforceCacheSizeBudget(budget, "oldest", dry_run=True)[0][1], "history-1m")
+        self.assertEqual(yfcm.EnforceCacheSizeBudget(budget, "interval", dry_run=True)[0][1], "history-1m")
+        yfcm._option_manager.cache.size_budget_mb = budget
+        evicted = yfcm.EnforceCacheSizeBudget()
+        self.assertEqual([e[1] for e in evicted], ["history-1h"])
+        self.assertFalse(yfcm.IsDatumCached(self.ticker, "history-1h"))
+        self.assertTrue(yfcm.IsDatumCached(self.ticker, "history-1m"))
+        self.assertEqual(yfcm.EnforceCacheSizeBudget(), [])
+
+        with self.assertRaises(ValueError):
+            yfcm._option_manager.cache.eviction_policy = "random"
+
+    def test_cache_eviction_concurrent_reads(self):
+        # Reads record access times while eviction snapshots them
+        for i in range(20):
+            yfcm.StoreCacheDatum(self.ticker, f"obj{i}", i)
+        errors = []
+        def _read():
+            try:
+                for j in range(200):
+                    for i in range(20):
+                        yfcm.ReadCacheDatum(self.ticker, f"obj{i}")
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=_read) for i in range(4)]
+        for t in threads:
+            t.start()
+        for j in range(20):
+            yfcm.EnforceCacheSizeBudget(1000, dry_run=True)
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(yfcm._FlushAccessLog(return_log=True)), 20)
+
+    def test_cache_access_log_concurrent_flush(self):
+        # Processes flushing access times keep each other's times
+        names = [[f"obj{i}_{j}" for j in range(25)] for i in range(4)]
+        for n in sum(names, []):
+            yfcm.StoreCacheDatum(self.ticker, n, 1)
+        with multiprocessing.Pool(4) as pool:
+            pool.map(_read_objects, [(self.tempCacheDir.name, self.ticker, n) for n in names])
+        log = yfcm._ReadAccessLog()
+        self.assertEqual(sorted(log.keys()), sorted([(self.ticker, n) for n in sum(names, [])]))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,8 @@ import unittest
 from .context import yfc_dat as yfcd
 from .context import yfc_time as yfct
 
+import numpy as np
+
 from datetime import datetime, date, time, timedelta
 from zoneinfo import ZoneInfo
 
@@ -388,5 +390,48 @@ class Test_PriceDataAging_1H(unittest.TestCase):
                 pprint(response)
                 raise
 
+    def test_batch_matches_scalar(self):
+        interval = yfcd.Interval.Hours1
+        lag = timedelta(minutes=1)
+
+        interval_start_dts = []
+        for d in [self.monday, self.tuesday, self.friday]:
+            for h in [9, 12, 15]:
+                interval_start_dts.append(datetime.combine(d, time(h, 30), self.market_tz))
+        fetch_offsets = [timedelta(minutes=5), timedelta(minutes=70), timedelta(hours=10)]
+        dt_nows = [datetime.combine(self.tuesday, time(13, 4), self.market_tz),
+                   datetime.combine(self.friday, time(16, 1), self.market_tz),
+                   datetime.combine(self.saturday, time(12), self.market_tz),
+                   datetime.combine(self.monday+7*self.td1d, time(9, 31), self.market_tz)]
+
+        for max_age in [timedelta(minutes=30), timedelta(hours=4)]:
+            for repaired in [False, True]:
+                for expire_on_candle_close in [False, True]:
+                    for dt_now in dt_nows:
+                        starts = [] ; fetch_dts = []
+                        for dt in interval_start_dts:
+                            for td in fetch_offsets:
+                                if dt+td <= dt_now:
+                                    starts.append(dt) ; fetch_dts.append(dt+td)
+                        responses = yfct.IsPriceDatapointExpired_batch(np.array(starts), fetch_dts, repaired, max_age, self.exchange, interval, triggerExpiryOnClose=expire_on_candle_close, yf_lag=lag, dt_now=dt_now)
+                        for i in range(len(starts)):
+                            answer = yfct.IsPriceDatapointExpired(starts[i], fetch_dts[i], repaired, max_age, self.exchange, interval, triggerExpiryOnClose=expire_on_candle_close, yf_lag=lag, dt_now=dt_now)
+                            try:
+                                self.assertEqual(responses[i], answer)
+                            except:
+                                print("interval_start_dt = {0}".format(starts[i]))
+                                print("fetch_dt = {0}".format(fetch_dts[i]))
+                                print("max_age = {0}".format(max_age))
+                                print("dt_now = {0}".format(dt_now))
+                                print("repaired = {0}".format(repaired))
+                                print("expire_on_candle_close = {0}".format(expire_on_candle_close))
+                                raise
+
+        # Timestamp outside schedule
+        with self.assertRaises(yfcd.TimestampOutsideIntervalException):
+            dt = datetime.combine(self.saturday, time(12, 30), self.market_tz)
+            yfct.IsPriceDatapointExpired_batch(np.array([dt]), [dt+lag], False, timedelta(minutes=30), self.exchange, interval, yf_lag=lag, dt_now=dt_nows[-1])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 
+import pandas as pd
+import numpy as np
+
 from .context import yfc_utils as yfcu
 
 class TestUtils(unittest.TestCase):
@@ -46,6 +49,28 @@ class TestUtils(unittest.TestCase):
 
         self.assertEqual(yfcu.CalculateRounding(1.0, 4), 3)
 
+    def test_setReadOnly(self):
+        idx = pd.date_range("2024-01-01", periods=3, tz="America/New_York")
+        df = pd.DataFrame({"Close": [1.0, 2.0, 3.0], "Volume": [1, 2, 3], "FetchDate": idx}, index=idx)
+        df_ro = yfcu.SetReadOnly(df)
+        self.assertTrue(np.shares_memory(df_ro["Close"].to_numpy(), df["Close"].to_numpy()))
+        if yfcu.IsCopyOnWrite():
+            df_ro.iloc[0, 0] = 5.0
+        else:
+            with self.assertRaises(ValueError):
+                df_ro.iloc[0, 0] = 5.0
+            with self.assertRaises(ValueError):
+                df_ro["Volume"].to_numpy()[0] = 5
+        self.assertEqual(df["Close"].iloc[0], 1.0)
+        # Copy is writable
+        df2 = df_ro.copy()
+        df2.iloc[0, 0] = 5.0
+        self.assertEqual(df["Close"].iloc[0], 1.0)
+
+    def test_setReadOnly_cow(self):
+        with pd.option_context("mode.copy_on_write", True):
+            self.test_setReadOnly()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from .context import yfc_cache_manager as yfcm
+from .context import yfc_multi as yfcmu
+
+import tempfile
+import pandas as pd
+
+
+class Test_Yfc_Multi(unittest.TestCase):
+
+    def setUp(self):
+        self.tempCacheDir = tempfile.TemporaryDirectory()
+        yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+        self.tickers = ["AAA", "BBB", "CCC"]
+        idx = pd.date_range("2022-01-03", periods=5, freq="D", tz="UTC")
+        for i, tkr in enumerate(self.tickers):
+            df = pd.DataFrame({"Close": [float(i)]*5}, index=idx)
+            yfcm.StoreCacheDatum(tkr, "history-1d", df)
+            yfcm.StoreCacheDatum(tkr, "info", {"symbol": tkr, "i": i})
+
+    def tearDown(self):
+        self.tempCacheDir.cleanup()
+
+    def test_read_cached(self):
+        for threads in [False, 2]:
+            objs, stats = yfcmu.read_cached(self.tickers + ["MISSING"], "history-1d", threads=threads, return_stats=True)
+            self.assertEqual(sorted(objs.keys()), self.tickers)
+            self.assertEqual(objs["BBB"]["Close"].iloc[0], 1.0)
+            self.assertEqual(stats["tickers"], 4)
+            self.assertEqual(stats["found"], 3)
+            self.assertGreater(stats["bytes"], 0)
+
+    def test_read_cached_columns(self):
+        objs = yfcmu.read_cached(self.tickers, "history-1d", columns=["Close"])
+        self.assertEqual(list(objs["BBB"].columns), ["Close"])
+        self.assertEqual(objs["BBB"]["Close"].iloc[0], 1.0)
+
+    def test_read_cached_stack(self):
+        df = yfcmu.read_cached(self.tickers, "history-1d", stack=True)
+        self.assertEqual(df.index.names[0], "Ticker")
+        self.assertEqual(df.shape[0], 15)
+        self.assertEqual(df.loc["CCC"]["Close"].iloc[0], 2.0)
+
+        df = yfcmu.read_cached(self.tickers, "info", stack=True)
+        self.assertEqual(list(df.index), self.tickers)
+        self.assertEqual(df.loc["BBB", "i"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
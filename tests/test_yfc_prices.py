@@ -0,0 +1,401 @@
+import unittest
+
+from .context import yfc_cache_manager as yfcm
+from .context import yfc_dat as yfcd
+from .context import yfc_prices_manager as yfcp
+from .utils import make_price_history
+
+import os, tempfile, threading
+import numpy as np
+import pandas as pd
+
+from datetime import date, timedelta
+
+
+class Test_Yfc_Prices(unittest.TestCase):
+    # Price manager on cached data only, no fetches
+
+    def setUp(self):
+        self.ticker = "INTC"
+
+        self.tempCacheDir = tempfile.TemporaryDirectory()
+        yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+    def tearDown(self):
+        self.tempCacheDir.cleanup()
+
+    def _manager(self):
+        return yfcp.HistoriesManager(self.ticker, "NMS", "America/New_York", None, None)
+
+    def test_verify_checksums(self):
+        h = make_price_history(60)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        checksums = ph._getMonthChecksums(ph.h)
+        self.assertEqual(sorted(checksums.keys()), [202201, 202202, 202203])
+
+        # All months verified & unchanged, so nothing to fetch
+        ph._recordVerifiedMonths(list(checksums.keys()))
+        self.assertTrue(ph._verifyCachedPrices())
+
+        # Changing a row invalidates only its month
+        h = h.copy()
+        h.loc["2022-02-10", "Close"] = 99.0
+        ph._updatedCachedPrices(h)
+        checksums2 = ph._getMonthChecksums(ph.h)
+        self.assertEqual([m for m in checksums if checksums[m] != checksums2[m]], [202202])
+        ph._recordVerifiedMonths([])
+        verified = yfcm.ReadCacheMetadata(self.ticker, "history-1d", "Verified")
+        self.assertEqual(sorted(verified.keys()), [202201, 202203])
+
+    def test_validated(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        self.assertFalse(yfcm.IsDatumValidated(self.ticker, "history-1d"))
+
+        # First load validates & marks
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        self.assertTrue(yfcm.IsDatumValidated(self.ticker, "history-1d"))
+
+        # Writes via price manager keep mark
+        h = h.copy()
+        h.loc[h.index[-1], "Close"] = 99.0
+        h.loc[h.index[:3], "CDF"] = np.nan
+        ph._updatedCachedPrices(h)
+        self.assertTrue(yfcm.IsDatumValidated(self.ticker, "history-1d"))
+        self.assertFalse(yfcm.ReadCacheDatum(self.ticker, "history-1d")["CDF"].isna().any())
+
+        # Other writes clear it, then load checks again
+        h_dup = pd.concat([h, h.iloc[-1:]])
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h_dup)
+        self.assertFalse(yfcm.IsDatumValidated(self.ticker, "history-1d"))
+        hm = self._manager()
+        with self.assertRaises(Exception):
+            hm.GetHistory(yfcd.Interval.Days1)
+
+        # Validated data is trusted, unless strict
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h_dup, validated=True)
+        hm = self._manager()
+        hm.GetHistory(yfcd.Interval.Days1)
+        yfcm.EnableStrictMode()
+        try:
+            hm = self._manager()
+            with self.assertRaises(Exception):
+                hm.GetHistory(yfcd.Interval.Days1)
+        finally:
+            yfcm.DisableStrictMode()
+
+    def test_fast_path(self):
+        h = make_price_history(10)
+        h = h[h.index.dayofweek < 5]
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        start = h.index[0].date()
+        end = h.index[-1].date() + timedelta(days=1)
+
+        yfcp.ResetFastPathStats()
+        df1 = ph.get(start=start, end=end)
+        df2 = ph.get(start=start, end=end)
+        df3 = ph.get(start=start, end=end, adjust_divs=True)
+        stats = yfcp.GetFastPathStats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        pd.testing.assert_frame_equal(df1, df2)
+        self.assertNotIn("CDF", df3.columns)
+
+        # Different request, or cache write, = full check
+        ph.get(start=start+timedelta(days=1), end=end)
+        self.assertEqual(yfcp.GetFastPathStats()["misses"], 2)
+        ph._updatedCachedPrices(ph.h.copy())
+        ph.get(start=start, end=end)
+        self.assertEqual(yfcp.GetFastPathStats()["misses"], 3)
+
+        # Expired
+        key = list(ph._fresh.keys())[0]
+        ph._fresh[key] = (pd.Timestamp.utcnow(),) + ph._fresh[key][1:]
+        ph.get(start=start, end=end)
+        self.assertEqual(yfcp.GetFastPathStats()["misses"], 4)
+
+        # New event
+        hm.GetHistory("Events").version += 1
+        ph.get(start=start, end=end)
+        self.assertEqual(yfcp.GetFastPathStats()["misses"], 5)
+        self.assertEqual(yfcp.GetFastPathStats()["hit_rate"], 2/7)
+
+    def test_fast_path_stats_threads(self):
+        # Hits counted from many threads are all kept
+        h = make_price_history(10)
+        h = h[h.index.dayofweek < 5]
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        ph = self._manager().GetHistory(yfcd.Interval.Days1)
+        start = h.index[0].date()
+        end = h.index[-1].date() + timedelta(days=1)
+        ph.get(start=start, end=end)
+
+        yfcp.ResetFastPathStats()
+        def _get():
+            for i in range(500):
+                ph.get(start=start, end=end, copy=False)
+        threads = [threading.Thread(target=_get) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = yfcp.GetFastPathStats()
+        self.assertEqual((stats["hits"], stats["misses"]), (8*500, 0))
+
+    def test_views(self):
+        h = make_price_history(10)
+        h = h[h.index.dayofweek < 5]
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        args = {"start": h.index[0].date(), "end": h.index[-1].date() + timedelta(days=1)}
+        key = (True, True)
+
+        # View only stored & served while get() would take fast path
+        self.assertIsNone(ph.GetView(key, **args))
+        ph.StoreView(key, "view", **args)
+        self.assertIsNone(ph.GetView(key, **args))
+        ph.get(**args)
+        ph.StoreView(key, "view", **args)
+        self.assertEqual(ph.GetView(key, **args), "view")
+        self.assertIsNone(ph.GetView((True, False), **args))
+        self.assertIsNone(ph.GetView(key, start=args["start"], end=args["end"], max_age=timedelta(hours=1)))
+
+        # Invalidated by new event or cache write
+        hm.GetHistory("Events").version += 1
+        self.assertIsNone(ph.GetView(key, **args))
+        ph.get(**args)
+        ph.StoreView(key, "view", **args)
+        ph._updatedCachedPrices(ph.h.copy())
+        self.assertIsNone(ph.GetView(key, **args))
+        ph.get(**args)
+        self.assertIsNone(ph.GetView(key, **args))
+
+        # Any other change to cached prices, e.g. rows replaced by fetch
+        ph.StoreView(key, "view", **args)
+        self.assertEqual(ph.GetView(key, **args), "view")
+        h2 = ph.h.copy()
+        h2.loc[h2.index[-1], "Close"] = 99.0
+        ph.h = h2
+        self.assertIsNone(ph.GetView(key, **args))
+        ph.get(**args)
+        ph.StoreView(key, "view", **args)
+        ph._h_version += 1
+        self.assertIsNone(ph.GetView(key, **args))
+
+    def test_no_copy(self):
+        h = make_price_history(10)
+        h = h[h.index.dayofweek < 5]
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        args = {"start": h.index[0].date(), "end": h.index[-1].date() + timedelta(days=1)}
+        for i in range(2):
+            # Full check then fast path
+            df = ph.get(**args)
+            self.assertFalse(np.shares_memory(df["Close"].to_numpy(), ph.h["Close"].to_numpy()))
+            df = ph.get(**args, copy=False)
+            self.assertTrue(np.shares_memory(df["Close"].to_numpy(), ph.h["Close"].to_numpy()))
+            # Adjusting always copies
+            df = ph.get(**args, copy=False, adjust_splits=True)
+            self.assertFalse(np.shares_memory(df["Close"].to_numpy(), ph.h["Close"].to_numpy()))
+
+    def test_derived_intervals(self):
+        h = make_price_history(33)
+        h = h[h.index.dayofweek < 5].drop(pd.Timestamp("2022-01-17", tz=h.index.tz))
+        # 2:1 split on Wednesday 2022-01-12
+        h["CSF"] = np.where(h.index < pd.Timestamp("2022-01-12", tz=h.index.tz), 0.5, 1.0)
+        h.loc[h.index >= pd.Timestamp("2022-01-12", tz=h.index.tz), ["Open", "High", "Low", "Close"]] /= 2
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        self.assertIsInstance(hm.GetHistory(yfcd.Interval.Week), yfcp.PriceHistory)
+
+        yfcm._option_manager.cache.derive_intervals = True
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Week)
+        self.assertIsInstance(ph, yfcp.DerivedPriceHistory)
+        hw = ph.h
+        self.assertEqual(list(hw.columns), list(h.columns))
+        self.assertEqual([d.date() for d in hw.index], [date(2022, 1, 3), date(2022, 1, 10), date(2022, 1, 17), date(2022, 1, 24), date(2022, 1, 31)])
+        week = h.loc["2022-01-10":"2022-01-14"]
+        f = week["CSF"] / week["CSF"].iloc[-1]
+        self.assertAlmostEqual(hw["Open"].iloc[1], week["Open"].iloc[0] * f.iloc[0])
+        self.assertAlmostEqual(hw["High"].iloc[1], (week["High"] * f).max())
+        self.assertAlmostEqual(hw["Close"].iloc[1], week["Close"].iloc[-1])
+        self.assertEqual(hw["Volume"].iloc[1], round((week["Volume"] / f).sum()))
+        self.assertEqual(hw["CSF"].iloc[1], 1.0)
+        self.assertTrue(hw["Final?"].all())
+
+        # get() aggregates whole weeks, nothing fetched or stored
+        df = ph.get(date(2022, 1, 10), date(2022, 1, 24), adjust_splits=True)
+        self.assertEqual(len(df), 2)
+        self.assertNotIn("CSF", df.columns)
+        self.assertFalse(yfcm.IsDatumCached(self.ticker, "history-1wk"))
+        dfm = hm.GetHistory(yfcd.Interval.Months1).get(date(2022, 1, 1), date(2022, 2, 1))
+        self.assertEqual(len(dfm), 1)
+        self.assertEqual(dfm["Open"].iloc[0], h["Open"].iloc[0] * 0.5)
+
+        # Verify compares against Yahoo aggregates
+        class _Yahoo:
+            def __init__(self, df):
+                self.df = df
+            def history(self, **kwargs):
+                return self.df
+        yf_df = hw.copy()
+        for c in ["Open", "High", "Low", "Close"]:
+            yf_df[c] *= yf_df["CSF"]
+        yf_df["Volume"] = (yf_df["Volume"] / yf_df["CSF"]).round()
+        yf_df["Adj Close"] = yf_df["Close"] * yf_df["CDF"]
+        ph.dat = _Yahoo(yf_df)
+        self.assertTrue(ph._verifyCachedPrices())
+        yf_df.loc[yf_df.index[1], "Close"] *= 1.01
+        self.assertFalse(ph._verifyCachedPrices())
+
+    def test_derived_intervals_missing_days(self):
+        # Mon-Fri, with Mon & Fri missing
+        h = make_price_history(5)
+        h.loc[h.index[[0, 4]], ["Open", "High", "Low", "Close"]] = np.nan
+        h.loc[h.index[[0, 4]], "Volume"] = 0
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        yfcm._option_manager.cache.derive_intervals = True
+        hw = self._manager().GetHistory(yfcd.Interval.Week).h
+        self.assertEqual(len(hw), 1)
+        self.assertEqual(hw["Open"].iloc[0], h["Open"].iloc[1])
+        self.assertEqual(hw["High"].iloc[0], h["High"].iloc[1:4].max())
+        self.assertEqual(hw["Low"].iloc[0], h["Low"].iloc[1:4].min())
+        self.assertEqual(hw["Close"].iloc[0], h["Close"].iloc[3])
+        self.assertEqual(hw["Volume"].iloc[0], h["Volume"].sum())
+
+    def test_derived_intervals_split(self):
+        # 2:1 split on Wednesday, dividend on Tuesday
+        h = make_price_history(5)
+        h["Volume"] = [100, 100, 300, 300, 300]
+        h["Dividends"] = [0.0, 1.0, 0.0, 0.0, 0.0]
+        h["Stock Splits"] = [0.0, 0.0, 2.0, 0.0, 0.0]
+        h["CSF"] = [0.5, 0.5, 1.0, 1.0, 1.0]
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        yfcm._option_manager.cache.derive_intervals = True
+        hw = self._manager().GetHistory(yfcd.Interval.Week).h
+        self.assertEqual(len(hw), 1)
+        self.assertEqual(hw["Open"].iloc[0], h["Open"].iloc[0] * 0.5)
+        self.assertEqual(hw["Volume"].iloc[0], 100*2 + 100*2 + 300*3)
+        self.assertEqual(hw["Dividends"].iloc[0], 0.5)
+        self.assertEqual(hw["Stock Splits"].iloc[0], 2.0)
+        self.assertEqual(hw["CSF"].iloc[0], 1.0)
+
+    def test_events_version(self):
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        events = hm.GetHistory("Events")
+        self.assertEqual(events.version, 0)
+        self.assertIsNone(ph._events_version)
+        ph._applyNewEvents()
+        self.assertEqual(yfcm.ReadCacheMetadata(self.ticker, "history-1d", "EventsVersion"), 0)
+
+        # Same version = no search for new events
+        def _fail(*args):
+            raise Exception("should not search for events")
+        get_splits = events.GetSplitsFetchedSince
+        events.GetSplitsFetchedSince = _fail
+        ph._applyNewEvents()
+        events.GetSplitsFetchedSince = get_splits
+
+        # New split changes version, then applied to prices
+        split_dt = h.index[10]
+        splits = pd.DataFrame({"Stock Splits": [2.0], "FetchDate": [pd.Timestamp.utcnow().tz_convert(split_dt.tz)]}, index=[split_dt])
+        events.UpdateSplits(splits)
+        v1 = events.version
+        self.assertNotEqual(v1, 0)
+        ph._applyNewEvents()
+        self.assertEqual(ph._events_version, v1)
+        self.assertEqual(ph.h["CSF"].iloc[0], 0.5)
+        self.assertEqual(ph.h["CSF"].iloc[-1], 1.0)
+
+        # Versions persist
+        hm = self._manager()
+        self.assertEqual(hm.GetHistory("Events").version, v1)
+        self.assertEqual(hm.GetHistory(yfcd.Interval.Days1)._events_version, v1)
+
+    def test_events_version_lost(self):
+        # Events deleted (e.g. evicted) then refetched can't reuse version
+        # already recorded by price table, else new split skipped
+        h = make_price_history(20)
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        tz = h.index.tz
+        splits = pd.DataFrame({"Stock Splits": [2.0], "FetchDate": [pd.Timestamp.utcnow().tz_convert(tz)]}, index=[h.index[10]])
+        hm.GetHistory("Events").UpdateSplits(splits)
+        ph._applyNewEvents()
+        v1 = yfcm.ReadCacheMetadata(self.ticker, "history-1d", "EventsVersion")
+
+        yfcm.StoreCacheDatum(self.ticker, "splits", None)
+        hm = self._manager()
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        self.assertEqual(ph._events_version, v1)
+        splits = pd.DataFrame({"Stock Splits": [3.0], "FetchDate": [pd.Timestamp.utcnow().tz_convert(tz)]}, index=[h.index[5]])
+        hm.GetHistory("Events").UpdateSplits(splits)
+        self.assertNotEqual(hm.GetHistory("Events").version, v1)
+        ph._applyNewEvents()
+        self.assertAlmostEqual(ph.h["CSF"].iloc[0], 0.5/3)
+        self.assertEqual(ph.h["CSF"].iloc[7], 0.5)
+
+    def test_apply_events(self):
+        # Compare vectorised back-adjustment against simple per-event loop
+        h = make_price_history(60)
+        tz = h.index.tz
+        t0 = h["FetchDate"].iloc[0]
+        # Rows last adjusted at 3 different times
+        la = [t0 - timedelta(days=30), t0, t0 + timedelta(days=30)]
+        h["LastSplitAdjustDt"] = pd.DatetimeIndex([la[i % 3] for i in range(len(h))]).tz_convert(tz)
+        h["LastDivAdjustDt"] = h["LastSplitAdjustDt"]
+        h["CDF"] = np.linspace(0.9, 1.0, len(h))
+        ev_dts = h.index[[5, 20, 21, 40, 59]]
+        fetch_dts = [t0 - timedelta(days=10), t0 + timedelta(days=10), t0 + timedelta(days=40), t0 - timedelta(days=40), t0 + timedelta(days=10)]
+        divs = pd.DataFrame(index=ev_dts)
+        divs["Dividends"] = 0.1
+        divs["Back Adj."] = [0.99, 0.98, 0.97, 0.96, 0.95]
+        divs["FetchDate"] = pd.DatetimeIndex(fetch_dts).tz_convert(tz)
+        divs["Superseded div"] = 0.0
+        divs["Superseded back adj."] = 0.0
+        divs["Superseded div FetchDate"] = pd.NaT
+        splits = pd.DataFrame(index=ev_dts)
+        splits["Stock Splits"] = [2.0, 0.5, 3.0, 4.0, 10.0]
+        splits["FetchDate"] = divs["FetchDate"]
+        splits["Superseded split"] = 0.0
+        splits["Superseded split FetchDate"] = pd.NaT
+
+        expected = h.copy()
+        for events, col, adj_col, la_col in [(splits, "CSF", "Stock Splits", "LastSplitAdjustDt"), (divs, "CDF", "Back Adj.", "LastDivAdjustDt")]:
+            la_new = expected[la_col].copy()
+            for dt in events.index:
+                e = events.loc[dt]
+                f = (expected.index < dt) & (expected[la_col] < e["FetchDate"])
+                if col == "CSF":
+                    expected.loc[f, col] /= e[adj_col]
+                else:
+                    expected.loc[f, col] *= e[adj_col]
+                la_new[f] = np.maximum(la_new[f], e["FetchDate"])
+            expected[la_col] = la_new
+
+        yfcm.StoreCacheDatum(self.ticker, "history-1d", h)
+        hm = self._manager()
+        events = hm.GetHistory("Events")
+        events.divs = divs
+        events.splits = splits
+        ph = hm.GetHistory(yfcd.Interval.Days1)
+        ph._applyNewEvents()
+        for c in ["CSF", "CDF"]:
+            np.testing.assert_allclose(ph.h[c].to_numpy(), expected[c].to_numpy(), rtol=1e-12)
+        for c in ["LastSplitAdjustDt", "LastDivAdjustDt"]:
+            pd.testing.assert_series_equal(ph.h[c], expected[c], check_freq=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,7 @@ from .context import yfc_cache_manager as yfcm
 from .context import yfc_utils as yfcu
 from .context import yfc_ticker as yfc
 from .context import session_gbl
-from .utils import Test_Base
+from .utils import Test_Base, make_price_history
 import pickle as pkl
 
 import yfinance as yf
@@ -127,5 +127,55 @@ class Test_Yfc_Ticker(Test_Base):
         self.assertTrue(df1.equals(df6))
 
 
+class Test_Yfc_Ticker_Cached(unittest.TestCase):
+    # Only uses cached data, no fetches
+
+    def setUp(self):
+        self.tempCacheDir = tempfile.TemporaryDirectory()
+        yfcm.SetCacheDirpath(self.tempCacheDir.name)
+
+    def tearDown(self):
+        self.tempCacheDir.cleanup()
+
+    def test_exchange_and_tz(self):
+        info = {"exchange": "NMS", "exchangeTimezoneName": "America/New_York", "FetchDate": pd.Timestamp.now()}
+        yfcm.StoreCacheDatum("INTC", "info", info)
+        dat = yfc.Ticker("INTC")
+        self.assertEqual(dat._getExchangeAndTz(), ("NMS", "America/New_York"))
+        self.assertEqual(dat._getExchangeAndTz(), ("NMS", "America/New_York"))
+
+    def test_history_view_copies(self):
+        # Caller's writes to returned table never reach tables returned later,
+        # and tables built on a miss are not copied again
+        h = make_price_history(10)
+        h = h[h.index.dayofweek < 5]
+        yfcm.StoreCacheDatum("INTC", "history-1d", h)
+        dat = yfc.Ticker("INTC")
+        dat._exchange = "NMS"
+        dat._tz = "America/New_York"
+        args = {"start": h.index[0].date(), "end": h.index[-1].date()+timedelta(days=1), "adjust_divs": False}
+
+        dfs = []
+        for i in range(4):
+            df = dat.history(**args)
+            if i == 0:
+                ph = dat._histories_manager.GetHistory(yfcd.Interval.Days1)
+                view = ph._views[list(ph._views.keys())[0]][2]
+                if yfcu.IsCopyOnWrite():
+                    self.assertTrue(np.shares_memory(df["Close"].to_numpy(), view["Close"].to_numpy()))
+                else:
+                    self.assertIsNone(view)
+            df.iloc[0, 0] = 99.0
+            dfs.append(df)
+        for df in dfs:
+            self.assertEqual(df.iloc[0, 0], 99.0)
+        self.assertEqual(dat.history(**args).iloc[0, 0], h.iloc[0, 0])
+        self.assertEqual(dat.history(**args, copy=False).iloc[0, 0], h.iloc[0, 0])
+
+    def test_history_view_copies_cow(self):
+        with pd.option_context("mode.copy_on_write", True):
+            self.test_history_view_copies()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,6 @@
 import numpy as np
+import pandas as pd
+from zoneinfo import ZoneInfo
 import unittest
 from pprint import pprint
 
@@ -109,3 +111,25 @@ class Test_Base(unittest.TestCase):
                 print("- result:")
                 print(df.iloc[last_diff_idx])
                 raise
+
+
+def make_price_history(n=20, tz_name="America/New_York"):
+    tz = ZoneInfo(tz_name)
+    idx = pd.date_range(start="2022-01-03", periods=n, freq="D", tz=tz)
+    df = pd.DataFrame(index=idx)
+    df["Open"] = np.linspace(10.0, 20.0, n)
+    df["High"] = df["Open"] + 1.0
+    df["Low"] = df["Open"] - 1.0
+    df["Close"] = df["Open"] + 0.5
+    df["Volume"] = np.arange(n, dtype='int64') * 1000
+    df["Dividends"] = 0.0
+    df["Stock Splits"] = 0.0
+    df["Final?"] = True
+    df["C-Check?"] = True
+    df["Repaired?"] = False
+    df["FetchDate"] = pd.Timestamp("2022-02-01 12:00", tz=ZoneInfo("UTC")).tz_convert(tz)
+    df["CSF"] = 1.0
+    df["CDF"] = 1.0
+    df["LastDivAdjustDt"] = df["FetchDate"]
+    df["LastSplitAdjustDt"] = df["FetchDate"]
+    return df
@@ -2,8 +2,9 @@
 
 from .yfc_dat import Period, Interval
 from .yfc_ticker import Ticker, verify_cached_tickers_prices
-from .yfc_multi import download
+from .yfc_multi import download, read_cached
 from .yfc_logging import EnableLogging, DisableLogging
+from .yfc_cache_manager import EnableReadOnly, DisableReadOnly, GetStaleReads
 from .yfc_cache_manager import _option_manager as options
 
 from .yfc_upgrade import _init_options
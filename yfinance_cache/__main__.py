@@ -0,0 +1,70 @@
+import click
+
+from . import yfc_cache_manager as yfcm
+from . import yfc_store as yfcs
+from . import yfc_upgrade as yfcup
+
+
+@click.group()
+@click.option('--cache-dir', default=None, help='Cache folder, default is user cache folder')
+def cli(cache_dir):
+    if cache_dir is not None:
+        yfcm.SetCacheDirpath(cache_dir)
+
+
+@cli.command()
+@click.argument('backend', type=click.Choice(yfcs.backends))
+@click.option('--delete-source', is_flag=True, default=False, help='Delete files from old backend after copying')
+def migrate(backend, delete_source):
+    """Move cache into another storage backend"""
+    n = yfcm.MigrateCacheBackend(backend, delete_source=delete_source)
+    click.echo(f"Migrated {n} files to '{backend}' backend")
+
+
+@cli.command()
+@click.option('--processes', default=None, type=int, help='Number of worker processes, default #CPUs')
+@click.option('--restart', is_flag=True, default=False, help='Ignore progress of an interrupted upgrade')
+def upgrade(processes, restart):
+    """Upgrade every cached object to current schema and storage options"""
+    n = yfcup.MigrateCacheSchema(processes=processes, resume=not restart)
+    click.echo(f"Upgraded {n} objects")
+
+
+@cli.command()
+@click.option('--budget-mb', default=None, type=float, help='Size budget, default option cache.size_budget_mb')
+@click.option('--policy', default=None, type=click.Choice(yfcm.eviction_policies), help='Eviction order within tiers, default option cache.eviction_policy or lru')
+@click.option('--dry-run', is_flag=True, default=False, help='Only list what would be evicted')
+def evict(budget_mb, policy, dry_run):
+    """Evict cached objects until cache within size budget"""
+    evicted = yfcm.EnforceCacheSizeBudget(budget_mb=budget_mb, policy=policy, dry_run=dry_run)
+    for ticker, objectName, nbytes in evicted:
+        click.echo(f"{ticker}/{objectName} {nbytes/1024:.1f} KB")
+    verb = "Would evict" if dry_run else "Evicted"
+    click.echo(f"{verb} {len(evicted)} objects, {sum([e[2] for e in evicted])/(1024*1024):.1f} MB")
+
+
+def _split_arg(x):
+    return None if x is None else x.replace(',', ' ').split()
+
+
+@cli.command()
+@click.argument('archive')
+@click.option('--tickers', default=None, help='Only these tickers, comma-separated')
+@click.option('--intervals', default=None, help='Only these price intervals e.g. "1d,1wk", other data always included')
+def export(archive, tickers, intervals):
+    """Write cache into one archive file, compressed if name ends .gz"""
+    n = yfcm.ExportCache(archive, tickers=_split_arg(tickers), intervals=_split_arg(intervals))
+    click.echo(f"Exported {n} files to '{archive}'")
+
+
+@cli.command(name='import')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threads', default=0, type=int, help='Number of threads, default automatic')
+def import_(archive, threads):
+    """Load archive written by export into cache, verifying checksums"""
+    n = yfcm.ImportCache(archive, threads=True if threads == 0 else threads)
+    click.echo(f"Imported {n} files from '{archive}'")
+
+
+if __name__ == '__main__':
+    cli()
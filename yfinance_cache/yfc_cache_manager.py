@@ -1,13 +1,26 @@
 import os
+import io
+import atexit
 import pickle
 import json
+import zlib
+import copy
+import hashlib
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import appdirs
+import pandas as pd
 from pandas import Timedelta
 
 from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
 
 from . import yfc_dat as yfcd
+from . import yfc_manifest as yfcmf
+from . import yfc_store as yfcs
 from . import yfc_utils as yfcu
 
 # To reduce #files in cache, store some YF objects together into same file (including metadata)
@@ -18,6 +31,80 @@ packed_data_cats["annuals"]    = ["balance_sheet", "cashflow", "earnings", "fina
 quarterly_objects = packed_data_cats["quarterlys"]
 annual_objects    = packed_data_cats["annuals"]
 
+# Packed file layout: magic, table length, pickled offset table, then each
+# member pickled separately. So one member can be read or replaced without
+# decoding its siblings. Files without magic are legacy pickled dicts.
+packed_magic = b"YFCP"
+
+# Metadata & expiry are kept in a per-ticker sidecar file separate from
+# payloads, so reading or changing metadata never decodes the datum.
+sidecar_name = "_metadata"
+
+# Schema version of each object is recorded in sidecar when written.
+# Version 0 = written before versioning: metadata may be inside payload,
+# packed file may be single dict, price table may lack columns or have NaN CDF.
+# Upgrades are in yfc_upgrade.
+schema_version = 1
+
+# Price histories can be stored in a columnar format instead of pickle,
+# selected with option 'cache.price_format'. Requires module 'pyarrow'.
+price_formats = {"pickle": "pkl", "parquet": "parquet", "arrow": "arrow"}
+columnar_exts = ["parquet", "arrow"]
+datum_exts = ["json", "pkl"] + columnar_exts
+
+# Price histories can be updated by appending small delta segments instead of
+# rewriting whole file. Segments are folded back into file when thresholds reached.
+segment_max_count_default = 20
+segment_max_ratio_default = 0.5  # total segments size / file size
+
+# Pickled files can be compressed, selected with option 'cache.codec'.
+# Compressed files start with a header naming codec, so caches with
+# mixed codecs still read.
+codecs = ["none", "auto", "zlib", "lz4", "zstd"]
+codec_magic = b"YFCZ"
+codec_ids = {"zlib": 1, "lz4": 2, "zstd": 3}
+
+# Decoded objects are kept in memory, so repeated reads in same process skip disk.
+# Entries are validated against file mtime & size, and total size bounded by
+# option 'cache.memory_budget_mb' (0 = disable).
+memory_budget_mb_default = 256
+_mem_cache = OrderedDict()
+_mem_cache_nbytes = 0
+_mem_cache_lock = threading.Lock()
+
+# Optional SQLite index of cache contents, enabled with option 'cache.manifest'.
+# Built by scanning cache on first use, then maintained by writes.
+_manifest = None
+_manifest_disabled_checked = False
+_manifest_lock = threading.Lock()
+
+# Where cache files live, selected with option 'cache.backend'
+_store = None
+_store_lock = threading.Lock()
+
+# Read-only mode, e.g. for cache on shared or read-only mount: nothing written
+# or deleted. Expired objects are returned as-is, and recorded as stale.
+# Enable before import with environment variable YFC_READ_ONLY=1
+_read_only = os.environ.get("YFC_READ_ONLY", "0") not in ["", "0"]
+_stale = set()
+_stale_lock = threading.Lock()
+
+# Writers can mark a datum as validated, so readers can skip checks.
+# Strict mode is for debugging: readers check even validated data.
+_strict = False
+
+# Last read time of each object, for LRU eviction. Kept in memory, merged
+# into '_YFC_/access.pkl' at exit and before eviction.
+_access_times = {}
+_access_lock = threading.Lock()
+
+# Eviction when cache exceeds option 'cache.size_budget_mb'. Order is always
+# intraday prices, then other prices, then other objects, and last a ticker's
+# 1d prices with its events, because other intervals are adjusted from them.
+# Policy orders objects within those tiers.
+eviction_policies = ["lru", "oldest", "interval"]
+eviction_last_objects = ["history-1d", "dividends", "splits", "new_divs", "listing_date"]
+
 verbose = False
 # verbose = True
 
@@ -37,6 +124,7 @@ def ResetCacheDirpath():
 
 
 def SetCacheDirpath(dp):
+    _FlushAccessLog()
     global cacheDirpath
     cacheDirpath = dp
     if verbose:
@@ -45,6 +133,98 @@ def SetCacheDirpath(dp):
     global _option_manager
     _option_manager = OptionsManager()
 
+    ClearMemoryCache()
+    _CloseManifest()
+    _CloseStore()
+    global _manifest_disabled_checked
+    _manifest_disabled_checked = False
+
+
+def EnableReadOnly():
+    global _read_only
+    _read_only = True
+    # Reopen databases without write access
+    _CloseManifest()
+    _CloseStore()
+
+
+def DisableReadOnly():
+    global _read_only
+    global _manifest_disabled_checked
+    _read_only = False
+    _CloseManifest()
+    _CloseStore()
+    _manifest_disabled_checked = False
+
+
+def IsReadOnly():
+    return _read_only
+
+
+def EnableStrictMode():
+    global _strict
+    _strict = True
+
+
+def DisableStrictMode():
+    global _strict
+    _strict = False
+
+
+def IsStrictMode():
+    return _strict
+
+
+def MarkStale(ticker, objectName):
+    with _stale_lock:
+        _stale.add((ticker, objectName))
+
+
+def GetStaleReads():
+    # (ticker, object) pairs read past their expiry while in read-only mode
+    with _stale_lock:
+        return sorted(_stale)
+
+
+def ClearStaleReads():
+    with _stale_lock:
+        _stale.clear()
+
+
+def GetBackend():
+    b = _option_manager.cache.backend
+    if b is None:
+        b = "directory"
+    return b
+
+
+def _GetStore():
+    global _store
+    b = GetBackend()
+    if _store is not None and _store.name == b:
+        return _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        if b == "sqlite":
+            _store = yfcs.SqliteStore(GetCacheDirpath(), os.path.join(GetCacheDirpath(), "_YFC_", "cache.db"), read_only=_read_only)
+        else:
+            _store = yfcs.DirectoryStore(GetCacheDirpath())
+    ClearMemoryCache()
+    return _store
+
+
+def _CloseStore():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+
+def GetFileModifiedTime(fp):
+    return datetime.fromtimestamp(_GetStore().stat(fp)[0] / 1e9)
+
 
 def IsObjectInPackedData(objectName):
     for k in packed_data_cats.keys():
@@ -60,36 +240,73 @@ def GetPackedDataCat(objectName):
     return None
 
 
+def GetPriceFormat():
+    fmt = _option_manager.cache.price_format
+    if fmt is None:
+        fmt = "pickle"
+    return fmt
+
+
+def IsMmapEnabled():
+    return _option_manager.cache.mmap is True
+
+
+def IsDatumMemoryMapped(ticker, objectName):
+    # Arrow IPC files are memory-mapped if option 'cache.mmap' set.
+    # Columns of these DataFrames are read-only views of the OS page cache,
+    # so caller must copy before modifying in-place.
+    if not IsMmapEnabled():
+        return False
+    fp = GetFilepath(ticker, objectName)
+    if fp is None or not fp.endswith(".arrow") or _GetStore().local_path(fp) is None:
+        return False
+    return len(_ListSegments(fp)) == 0
+
+
+def IsSegmentLogEnabled():
+    return _option_manager.cache.price_segments is True
+
+
+def IsDeriveIntervalsEnabled():
+    return _option_manager.cache.derive_intervals is True
+
+
+def _GetDatumExt(objectName, obj):
+    if isinstance(obj, (list, int, float, str, datetime, date, timedelta)):
+        return "json"
+    if objectName.startswith("history-") and isinstance(obj, pd.DataFrame):
+        return price_formats[GetPriceFormat()]
+    return "pkl"
+
+
 def GetFilepath(ticker, objectName, obj=None, prune=False):
     if IsObjectInPackedData(objectName):
         return GetFilepathPacked(ticker, objectName)
 
+    st = _GetStore()
     fp = None
+    fp_base = os.path.join(GetCacheDirpath(), ticker, objectName)
     if obj is not None:
-        if isinstance(obj, (list, int, float, str, datetime, date, timedelta)):
-            ext = "json"
-            ext2 = "pkl"
-        else:
-            ext = "pkl"
-            ext2 = "json"
-        fp = os.path.join(GetCacheDirpath(), ticker, objectName) + "."+ext
-        fp2 = os.path.join(GetCacheDirpath(), ticker, objectName) + "."+ext2
-        if os.path.isfile(fp2):
-            if prune:
-                os.remove(fp2)
-            else:
-                raise Exception("For {} object {}/{}, a {} file already exists".format(ext, ticker, objectName, ext2))
+        ext = _GetDatumExt(objectName, obj)
+        fp = fp_base + "."+ext
+        for ext2 in datum_exts:
+            if ext2 == ext:
+                continue
+            fp2 = fp_base + "."+ext2
+            if st.isfile(fp2):
+                if prune:
+                    st.remove(fp2)
+                else:
+                    raise Exception("For {} object {}/{}, a {} file already exists".format(ext, ticker, objectName, ext2))
     else:
-        fp_base = os.path.join(GetCacheDirpath(), ticker, objectName)
-        json_exists = os.path.isfile(fp_base+".json")
-        pkl_exists = os.path.isfile(fp_base+".pkl")
-        if json_exists and pkl_exists:
-            raise Exception("For cached datum '{0}', both a .json and .pkl file exist. Should only be one.".format(objectName))
-        elif json_exists:
-            fp = fp_base + ".json"
-        elif pkl_exists:
-            fp = fp_base + ".pkl"
+        fps = [fp_base+"."+ext for ext in datum_exts if st.isfile(fp_base+"."+ext)]
+        if len(fps) > 1:
+            raise Exception("For cached datum '{0}', multiple files exist: {1}. Should only be one.".format(objectName, [os.path.basename(x) for x in fps]))
+        elif len(fps) == 1:
+            fp = fps[0]
     return fp
+
+
 def GetFilepathPacked(ticker, objectName):
     if not IsObjectInPackedData(objectName):
         return GetFilepath(ticker, objectName)
@@ -102,20 +319,23 @@ def IsDatumCached(ticker, objectName):
     if verbose:
         print("IsDatumCached({0}, {1})".format(ticker, objectName))
 
+    m = _GetManifest()
+    if m is not None:
+        return m.get(ticker, objectName) is not None
+
+    st = _GetStore()
     fp = GetFilepath(ticker, objectName)
-    if fp is None or (not os.path.isfile(fp)):
+    if fp is None or (not st.isfile(fp)):
         return False
 
     if IsObjectInPackedData(objectName):
-        if os.path.isfile(fp):
-            with open(fp, 'rb') as inData:
-                packedData = pickle.load(inData)
-            return objectName in packedData.keys()
+        if st.isfile(fp):
+            return objectName in _ListPackedMembers(fp)
     else:
-        if os.path.isfile(fp):
-            if os.path.getsize(fp) == 0:
+        if st.isfile(fp):
+            if st.getsize(fp) == 0:
                 # Corrupt
-                os.remove(fp)
+                st.remove(fp)
                 return False
             else:
                 return True
@@ -123,59 +343,803 @@ def IsDatumCached(ticker, objectName):
             return False
 
 
-def _ReadData(ticker, objectName):
-    d = None
+def _ImportPyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ModuleNotFoundError:
+        raise Exception("Columnar cache formats 'parquet' and 'arrow' require Python module 'pyarrow'")
+    return pyarrow
+
+
+def _ImportCodec(codec):
+    try:
+        if codec == "zstd":
+            import zstandard
+            return zstandard
+        elif codec == "lz4":
+            import lz4.frame
+            return lz4.frame
+    except ModuleNotFoundError:
+        raise Exception(f"Cache codec '{codec}' requires Python module '{'zstandard' if codec == 'zstd' else 'lz4'}'")
+    return zlib
+
+
+def GetCodec():
+    codec = _option_manager.cache.codec
+    if codec is None:
+        codec = "none"
+    elif codec == "auto":
+        # Best installed
+        for c in ["zstd", "lz4"]:
+            try:
+                _ImportCodec(c)
+                return c
+            except Exception:
+                pass
+        codec = "zlib"
+    return codec
+
+
+def _PickleDumps(obj):
+    data = pickle.dumps(obj, 4)
+    codec = GetCodec()
+    if codec == "none":
+        return data
+    m = _ImportCodec(codec)
+    if codec == "zstd":
+        data = m.ZstdCompressor(level=3).compress(data)
+    elif codec == "lz4":
+        data = m.compress(data)
+    else:
+        data = m.compress(data, 6)
+    return codec_magic + bytes([codec_ids[codec]]) + data
+
+
+def _PickleLoads(data):
+    if data[:len(codec_magic)] == codec_magic:
+        codec_id = data[len(codec_magic)]
+        codec = [k for k, v in codec_ids.items() if v == codec_id]
+        if len(codec) == 0:
+            raise Exception(f"Cache file compressed with unknown codec id {codec_id}")
+        codec = codec[0]
+        m = _ImportCodec(codec)
+        data = data[len(codec_magic)+1:]
+        if codec == "zstd":
+            data = m.ZstdDecompressor().decompress(data)
+        else:
+            data = m.decompress(data)
+    return pickle.loads(data)
+
+
+def _RestoreZoneInfo(df):
+    # pyarrow restores timezones as pytz, but YFC works with ZoneInfo
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        df.index = df.index.tz_convert(ZoneInfo(str(df.index.tz)))
+    for c in df.columns:
+        tz = getattr(df[c].dtype, "tz", None)
+        if tz is not None:
+            df[c] = df[c].dt.tz_convert(ZoneInfo(str(tz)))
+    return df
+
+
+def _WriteColumnar(fp, d):
+    pa = _ImportPyarrow()
+    table = pa.Table.from_pandas(d["data"], preserve_index=True)
+    # Store YFC metadata & expiry in schema, so payload stays pure table
+    yfc_md = {k: v for k, v in d.items() if k != "data"}
+    schema_md = dict(table.schema.metadata)
+    schema_md[b"yfc"] = pickle.dumps(yfc_md, 4)
+    table = table.replace_schema_metadata(schema_md)
+    sink = pa.BufferOutputStream()
+    if fp.endswith(".parquet"):
+        pa.parquet.write_table(table, sink)
+    else:
+        # Arrow IPC must stay uncompressed to be memory-mappable
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Store replaces file by rename, because truncating a file
+    # that other processes have memory-mapped would crash them.
+    _GetStore().write(fp, sink.getvalue().to_pybytes())
+
+
+def _ReadColumnar(fp, columns=None):
+    # If 'columns' set, only those columns (and index) are decoded
+    pa = _ImportPyarrow()
+    st = _GetStore()
+    if fp.endswith(".parquet"):
+        if columns is None:
+            table = pa.parquet.read_table(pa.BufferReader(st.read(fp)))
+        else:
+            # Reading from file only reads pages of requested columns
+            src = st.local_path(fp)
+            pf = pa.parquet.ParquetFile(pa.BufferReader(st.read(fp)) if src is None else src)
+            _CheckColumns(pf.schema_arrow, columns)
+            table = pf.read(columns=columns, use_pandas_metadata=True)
+        df = table.to_pandas()
+    elif IsMmapEnabled() and st.local_path(fp) is not None:
+        # Zero-copy: numeric columns reference the mapped file
+        table = pa.ipc.open_file(pa.memory_map(st.local_path(fp), 'r')).read_all()
+        if columns is not None:
+            table = _SelectColumns(table, columns)
+        df = table.to_pandas(split_blocks=True)
+    else:
+        table = pa.ipc.open_file(pa.BufferReader(st.read(fp))).read_all()
+        if columns is not None:
+            table = _SelectColumns(table, columns)
+        df = table.to_pandas()
+    d = {}
+    if table.schema.metadata is not None and b"yfc" in table.schema.metadata:
+        d = pickle.loads(table.schema.metadata[b"yfc"])
+    d["data"] = _RestoreZoneInfo(df)
+    return d
 
-    fp = GetFilepath(ticker, objectName)
-    if fp is None or (not os.path.isfile(fp)):
+
+def _CheckColumns(schema, columns):
+    missing = [c for c in columns if c not in schema.names]
+    if len(missing) > 0:
+        raise KeyError(f"{missing} not in cached table")
+
+
+def _SelectColumns(table, columns):
+    _CheckColumns(table.schema, columns)
+    index_cols = [c for c in table.schema.pandas_metadata["index_columns"] if isinstance(c, str)]
+    return table.select(list(columns) + index_cols)
+
+
+def _GetSegmentsDirpath(fp):
+    return os.path.splitext(fp)[0] + ".segments"
+
+
+def _ListSegments(fp):
+    dp = _GetSegmentsDirpath(fp)
+    return sorted([os.path.join(dp, f) for f in _GetStore().listdir(dp) if f.endswith(".pkl")])
+
+
+def _MergeSegments(df, seg_fps):
+    # Apply segments in order: later upserts replace earlier rows, deletes remove rows.
+    upserts = None
+    deletes = pd.Index([])
+    for sfp in seg_fps:
+        seg = _PickleLoads(_GetStore().read(sfp))
+        seg_ups = seg["upserts"]
+        seg_dels = seg["deletes"]
+        if upserts is not None:
+            upserts = upserts[~upserts.index.isin(seg_ups.index.union(seg_dels))]
+            upserts = pd.concat([upserts, seg_ups])
+        else:
+            upserts = seg_ups
+        deletes = deletes.union(seg_dels).difference(seg_ups.index)
+    if upserts is None:
+        return df
+    df = df[~df.index.isin(deletes.union(upserts.index))]
+    if not upserts.empty:
+        df = pd.concat([df, upserts])
+    return df.sort_index()
+
+
+def _WriteData(fp, d, entry=None):
+    # 'entry' = sidecar entry about to be written, else current one applies
+    # TODO: use module 'safer' to avoid writes being corrupted
+    if _read_only:
+        return
+    st = _GetStore()
+    ext = fp.split('.')[-1]
+    if ext == "json":
+        st.write(fp, json.dumps(d, default=yfcu.JsonEncodeValue).encode())
+    elif ext in columnar_exts:
+        _WriteColumnar(fp, d)
+    else:
+        st.write(fp, _PickleDumps(d))
+
+    # File now contains everything, so any segments are obsolete
+    st.rmtree(_GetSegmentsDirpath(fp))
+    _MemCacheInvalidate(fp)
+    _ManifestRecord(fp, d, entry)
+
+
+def _RemoveData(fp):
+    if _read_only:
+        return
+    st = _GetStore()
+    st.remove(fp)
+    st.rmtree(_GetSegmentsDirpath(fp))
+    _MemCacheInvalidate(fp)
+    ticker, objectName = _GetDatumKey(fp)
+    _WriteSidecarEntry(ticker, objectName, None)
+    m = _GetManifest()
+    if m is not None:
+        m.remove(ticker, objectName)
+
+
+def IsManifestEnabled():
+    return _option_manager.cache.manifest is True
+
+
+def _GetManifestFilepath():
+    return os.path.join(GetCacheDirpath(), "_YFC_", "manifest.db")
+
+
+def _GetManifest():
+    global _manifest
+    global _manifest_disabled_checked
+    if not IsManifestEnabled():
+        if _read_only:
+            return None
+        if not _manifest_disabled_checked or _manifest is not None:
+            # Writes no longer maintain manifest, so delete it.
+            # Re-enabling will rebuild it.
+            _CloseManifest()
+            if os.path.isfile(_GetManifestFilepath()):
+                os.remove(_GetManifestFilepath())
+            _manifest_disabled_checked = True
         return None
+    with _manifest_lock:
+        if _manifest is None:
+            if _read_only:
+                # Can't build, so only use existing manifest
+                if not os.path.isfile(_GetManifestFilepath()):
+                    return None
+                _manifest = yfcmf.CacheManifest(_GetManifestFilepath(), read_only=True)
+                return _manifest
+            _manifest = yfcmf.CacheManifest(_GetManifestFilepath())
+            if _manifest.is_new:
+                _BuildManifest(_manifest)
+    return _manifest
+
+
+def _CloseManifest():
+    global _manifest
+    with _manifest_lock:
+        if _manifest is not None:
+            _manifest.close()
+            _manifest = None
+
+
+def _GetDatumKey(fp):
+    # File path -> (ticker, objectName)
+    ticker = os.path.basename(os.path.dirname(fp))
+    objectName = os.path.splitext(os.path.basename(fp))[0]
+    return ticker, objectName
+
+
+def _GetDatumSize(fp):
+    st = _GetStore()
+    mtime_ns, size, _ = st.stat(fp)
+    for f in _ListSegments(fp):
+        size += st.getsize(f)
+    return size, mtime_ns / 1e9
+
+
+def _GetRelativePath(fp):
+    # Path relative to cache folder, '/'-separated, so survives moving cache
+    return os.path.relpath(fp, GetCacheDirpath()).replace(os.sep, '/')
+
+
+def _GetAbsolutePath(rel_fp):
+    if os.path.isabs(rel_fp):
+        # Recorded by older version
+        return rel_fp
+    return os.path.join(GetCacheDirpath(), *rel_fp.split('/'))
+
+
+def _ManifestRecord(fp, d, entry=None):
+    m = _GetManifest()
+    if m is None:
+        return
+    ticker, objectName = _GetDatumKey(fp)
+    size, mtime = _GetDatumSize(fp)
+    first, last = yfcmf.GetDataRange(d["data"])
+    if entry is None:
+        _, expiry = _GetMetadataAndExpiry(ticker, objectName, d)
+    else:
+        expiry = entry["expiry"]
+    m.upsert(ticker, objectName, _GetRelativePath(fp), size, mtime, expiry, first, last)
+
 
+def _ManifestRecordPacked(fp, objectName, objData, entry=None):
+    m = _GetManifest()
+    if m is None:
+        return
+    ticker = os.path.basename(os.path.dirname(fp))
+    mtime_ns, size, _ = _GetStore().stat(fp)
+    if objData is None:
+        m.remove(ticker, objectName)
+    else:
+        first, last = yfcmf.GetDataRange(objData["data"])
+        if entry is None:
+            _, expiry = _GetMetadataAndExpiry(ticker, objectName, objData)
+        else:
+            expiry = entry["expiry"]
+        m.upsert(ticker, objectName, _GetRelativePath(fp), size, mtime_ns / 1e9, expiry, first, last)
+    m.touch_path(_GetRelativePath(fp), size, mtime_ns / 1e9)
+
+
+def _BuildManifest(m):
+    # Only stat files & read sidecars, decoding every object would take long
+    # for big caches. Data ranges filled in as objects are read.
+    if verbose:
+        print("Building cache manifest")
+    m.clear()
+    st = _GetStore()
+    d = GetCacheDirpath()
+    for ticker in st.listdir(d):
+        td = os.path.join(d, ticker)
+        if ticker == "_YFC_" or not st.isdir(td):
+            continue
+        sc = _ReadSidecar(ticker)
+        rows = []
+        for f in st.listdir(td):
+            fp = os.path.join(td, f)
+            objectName, ext = os.path.splitext(f)
+            ext = ext[1:]
+            if ext not in datum_exts or objectName == sidecar_name or not st.isfile(fp):
+                continue
+            if objectName in packed_data_cats:
+                mtime_ns, size, _ = st.stat(fp)
+                for k in _ListPackedMembers(fp):
+                    expiry = sc[k]["expiry"] if k in sc else None
+                    rows.append((ticker, k, _GetRelativePath(fp), size, mtime_ns / 1e9, expiry, None, None, False))
+            else:
+                if st.getsize(fp) == 0:
+                    continue
+                size, mtime = _GetDatumSize(fp)
+                expiry = sc[objectName]["expiry"] if objectName in sc else None
+                rows.append((ticker, objectName, _GetRelativePath(fp), size, mtime, expiry, None, None, False))
+        if len(rows) > 0:
+            m.upsert_many(rows)
+
+
+def _ManifestFillPacked(fp, objectName, objData):
+    # Complete manifest entry built without reading packed member
+    if _read_only or objData is None:
+        return
+    m = _GetManifest()
+    if m is None:
+        return
+    e = m.get(os.path.basename(os.path.dirname(fp)), objectName)
+    if e is not None and not e["complete"]:
+        _ManifestRecordPacked(fp, objectName, objData)
+
+
+def RebuildCacheManifest():
+    if _read_only:
+        raise Exception("Cache is read-only, cannot rebuild manifest")
+    m = _GetManifest()
+    if m is None:
+        raise Exception("Cache manifest not enabled, set option 'cache.manifest'")
+    with _manifest_lock:
+        _BuildManifest(m)
+
+
+def GetCacheManifestEntry(ticker, objectName):
+    # Returns dict with keys: path, size, mtime, expiry, first_ts, last_ts.
+    # None if not cached.
+    m = _GetManifest()
+    if m is None:
+        raise Exception("Cache manifest not enabled, set option 'cache.manifest'")
+    e = m.get(ticker, objectName)
+    if e is not None and not e["complete"] and not _read_only:
+        # Read object to fill in its data range
+        if IsObjectInPackedData(objectName):
+            _ManifestFillPacked(_GetAbsolutePath(e["path"]), objectName, _ReadPackedMember(_GetAbsolutePath(e["path"]), objectName, copy=False))
+        else:
+            _ReadData(ticker, objectName)
+        e = m.get(ticker, objectName)
+    if e is not None:
+        e["path"] = _GetAbsolutePath(e["path"])
+    return e
+
+
+def GetCachedTickers(include_exchanges=False):
+    m = _GetManifest()
+    if m is not None:
+        tkrs = m.tickers()
+    else:
+        st = _GetStore()
+        d = GetCacheDirpath()
+        tkrs = [x for x in st.listdir(d) if st.isdir(os.path.join(d, x))]
+    if include_exchanges:
+        return [x for x in tkrs if x.startswith("exchange-") or '_' not in x]
+    return [x for x in tkrs if not x.startswith("exchange-") and '_' not in x]
+
+
+def ListCachedObjects(ticker):
+    # Names of all objects cached for ticker, including packed members
+    st = _GetStore()
+    td = os.path.join(GetCacheDirpath(), ticker)
+    names = []
+    for f in st.listdir(td):
+        objectName, ext = os.path.splitext(f)
+        if ext[1:] not in datum_exts or objectName == sidecar_name or not st.isfile(os.path.join(td, f)):
+            continue
+        if objectName in packed_data_cats:
+            names += _ListPackedMembers(os.path.join(td, f))
+        else:
+            names.append(objectName)
+    return sorted(names)
+
+
+def ClearMemoryCache():
+    global _mem_cache_nbytes
+    with _mem_cache_lock:
+        _mem_cache.clear()
+        _mem_cache_nbytes = 0
+
+
+def _GetFileSignature(fp):
+    mtime_ns, size, version = _GetStore().stat(fp)
+    return (mtime_ns, size, version, tuple(_ListSegments(fp)))
+
+
+def _MemCacheGet(fp, sig):
+    with _mem_cache_lock:
+        if fp not in _mem_cache:
+            return None
+        e = _mem_cache[fp]
+        if e["sig"] != sig:
+            return None
+        _mem_cache.move_to_end(fp)
+        return e
+
+
+def _MemCachePut(fp, sig, obj, shared=False, nbytes=None):
+    global _mem_cache_nbytes
+    budget = _option_manager.cache.memory_budget_mb
+    if budget is None:
+        budget = memory_budget_mb_default
+    budget *= 1024*1024
+    if nbytes is not None:
+        pass
+    elif isinstance(obj, dict) and isinstance(obj.get("data"), pd.DataFrame):
+        nbytes = int(obj["data"].memory_usage(index=True).sum())
+    else:
+        nbytes = sig[1]
+    _MemCacheInvalidate(fp)
+    if nbytes > budget:
+        return
+    with _mem_cache_lock:
+        _mem_cache[fp] = {"sig": sig, "obj": obj, "nbytes": nbytes, "shared": shared}
+        _mem_cache_nbytes += nbytes
+        while _mem_cache_nbytes > budget:
+            _, e = _mem_cache.popitem(last=False)
+            _mem_cache_nbytes -= e["nbytes"]
+
+
+def _MemCacheInvalidate(fp):
+    global _mem_cache_nbytes
+    with _mem_cache_lock:
+        e = _mem_cache.pop(fp, None)
+        if e is not None:
+            _mem_cache_nbytes -= e["nbytes"]
+
+
+def _CopyData(d, shared=False, columns=None):
+    # Caller may modify returned object, so protect cached version.
+    # Except memory-mapped DataFrames, they are read-only.
+    d2 = dict(d)
+    for k in d2:
+        if k == "data" and columns is not None and isinstance(d2[k], pd.DataFrame):
+            # Selecting columns already copies
+            d2[k] = d2[k][columns]
+            continue
+        if k == "data" and shared:
+            continue
+        if isinstance(d2[k], pd.DataFrame):
+            d2[k] = d2[k].copy()
+        elif not isinstance(d2[k], (int, float, str, datetime, date, timedelta)):
+            d2[k] = copy.deepcopy(d2[k])
+    return d2
+
+
+def _ReadData(ticker, objectName, columns=None):
+    m = _GetManifest()
+    if m is not None:
+        # Skip probing each possible file extension
+        me = m.get(ticker, objectName)
+        if me is None:
+            return None
+        fp = _GetAbsolutePath(me["path"])
+        try:
+            sig = _GetFileSignature(fp)
+        except FileNotFoundError:
+            m.remove(ticker, objectName)
+            return None
+    else:
+        fp = GetFilepath(ticker, objectName)
+        if fp is None or (not _GetStore().isfile(fp)):
+            return None
+        sig = _GetFileSignature(fp)
+
+    e = _MemCacheGet(fp, sig)
+    if e is not None:
+        return _CopyData(e["obj"], e["shared"], columns)
+
+    if columns is not None and fp.split('.')[-1] in columnar_exts and len(sig[3]) == 0:
+        # Only decode requested columns. Partial table not kept in memory cache.
+        return _ReadColumnar(fp, columns)
+
+    d = _DecodeData(ticker, objectName, fp, sig[3])
+    if m is not None and not me["complete"] and not _read_only:
+        # Manifest built without reading object
+        _ManifestRecord(fp, d)
+    shared = fp.endswith(".arrow") and IsMmapEnabled() and len(sig[3]) == 0 and _GetStore().local_path(fp) is not None
+    _MemCachePut(fp, sig, d, shared)
+    return _CopyData(d, shared, columns)
+
+
+def _DecodeData(ticker, objectName, fp, seg_fps):
+    d = None
     if fp.endswith(".json"):
-        with open(fp, 'r') as inData:
-            d = json.load(inData, object_hook=yfcu.JsonDecodeDict)
+        d = json.loads(_GetStore().read(fp), object_hook=yfcu.JsonDecodeDict)
+    elif fp.split('.')[-1] in columnar_exts:
+        d = _ReadColumnar(fp)
     else:
-        with open(fp, 'rb') as inData:
-            d = pickle.load(inData)
+        d = _PickleLoads(_GetStore().read(fp))
         if not isinstance(d, dict):
             raise Exception("Pickled '{}/{}' data should be dict, but is {}".format(ticker, objectName, type(d)))
         if "data" not in d.keys():
             print(fp)
             raise Exception("Pickled dict missing 'data' key: {}".format(d.keys()))
+
+    if len(seg_fps) > 0:
+        d["data"] = _MergeSegments(d["data"], seg_fps)
     return d
 
 
-def _ReadPackedData(ticker, objectName):
-    d = None
+def _ReadPackedIndex(fp, sig=None):
+    # Returns (offset table, data start). Table is None if legacy file.
+    if sig is None:
+        sig = _GetFileSignature(fp)
+    e = _MemCacheGet(fp, sig)
+    if e is not None:
+        return e["obj"]
+    st = _GetStore()
+    head = st.read_range(fp, 0, 8)
+    n = 0
+    if head[:4] != packed_magic:
+        index = (None, 0)
+    else:
+        n = int.from_bytes(head[4:8], 'little')
+        index = (pickle.loads(st.read_range(fp, 8, n)), 8+n)
+    _MemCachePut(fp, sig, index, nbytes=n)
+    return index
+
+
+def _ReadPackedLegacy(fp):
+    pkData = _PickleLoads(_GetStore().read(fp))
+    if not isinstance(pkData, dict):
+        raise Exception("Pickled '{}' packed-data should be dict, but is {}".format(fp, type(pkData)))
+    return pkData
+
+
+def _ListPackedMembers(fp):
+    table, _ = _ReadPackedIndex(fp)
+    if table is None:
+        return list(_ReadPackedLegacy(fp).keys())
+    return list(table.keys())
+
+
+def _ReadPackedMember(fp, objectName, copy=True):
+    st = _GetStore()
+    if not st.isfile(fp):
+        return None
+    sig = _GetFileSignature(fp)
+    key = fp + "#" + objectName
+    e = _MemCacheGet(key, sig)
+    if e is not None:
+        objData = e["obj"]
+    else:
+        table, start = _ReadPackedIndex(fp, sig)
+        if table is None:
+            objData = _ReadPackedLegacy(fp).get(objectName)
+        elif objectName in table:
+            offset, length = table[objectName]
+            objData = _PickleLoads(st.read_range(fp, start+offset, length))
+        else:
+            objData = None
+        if objData is None:
+            return None
+        _MemCachePut(key, sig, objData)
+    if copy:
+        objData = _CopyData(objData)
+    return objData
+
+
+def _WritePackedMember(fp, objectName, objData, entry=None):
+    # Replace one member, or delete if objData is None.
+    # Siblings are copied as raw bytes, not decoded. 'entry' as _WriteData().
+    if _read_only:
+        return
+    st = _GetStore()
+    blobs = {}
+    if st.isfile(fp):
+        table, start = _ReadPackedIndex(fp)
+        if table is None:
+            blobs = {k: _PickleDumps(v) for k, v in _ReadPackedLegacy(fp).items()}
+        else:
+            data = st.read(fp)
+            blobs = {k: data[start+o:start+o+n] for k, (o, n) in table.items()}
+    old_names = list(blobs.keys())
+    if objData is None:
+        blobs.pop(objectName, None)
+    else:
+        blobs[objectName] = _PickleDumps(objData)
+
+    table = {}
+    offset = 0
+    for k, b in blobs.items():
+        table[k] = (offset, len(b))
+        offset += len(b)
+    table_bytes = pickle.dumps(table, 4)
+    st.write(fp, packed_magic + len(table_bytes).to_bytes(4, 'little') + table_bytes + b"".join(blobs.values()))
+
+    _MemCacheInvalidate(fp)
+    for k in set(old_names + [objectName]):
+        _MemCacheInvalidate(fp + "#" + k)
+    if objData is None:
+        _WriteSidecarEntry(os.path.basename(os.path.dirname(fp)), objectName, None)
+    _ManifestRecordPacked(fp, objectName, objData, entry)
+
+
+def _GetSidecarFilepath(ticker):
+    return os.path.join(GetCacheDirpath(), ticker, sidecar_name+".pkl")
+
+
+def _ReadSidecar(ticker):
+    # Returned dict is shared with in-memory cache, don't modify
+    fp = _GetSidecarFilepath(ticker)
+    st = _GetStore()
+    if not st.isfile(fp):
+        return {}
+    sig = _GetFileSignature(fp)
+    e = _MemCacheGet(fp, sig)
+    if e is not None:
+        return e["obj"]
+    sc = _PickleLoads(st.read(fp))
+    _MemCachePut(fp, sig, sc)
+    return sc
+
+
+def _GetSidecarEntry(ticker, objectName):
+    # Returns {"metadata": dict or None, "expiry": datetime or None},
+    # or None if object not in sidecar = legacy, metadata inside payload.
+    e = _ReadSidecar(ticker).get(objectName)
+    if e is not None:
+        e = copy.deepcopy(e)
+    return e
+
+
+def _WriteSidecarEntry(ticker, objectName, entry):
+    # entry = None to delete
+    if _read_only:
+        return
+    if _ReadSidecar(ticker).get(objectName) == entry:
+        return
+
+    # Other processes may be writing other objects' entries, so re-read under lock
+    def _update(data):
+        sc = {} if data is None else _PickleLoads(data)
+        if sc.get(objectName) == entry:
+            return None
+        if entry is None:
+            del sc[objectName]
+        else:
+            sc[objectName] = entry
+        return _PickleDumps(sc)
+
+    fp = _GetSidecarFilepath(ticker)
+    _GetStore().update(fp, _update)
+    _MemCacheInvalidate(fp)
+
+
+def _GetMetadataAndExpiry(ticker, objectName, d):
+    # Metadata from sidecar, falling back to legacy payload 'd'
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is not None:
+        return e["metadata"], e["expiry"]
+    if d is None:
+        return None, None
+    md     = d["metadata"] if "metadata" in d else None
+    expiry = d["expiry"]   if "expiry"   in d else None
+    return md, expiry
+
+
+def GetCacheDatumNbytes(ticker, objectName):
+    # Size of datum as stored, including delta segments. 0 if not cached.
     fp = GetFilepath(ticker, objectName)
-    if os.path.isfile(fp):
-        with open(fp, 'rb') as inData:
-            d = pickle.load(inData)
-        if not isinstance(d, dict):
-            raise Exception("Pickled '{}/{}' packed-data should be dict, but is {}".format(ticker, objectName, type(d)))
-    return d
+    if fp is None or not _GetStore().isfile(fp):
+        return 0
+    if IsObjectInPackedData(objectName):
+        table, _ = _ReadPackedIndex(fp)
+        if table is None:
+            return _GetStore().getsize(fp)
+        return table[objectName][1] if objectName in table else 0
+    return _GetDatumSize(fp)[0]
+
 
+def GetCacheDatumSchema(ticker, objectName):
+    e = _ReadSidecar(ticker).get(objectName)
+    if e is None or "schema" not in e:
+        return 0
+    return e["schema"]
 
-def ReadCacheDatum(ticker, objectName, return_metadata_too=False):
+
+def IsDatumValidated(ticker, objectName):
+    # True if last write marked datum as validated
+    e = _ReadSidecar(ticker).get(objectName)
+    return e is not None and e.get("validated", False)
+
+
+def MarkDatumValidated(ticker, objectName):
+    # Datum checked after load, so mark without rewriting data
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is None or e.get("validated", False):
+        return
+    e["validated"] = True
+    _WriteSidecarEntry(ticker, objectName, e)
+
+
+def IsDatumStorageCurrent(ticker, objectName):
+    # False if file not in current price format or codec, or is legacy packed file.
+    # Then next write would convert it.
+    fp = GetFilepath(ticker, objectName)
+    if fp is None:
+        return True
+    ext = fp.split('.')[-1]
+    offset = 0
+    if IsObjectInPackedData(objectName):
+        table, start = _ReadPackedIndex(fp)
+        if table is None:
+            return False
+        if objectName not in table:
+            return True
+        offset = start + table[objectName][0]
+    elif objectName.startswith("history-") and ext != price_formats[GetPriceFormat()]:
+        return False
+    if ext != "pkl":
+        return True
+    codec = GetCodec()
+    head = _GetStore().read_range(fp, offset, len(codec_magic)+1)
+    if head[:len(codec_magic)] != codec_magic:
+        return codec == "none"
+    return codec != "none" and head[len(codec_magic)] == codec_ids[codec]
+
+
+def ReadCacheDatum(ticker, objectName, return_metadata_too=False, columns=None):
+    # 'columns' = only return these columns of a DataFrame datum.
+    # Arrow & Parquet price tables then only decode those columns.
     if verbose:
         print("ReadCacheDatum({0}, {1})".format(ticker, objectName))
 
     if IsObjectInPackedData(objectName):
+        if columns is not None:
+            raise ValueError("'columns' not supported for packed data")
         return ReadCachePackedDatum(ticker, objectName, return_metadata_too)
 
     data = None ; md = None
-    d = _ReadData(ticker, objectName)
+    d = _ReadData(ticker, objectName, columns)
     if d is not None:
-        data   = d["data"]
-        md     = d["metadata"] if "metadata" in d else None
-        expiry = d["expiry"]   if "expiry"   in d else None
+        with _access_lock:
+            _access_times[(ticker, objectName)] = time.time()
+        data = d["data"]
+        if columns is not None and not isinstance(data, pd.DataFrame):
+            raise ValueError(f"'columns' only supported for DataFrame data, '{objectName}' is {type(data)}")
+        md, expiry = _GetMetadataAndExpiry(ticker, objectName, d)
 
         if expiry is not None:
             dtnow = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
-            if dtnow >= expiry:
+            if dtnow >= expiry and _read_only:
+                # Can't delete, so return stale datum
+                MarkStale(ticker, objectName)
+                if md is None:
+                    md = {}
+                md["__stale__"] = True
+            elif dtnow >= expiry:
                 if verbose:
                     print("Deleting expired datum '{0}/{1}'".format(ticker, objectName))
                 fp = GetFilepath(ticker, objectName)
-                os.remove(fp)
+                _RemoveData(fp)
                 if return_metadata_too:
                     return None, None
                 else:
@@ -200,22 +1164,26 @@ def ReadCachePackedDatum(ticker, objectName, return_metadata_too=False):
         raise Exception("Don't call packed-data function on non-packed data '{0}'".format(objectName))
 
     data = None ; md = None
-    pkData = _ReadPackedData(ticker, objectName)
-    if (pkData is not None) and (objectName in pkData):
-        objData = pkData[objectName]
-        data   = objData["data"]
-        md     = objData["metadata"] if "metadata" in objData else None
-        expiry = objData["expiry"]   if "expiry"   in objData else None
+    fp = GetFilepath(ticker, objectName)
+    objData = _ReadPackedMember(fp, objectName)
+    _ManifestFillPacked(fp, objectName, objData)
+    if objData is not None:
+        with _access_lock:
+            _access_times[(ticker, objectName)] = time.time()
+        data = objData["data"]
+        md, expiry = _GetMetadataAndExpiry(ticker, objectName, objData)
 
         if expiry is not None:
             dtnow = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
-            if dtnow >= expiry:
+            if dtnow >= expiry and _read_only:
+                MarkStale(ticker, objectName)
+                if md is None:
+                    md = {}
+                md["__stale__"] = True
+            elif dtnow >= expiry:
                 if verbose:
                     print("Deleting expired packed datum '{0}/{1}'".format(ticker, objectName))
-                del pkData[objectName]
-                fp = GetFilepath(ticker, objectName)
-                with open(fp, 'wb') as outData:
-                    pickle.dump(pkData, outData, 4)
+                _WritePackedMember(fp, objectName, None)
                 if return_metadata_too:
                     return None, None
                 else:
@@ -232,9 +1200,11 @@ def ReadCachePackedDatum(ticker, objectName, return_metadata_too=False):
         return data
 
 
-def StoreCacheDatum(ticker, objectName, datum, expiry=None, metadata=None):
+def StoreCacheDatum(ticker, objectName, datum, expiry=None, metadata=None, validated=False):
     if verbose:
         print("StoreCacheDatum({0}, {1})".format(ticker, objectName))
+    if _read_only:
+        return
 
     if IsObjectInPackedData(objectName):
         StoreCachePackedDatum(ticker, objectName, datum, metadata=metadata)
@@ -249,9 +1219,19 @@ def StoreCacheDatum(ticker, objectName, datum, expiry=None, metadata=None):
         if not isinstance(expiry, datetime):
             raise Exception("'expiry' must be datetime or yfcd.Interval")
 
-    td = os.path.join(GetCacheDirpath(), ticker)
-    if not os.path.isdir(td):
-        os.makedirs(td)
+    _GetStore().makedirs(os.path.join(GetCacheDirpath(), ticker))
+
+    # Read old metadata before GetFilepath() prunes a file of different format.
+    # Only legacy objects need payload read.
+    md = None
+    if datum is not None:
+        e = _GetSidecarEntry(ticker, objectName)
+        if e is None:
+            md, old_expiry = _GetMetadataAndExpiry(ticker, objectName, _ReadData(ticker, objectName))
+        else:
+            md, old_expiry = e["metadata"], e["expiry"]
+        if expiry is None:
+            expiry = old_expiry
 
     fp = GetFilepath(ticker, objectName, obj=datum, prune=True)
     if fp is None:
@@ -263,42 +1243,92 @@ def StoreCacheDatum(ticker, objectName, datum, expiry=None, metadata=None):
     if datum is None:
         if verbose:
             print("- deleting {} at {}".format(objectName, fp))
-        os.remove(fp)
+        _RemoveData(fp)
         return
 
     if verbose:
         print("- storing {} at {}".format(objectName, fp))
 
-    d = _ReadData(ticker, objectName)
-    if d is None:
-        md = None
-    else:
-        md = d["metadata"] if "metadata" in d else None
-        if expiry is None:
-            expiry = d["expiry"] if "expiry" in d else None
-
     if metadata is None:
         # Persist the old metadata
         metadata = md
 
     # Write
-    d = {"data": datum}
-    if metadata is not None:
-        d["metadata"] = metadata
-    if expiry is not None:
-        d["expiry"] = expiry
-    # TODO: use module 'safer' to avoid writes being corrupted
-    if fp.endswith(".json"):
-        with open(fp, 'w') as outData:
-            json.dump(d, outData, default=yfcu.JsonEncodeValue)
-    else:
-        with open(fp, 'wb') as outData:
-            pickle.dump(d, outData, 4)
+    entry = {"metadata": metadata, "expiry": expiry, "schema": schema_version}
+    if validated:
+        entry["validated"] = True
+    # Payload first, so crash can't leave metadata of data never written
+    _WriteData(fp, {"data": datum}, entry)
+    _WriteSidecarEntry(ticker, objectName, entry)
+
+
+def StoreCacheDatumSegment(ticker, objectName, upserts, deletes=None, validated=False):
+    # Append a delta segment to cached DataFrame, instead of rewriting it.
+    # Rows in 'upserts' add/replace rows, index values in 'deletes' remove rows.
+    # 'validated' = writer validated resulting table.
+    if verbose:
+        print("StoreCacheDatumSegment({0}, {1})".format(ticker, objectName))
+    if _read_only:
+        return
+
+    yfcu.TypeCheckDataFrame(upserts, "upserts")
+    if deletes is None:
+        deletes = upserts.index[:0]
+
+    fp = GetFilepath(ticker, objectName)
+    if fp is None:
+        raise Exception("'{}/{}' not in cache, cannot append segment".format(ticker, objectName))
+
+    dp = _GetSegmentsDirpath(fp)
+    st = _GetStore()
+    st.makedirs(dp)
+    seg_fps = _ListSegments(fp)
+    n = 1 if len(seg_fps) == 0 else int(os.path.basename(seg_fps[-1]).split('.')[0]) + 1
+    seg_fp = os.path.join(dp, f"{n:06d}.pkl")
+    st.write(seg_fp, _PickleDumps({"upserts": upserts, "deletes": deletes}))
+    seg_fps.append(seg_fp)
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is not None and e.get("validated", False) != validated:
+        if validated:
+            e["validated"] = True
+        else:
+            del e["validated"]
+        _WriteSidecarEntry(ticker, objectName, e)
+    m = _GetManifest()
+    if m is not None:
+        size, mtime = _GetDatumSize(fp)
+        first, last = yfcmf.GetDataRange(upserts)
+        m.extend(ticker, objectName, size, mtime, first, last)
+
+    max_count = _option_manager.cache.segment_max_count
+    if max_count is None:
+        max_count = segment_max_count_default
+    max_ratio = _option_manager.cache.segment_max_ratio
+    if max_ratio is None:
+        max_ratio = segment_max_ratio_default
+    seg_size = sum([st.getsize(f) for f in seg_fps])
+    if len(seg_fps) >= max_count or seg_size >= max_ratio*st.getsize(fp):
+        CompactCacheDatum(ticker, objectName)
+
+
+def CompactCacheDatum(ticker, objectName):
+    # Fold any delta segments back into file
+    if _read_only:
+        return
+    fp = GetFilepath(ticker, objectName)
+    if fp is None or len(_ListSegments(fp)) == 0:
+        return
+    if verbose:
+        print("CompactCacheDatum({0}, {1})".format(ticker, objectName))
+    d = _ReadData(ticker, objectName)
+    _WriteData(fp, d)
 
 
 def StoreCachePackedDatum(ticker, objectName, datum, expiry=None, metadata=None):
     if verbose:
         print("StoreCachePackedDatum({0}, {1})".format(ticker, objectName))
+    if _read_only:
+        return
 
     if not IsObjectInPackedData(objectName):
         raise Exception("Don't call packed-data function on non-packed data '{0}'".format(objectName))
@@ -315,60 +1345,36 @@ def StoreCachePackedDatum(ticker, objectName, datum, expiry=None, metadata=None)
         if (metadata is not None) and "Expiry" in metadata.keys():
             raise Exception("'metadata' already contains 'Expiry'")
 
-    td = os.path.join(GetCacheDirpath(), ticker)
-    if not os.path.isdir(td):
-        os.makedirs(td)
+    _GetStore().makedirs(os.path.join(GetCacheDirpath(), ticker))
 
     # Read cached metadata
     fp = GetFilepath(ticker, objectName)
-    pkData = _ReadPackedData(ticker, objectName)
-    if pkData is None:
-        pkData = {}
-        objData = None
-    elif objectName in pkData:
-        objData = pkData[objectName]
-        if metadata is None:
-            metadata = objData["metadata"] if "metadata" in objData else None
-        if expiry is None:
-            expiry = objData["expiry"] if "expiry" in objData else None
-    else:
-        objData = None
-        # data = None
-        # md = None
-
-    if objData is None:
-        objData = {"data": datum}
-        if metadata is not None:
-            objData["metadata"] = metadata
-        if expiry is not None:
-            objData["expiry"] = expiry
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is None:
+        md, old_expiry = _GetMetadataAndExpiry(ticker, objectName, _ReadPackedMember(fp, objectName))
     else:
-        objData["data"] = datum
-        if metadata is not None:
-            objData["metadata"] = metadata
-        if expiry is not None:
-            objData["expiry"] = expiry
+        md, old_expiry = e["metadata"], e["expiry"]
+    if metadata is None:
+        metadata = md
+    if expiry is None:
+        expiry = old_expiry
 
-    pkData[objectName] = objData
-    with open(fp, 'wb') as outData:
-        pickle.dump(pkData, outData, 4)
+    entry = {"metadata": metadata, "expiry": expiry, "schema": schema_version}
+    _WritePackedMember(fp, objectName, {"data": datum}, entry)
+    _WriteSidecarEntry(ticker, objectName, entry)
 
 
 def ReadCacheMetadata(ticker, objectName, key):
-    md = None
-    if IsObjectInPackedData(objectName):
-        pkData = _ReadPackedData(ticker, objectName)
-        if (pkData is not None) and (objectName in pkData):
-            objData = pkData[objectName]
-            md      = objData["metadata"] if "metadata" in objData else None
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is not None:
+        md = e["metadata"]
+    elif IsObjectInPackedData(objectName):
+        md, _ = _GetMetadataAndExpiry(ticker, objectName, _ReadPackedMember(GetFilepath(ticker, objectName), objectName))
     else:
-        d = _ReadData(ticker, objectName)
-        if "metadata" not in d:
-            return None
-        md = d["metadata"]
-        if verbose:
-            print("ReadCacheMetadata() read md as:")
-            print(md)
+        md, _ = _GetMetadataAndExpiry(ticker, objectName, _ReadData(ticker, objectName))
+    if verbose:
+        print("ReadCacheMetadata() read md as:")
+        print(md)
     if md is None:
         return None
     elif key not in md:
@@ -378,58 +1384,374 @@ def ReadCacheMetadata(ticker, objectName, key):
 
 
 def WriteCacheMetadata(ticker, objectName, key, value):
-    if IsObjectInPackedData(objectName):
-        return WriteCachePackedMetadata(ticker, objectName, key, value)
-
+    # Only sidecar is rewritten, payload untouched
     if verbose:
         if value is None:
             print(f"WriteCacheMetadata({ticker}, {objectName}, {key}) deleting")
         else:
             print(f"WriteCacheMetadata({ticker}, {objectName}, {key}) storing")
+    if _read_only:
+        return
 
-    d = _ReadData(ticker, objectName)
-    if d is None:
-        raise Exception("'{}/{}' not in cache, cannot add metadata".format(ticker, objectName))
-
-    if "metadata" in d:
-        if value is None:
-            del d["metadata"][key]
+    e = _GetSidecarEntry(ticker, objectName)
+    if e is None:
+        # Legacy object, move its metadata out of payload
+        if IsObjectInPackedData(objectName):
+            d = _ReadPackedMember(GetFilepath(ticker, objectName), objectName)
         else:
-            d["metadata"][key] = value
-    elif value is not None:
-        d["metadata"] = {key: value}
+            d = _ReadData(ticker, objectName)
+        if d is None:
+            raise Exception("'{}/{}' not in cache, cannot add metadata".format(ticker, objectName))
+        md, expiry = _GetMetadataAndExpiry(ticker, objectName, d)
+        e = {"metadata": md, "expiry": expiry}
+
+    if e["metadata"] is None:
+        e["metadata"] = {}
+    if value is None:
+        e["metadata"].pop(key, None)
+    else:
+        e["metadata"][key] = value
+    if len(e["metadata"]) == 0:
+        e["metadata"] = None
 
     if verbose:
         print("WriteCacheMetadata() updated md to:")
-        print(d["metadata"])
+        print(e["metadata"])
 
-    fp = GetFilepath(ticker, objectName)
-    if fp.endswith(".json"):
-        with open(fp, 'w') as outData:
-            json.dump(d, outData, default=yfcu.JsonEncodeValue)
-    else:
-        with open(fp, 'wb') as outData:
-            pickle.dump(d, outData, 4)
+    _WriteSidecarEntry(ticker, objectName, e)
 
 
 def WriteCachePackedMetadata(ticker, objectName, key, value):
     if not IsObjectInPackedData(objectName):
-        return WriteCacheMetadata(ticker, objectName)
-
-    pkData = _ReadPackedData(ticker, objectName)
-    if pkData is None:
-        raise Exception("'{}/{}' not in cache, cannot add metadata".format(ticker, objectName))
-    if objectName not in pkData:
-        raise Exception("'{}/{}' not in cache, cannot add metadata".format(ticker, objectName))
-
-    objData = pkData[objectName]
-    if "metadata" not in objData:
-        objData["metadata"] = {key: value}
+        raise Exception("Don't call packed-data function on non-packed data '{0}'".format(objectName))
+    WriteCacheMetadata(ticker, objectName, key, value)
+
+
+def _ListStoreFiles(st, dp):
+    # All cache files under directory, recursively
+    fps = []
+    for f in st.listdir(dp):
+        fp = os.path.join(dp, f)
+        if st.isfile(fp):
+            if fp.split('.')[-1] in datum_exts:
+                fps.append(fp)
+        elif st.isdir(fp):
+            fps += _ListStoreFiles(st, fp)
+    return fps
+
+
+def MigrateCacheBackend(backend, delete_source=False):
+    # Copy every cache file from current backend into another, then switch to it
+    if backend not in yfcs.backends:
+        raise ValueError(f"'backend' must be one of: {yfcs.backends}")
+    if _read_only:
+        raise Exception("Cache is read-only, cannot migrate")
+    src = _GetStore()
+    if src.name == backend:
+        raise Exception(f"Cache already uses backend '{backend}'")
+    d = GetCacheDirpath()
+    if backend == "sqlite":
+        dst = yfcs.SqliteStore(d, os.path.join(d, "_YFC_", "cache.db"))
     else:
-        objData["metadata"][key] = value
-    fp = GetFilepath(ticker, objectName)
-    with open(fp, 'wb') as outData:
-        pickle.dump(pkData, outData, 4)
+        dst = yfcs.DirectoryStore(d)
+
+    n = 0
+    tickers = [x for x in src.listdir(d) if x != "_YFC_" and src.isdir(os.path.join(d, x))]
+    for ticker in tickers:
+        fps = _ListStoreFiles(src, os.path.join(d, ticker))
+        items = [(fp, src.read(fp)) for fp in fps]
+        if hasattr(dst, "write_many"):
+            dst.write_many(items)
+        else:
+            for fp, data in items:
+                dst.write(fp, data)
+        if delete_source:
+            for fp in fps:
+                src.remove(fp)
+            # Else empty folder still listed as cached ticker
+            src.prune_dirs(os.path.join(d, ticker))
+        n += len(fps)
+    dst.close()
+
+    _option_manager.cache.backend = backend
+    _CloseStore()
+    _CloseManifest()
+    ClearMemoryCache()
+    if verbose:
+        print(f"Migrated {n} files from '{src.name}' to '{backend}'")
+    return n
+
+
+def _GetAccessLogFilepath():
+    return os.path.join(GetCacheDirpath(), "_YFC_", "access.pkl")
+
+
+def _ReadAccessLog():
+    fp = _GetAccessLogFilepath()
+    if not os.path.isfile(fp):
+        return {}
+    try:
+        with open(fp, 'rb') as f:
+            return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def _UpdateAccessLog(fn):
+    # Apply fn(log) to access log, under lock shared with other processes
+    # using this cache. Log file is always a plain file, whatever backend.
+    # Returns updated log.
+    log = {}
+
+    def _update(data):
+        if data is not None:
+            try:
+                log.update(pickle.loads(data))
+            except (EOFError, pickle.UnpicklingError):
+                pass
+        fn(log)
+        return pickle.dumps(log, 4)
+
+    yfcs.DirectoryStore(GetCacheDirpath()).update(_GetAccessLogFilepath(), _update)
+    return log
+
+
+def _FlushAccessLog(return_log=False):
+    # Merge recorded read times into log file. If 'return_log', also
+    # return merged log, as snapshot consistent with the flush.
+    # Not run at exit of pool worker processes, so they call it explicitly.
+    global _access_times
+    with _access_lock:
+        if _read_only or len(_access_times) == 0:
+            return _ReadAccessLog() if return_log else None
+        pending, _access_times = _access_times, {}
+        if not os.path.isdir(GetCacheDirpath()):
+            # Cache folder deleted
+            return {} if return_log else None
+
+        def _merge(log):
+            for k, t in pending.items():
+                if t > log.get(k, 0):
+                    log[k] = t
+        log = _UpdateAccessLog(_merge)
+    return log if return_log else None
+
+
+atexit.register(_FlushAccessLog)
+
+
+def _GetEvictionTier(objectName):
+    if objectName in eviction_last_objects:
+        return 3
+    if objectName.startswith("history-"):
+        istr = objectName[len("history-"):]
+        if istr in yfcd.intervalStrToEnum:
+            if yfcd.intervalToTimedelta[yfcd.intervalStrToEnum[istr]] < timedelta(days=1):
+                return 0
+            return 1
+    return 2
+
+
+def EnforceCacheSizeBudget(budget_mb=None, policy=None, dry_run=False):
+    """
+    Evict cached objects until cache size is within budget.
+    Default budget & policy from options 'cache.size_budget_mb' and
+    'cache.eviction_policy'. Policy orders objects within each tier:
+    'lru' = least recently read first, 'oldest' = least recently written
+    first, 'interval' = shortest price interval first then LRU.
+    Returns list of (ticker, object, bytes) evicted, or to evict if dry_run.
+    """
+    if budget_mb is None:
+        budget_mb = _option_manager.cache.size_budget_mb
+    if budget_mb is None:
+        raise Exception("No cache size budget, set option 'cache.size_budget_mb'")
+    if policy is None:
+        policy = _option_manager.cache.eviction_policy
+    if policy is None:
+        policy = "lru"
+    if policy not in eviction_policies:
+        raise ValueError(f"'policy' must be one of: {eviction_policies}")
+    if _read_only and not dry_run:
+        raise Exception("Cache is read-only, cannot evict")
+
+    access = _FlushAccessLog(return_log=True)
+    st = _GetStore()
+
+    # Eviction units. Ticker's last-tier objects are evicted together.
+    units = []
+    total = 0
+    for ticker in GetCachedTickers(include_exchanges=True):
+        last_tier = None
+        for objectName in ListCachedObjects(ticker):
+            nbytes = GetCacheDatumNbytes(ticker, objectName)
+            total += nbytes
+            if ticker.startswith("exchange-"):
+                continue
+            mtime = st.stat(GetFilepath(ticker, objectName))[0] / 1e9
+            t = mtime if policy == "oldest" else max(mtime, access.get((ticker, objectName), 0))
+            tier = _GetEvictionTier(objectName)
+            if tier == 3:
+                if last_tier is None:
+                    last_tier = [(3, 0, t), ticker, [], 0]
+                    units.append(last_tier)
+                last_tier[0] = (3, 0, max(last_tier[0][2], t))
+                last_tier[2].append((objectName, nbytes))
+                last_tier[3] += nbytes
+            else:
+                rank = 0
+                if policy == "interval" and tier < 2:
+                    rank = yfcd.intervalToTimedelta[yfcd.intervalStrToEnum[objectName[len("history-"):]]]
+                units.append([(tier, rank, t), ticker, [(objectName, nbytes)], nbytes])
+    units.sort(key=lambda u: u[0])
+
+    budget = budget_mb * 1024 * 1024
+    evicted = []
+    for _, ticker, objs, nbytes in units:
+        if total <= budget:
+            break
+        for objectName, obj_nbytes in objs:
+            if verbose:
+                print(f"Evicting '{ticker}/{objectName}'")
+            if not dry_run:
+                if IsObjectInPackedData(objectName):
+                    _WritePackedMember(GetFilepath(ticker, objectName), objectName, None)
+                else:
+                    _RemoveData(GetFilepath(ticker, objectName))
+            evicted.append((ticker, objectName, obj_nbytes))
+        total -= nbytes
+
+    if not dry_run and len(evicted) > 0:
+        gone = set([(e[0], e[1]) for e in evicted])
+        def _forget(log):
+            for k in gone:
+                log.pop(k, None)
+        _UpdateAccessLog(_forget)
+    return evicted
+
+
+# Cache snapshot archive: tar of cache files at their cache-relative paths,
+# first member is manifest listing every file. Each file's SHA-256 is in its
+# tar header, so computed from the same bytes as written.
+# Version 1 archives instead have size & SHA-256 in manifest.
+archive_manifest_name = "manifest.json"
+archive_checksum_key = "YFC.sha256"
+
+
+def _SelectArchiveFiles(st, tickers=None, intervals=None):
+    d = GetCacheDirpath()
+    if tickers is not None:
+        tickers = set([t.upper() for t in tickers])
+    if intervals is not None:
+        intervals = set([yfcd.intervalToString[i] if isinstance(i, yfcd.Interval) else i for i in intervals])
+        bad = intervals.difference(yfcd.intervalToString.values())
+        if len(bad) > 0:
+            raise ValueError(f"Invalid intervals: {sorted(bad)}")
+    fps = []
+    for ticker in st.listdir(d):
+        if ticker == "_YFC_" or not st.isdir(os.path.join(d, ticker)):
+            continue
+        # Exchange schedules needed by any ticker, so always keep
+        if tickers is not None and ticker not in tickers and not ticker.startswith("exchange-"):
+            continue
+        for fp in _ListStoreFiles(st, os.path.join(d, ticker)):
+            # Object name from top-level file or segments dir
+            objectName = _GetRelativePath(fp).split('/')[1].split('.')[0]
+            if intervals is not None and objectName.startswith("history-") and objectName[len("history-"):] not in intervals:
+                continue
+            fps.append(fp)
+    return fps
+
+
+def _AddArchiveMember(tar, name, data, checksum=False):
+    ti = tarfile.TarInfo(name)
+    ti.size = len(data)
+    ti.mtime = int(time.time())
+    if checksum:
+        ti.pax_headers = {archive_checksum_key: hashlib.sha256(data).hexdigest()}
+    tar.addfile(ti, io.BytesIO(data))
+
+
+def ExportCache(archive_fp, tickers=None, intervals=None):
+    # Stream cache, or subset of tickers & price intervals, into one tar archive.
+    # Compressed if filename ends '.gz'. Returns #files.
+    st = _GetStore()
+    fps = _SelectArchiveFiles(st, tickers, intervals)
+
+    manifest = {"version": 2, "backend": st.name, "files": [_GetRelativePath(fp) for fp in fps]}
+
+    mode = "w|gz" if archive_fp.endswith(".gz") else "w|"
+    with tarfile.open(archive_fp, mode, format=tarfile.PAX_FORMAT) as tar:
+        _AddArchiveMember(tar, archive_manifest_name, json.dumps(manifest, indent=4).encode())
+        for fp in fps:
+            # Read once, checksum & write same bytes
+            _AddArchiveMember(tar, _GetRelativePath(fp), st.read(fp), checksum=True)
+    if verbose:
+        print(f"Exported {len(fps)} files to '{archive_fp}'")
+    return len(fps)
+
+
+def ImportCache(archive_fp, threads=True):
+    # Write every file in archive into cache, verifying checksums in parallel.
+    # Files failing verification are not written. Returns #files.
+    if _read_only:
+        raise Exception("Cache is read-only, cannot import")
+    st = _GetStore()
+    d = GetCacheDirpath()
+
+    def _import_one(name, data, sha256):
+        if name not in files:
+            return f"{name}: not in manifest"
+        if name.startswith('/') or '..' in name.split('/') or name.split('/')[0] == "_YFC_":
+            return f"{name}: invalid path"
+        if isinstance(files, dict):
+            # Version 1 archive
+            if len(data) != files[name]["size"]:
+                return f"{name}: checksum mismatch"
+            sha256 = files[name]["sha256"]
+        if sha256 is None:
+            return f"{name}: no checksum"
+        if hashlib.sha256(data).hexdigest() != sha256:
+            return f"{name}: checksum mismatch"
+        st.write(os.path.join(d, *name.split('/')), data)
+        return None
+
+    if threads is True:
+        threads = min(32, os.cpu_count()*4)
+    pool = ThreadPoolExecutor(max_workers=threads) if threads else None
+    results = []
+    seen = set()
+    with tarfile.open(archive_fp, "r|*") as tar:
+        ti = tar.next()
+        if ti is None or ti.name != archive_manifest_name:
+            raise Exception(f"'{archive_fp}' is not a cache archive, first member must be '{archive_manifest_name}'")
+        files = json.loads(tar.extractfile(ti).read())["files"]
+        # Stream mode, so must read each member before advancing
+        ti = tar.next()
+        while ti is not None:
+            if ti.isfile():
+                data = tar.extractfile(ti).read()
+                seen.add(ti.name)
+                sha256 = ti.pax_headers.get(archive_checksum_key)
+                if pool is None:
+                    results.append(_import_one(ti.name, data, sha256))
+                else:
+                    results.append(pool.submit(_import_one, ti.name, data, sha256))
+            ti = tar.next()
+    if pool is not None:
+        results = [r.result() for r in results]
+        pool.shutdown()
+    errors = [r for r in results if r is not None]
+    errors += [f"{name}: missing from archive" for name in sorted(set(files).difference(seen))]
+
+    ClearMemoryCache()
+    if IsManifestEnabled():
+        RebuildCacheManifest()
+    if len(errors) > 0:
+        raise Exception(f"Import of '{archive_fp}' failed for {len(errors)} files:\n" + '\n'.join(errors[:20]))
+    n = len(results)
+    if verbose:
+        print(f"Imported {n} files from '{archive_fp}'")
+    return n
 
 
 ResetCacheDirpath()
@@ -447,6 +1769,35 @@ class NestedOptions:
         if self.name == 'max_ages':
             # Type-check value
             Timedelta(value)
+        elif self.name == 'cache':
+            if key == 'price_format':
+                if value not in price_formats:
+                    raise ValueError(f"'price_format' must be one of: {list(price_formats.keys())}")
+                if value in ["parquet", "arrow"]:
+                    _ImportPyarrow()
+            elif key == 'codec':
+                if value not in codecs:
+                    raise ValueError(f"'codec' must be one of: {codecs}")
+                if value not in ["none", "auto"]:
+                    _ImportCodec(value)
+            elif key == 'backend':
+                if value not in yfcs.backends:
+                    raise ValueError(f"'backend' must be one of: {yfcs.backends}")
+            elif key in ['mmap', 'price_segments', 'manifest', 'derive_intervals']:
+                if not isinstance(value, bool):
+                    raise TypeError(f"'{key}' must be bool not {type(value)}")
+            elif key == 'segment_max_count':
+                if not isinstance(value, int) or value < 1:
+                    raise ValueError(f"'{key}' must be int >= 1")
+            elif key == 'eviction_policy':
+                if value not in eviction_policies:
+                    raise ValueError(f"'eviction_policy' must be one of: {eviction_policies}")
+            elif key in ['memory_budget_mb', 'size_budget_mb']:
+                if not isinstance(value, (int, float)) or value < 0:
+                    raise ValueError(f"'{key}' must be number >= 0")
+            elif key == 'segment_max_ratio':
+                if not isinstance(value, (int, float)) or value <= 0:
+                    raise ValueError(f"'{key}' must be number > 0")
 
         self.data[key] = value
         global _option_manager
@@ -476,6 +1827,12 @@ class OptionsManager:
             self.__getattr__('max_ages').info = '45d'
 
     def _save_option(self):
+        if _read_only:
+            # Change only lasts for this process
+            return
+        d = os.path.dirname(self.option_file)
+        if not os.path.isdir(d):
+            os.makedirs(d)
         with open(self.option_file, 'w') as file:
             json.dump(self.options, file, indent=4)
 
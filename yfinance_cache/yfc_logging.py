@@ -23,13 +23,18 @@ def GetLogger(tkr):
     if tkr in loggers:
         return loggers[tkr]
 
-    tkr_dp = os.path.join(yfcm.GetCacheDirpath(), tkr)
-    if not os.path.isdir(tkr_dp):
-        os.mkdir(tkr_dp)
-
-    log_fp = os.path.join(tkr_dp, "events.log")
-    formatter = logging.Formatter(fmt='%(asctime)s %(levelname)-8s %(message)s',
-                                  datefmt='%Y-%m-%d %H:%M:%S')
+    if yfcm.GetBackend() == "sqlite":
+        # One log for whole cache, not a file per ticker
+        log_dp = os.path.join(yfcm.GetCacheDirpath(), "_YFC_")
+        fmt = '%(asctime)s %(name)-8s %(levelname)-8s %(message)s'
+    else:
+        log_dp = os.path.join(yfcm.GetCacheDirpath(), tkr)
+        fmt = '%(asctime)s %(levelname)-8s %(message)s'
+    if not os.path.isdir(log_dp):
+        os.makedirs(log_dp)
+
+    log_fp = os.path.join(log_dp, "events.log")
+    formatter = logging.Formatter(fmt=fmt, datefmt='%Y-%m-%d %H:%M:%S')
     log_file_handler = logging.FileHandler(log_fp, mode='a')
     log_file_handler.setFormatter(formatter)
     # screen_handler = logging.StreamHandler(stream=sys.stdout)
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from . import yfc_store as yfcs
+
+
+# Index of everything in cache: one row per ticker/object, so existence and
+# staleness checks can query one file instead of stat'ing thousands.
+
+_schema = """
+CREATE TABLE IF NOT EXISTS datum (
+    ticker TEXT NOT NULL,
+    object TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    expiry REAL,
+    first_ts REAL,
+    last_ts REAL,
+    complete INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (ticker, object)
+);
+CREATE INDEX IF NOT EXISTS datum_path ON datum (path);
+"""
+
+# 'complete' = 0 if row built from file stats only: data range, and expiry
+# of objects without sidecar entry, unknown until object read.
+_columns = ["ticker", "object", "path", "size", "mtime", "expiry", "first_ts", "last_ts", "complete"]
+
+_insert = f"INSERT OR REPLACE INTO datum ({','.join(_columns)}) VALUES ({','.join(['?']*len(_columns))})"
+
+
+def _dt_to_ts(dt):
+    if dt is None:
+        return None
+    return dt.timestamp()
+
+
+def _ts_to_dt(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=ZoneInfo("UTC"))
+
+
+def GetDataRange(data):
+    # First & last index timestamp, if data is time-indexed
+    if isinstance(data, (pd.DataFrame, pd.Series)) and isinstance(data.index, pd.DatetimeIndex) and len(data) > 0:
+        idx = data.index
+        if idx.tz is None:
+            idx = idx.tz_localize("UTC")
+        return idx.min().to_pydatetime(), idx.max().to_pydatetime()
+    return None, None
+
+
+class CacheManifest:
+    def __init__(self, db_fp, read_only=False):
+        self.db_fp = db_fp
+        self._lock = threading.Lock()
+        if read_only:
+            self.is_new = False
+            self._conn = yfcs.ConnectReadOnly(db_fp)
+            return
+        dp = os.path.dirname(db_fp)
+        if not os.path.isdir(dp):
+            os.makedirs(dp)
+        self.is_new = not os.path.isfile(db_fp)
+        self._conn = sqlite3.connect(db_fp, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_schema)
+        cols = [r[1] for r in self._conn.execute("PRAGMA table_info(datum)").fetchall()]
+        if "complete" not in cols:
+            # Manifest of older version, when building decoded every object
+            self._conn.execute("ALTER TABLE datum ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert(self, ticker, objectName, path, size, mtime, expiry=None, first=None, last=None, complete=True):
+        row = (ticker, objectName, path, size, mtime, _dt_to_ts(expiry), _dt_to_ts(first), _dt_to_ts(last), int(complete))
+        with self._lock:
+            self._conn.execute(_insert, row)
+
+    def upsert_many(self, rows):
+        # Rows as upsert() arguments, all of them
+        rows = [(r[0], r[1], r[2], r[3], r[4], _dt_to_ts(r[5]), _dt_to_ts(r[6]), _dt_to_ts(r[7]), int(r[8])) for r in rows]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(_insert, rows)
+            self._conn.execute("COMMIT")
+
+    def extend(self, ticker, objectName, size, mtime, first=None, last=None):
+        # Widen recorded range after an append. Unknown range stays unknown.
+        with self._lock:
+            self._conn.execute("UPDATE datum SET size=?, mtime=?, first_ts=CASE WHEN complete THEN MIN(COALESCE(first_ts,?),?) END, last_ts=CASE WHEN complete THEN MAX(COALESCE(last_ts,?),?) END WHERE ticker=? AND object=?",
+                               (size, mtime, _dt_to_ts(first), _dt_to_ts(first), _dt_to_ts(last), _dt_to_ts(last), ticker, objectName))
+
+    def touch_path(self, path, size, mtime):
+        # File shared by several objects changed
+        with self._lock:
+            self._conn.execute("UPDATE datum SET size=?, mtime=? WHERE path=?", (size, mtime, path))
+
+    def remove(self, ticker, objectName):
+        with self._lock:
+            self._conn.execute("DELETE FROM datum WHERE ticker=? AND object=?", (ticker, objectName))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM datum")
+
+    def get(self, ticker, objectName):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM datum WHERE ticker=? AND object=?", (ticker, objectName)).fetchone()
+        if row is None:
+            return None
+        e = dict(zip(_columns, row))
+        for k in ["expiry", "first_ts", "last_ts"]:
+            e[k] = _ts_to_dt(e[k])
+        # Older manifest opened read-only lacks column, but was built complete
+        e["complete"] = bool(e.get("complete", 1))
+        return e
+
+    def tickers(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT ticker FROM datum ORDER BY ticker").fetchall()
+        return [r[0] for r in rows]
+
+    def to_frame(self, ticker=None):
+        q = "SELECT * FROM datum"
+        args = []
+        if ticker is not None:
+            q += " WHERE ticker=?"
+            args.append(ticker)
+        with self._lock:
+            cur = self._conn.execute(q, args)
+            rows = cur.fetchall()
+        df = pd.DataFrame(rows, columns=[c[0] for c in cur.description])
+        for c in ["mtime", "expiry", "first_ts", "last_ts"]:
+            df[c] = pd.to_datetime(df[c], unit='s', utc=True)
+        df["complete"] = df["complete"].astype(bool) if "complete" in df.columns else True
+        return df
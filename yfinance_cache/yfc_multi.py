@@ -1,10 +1,13 @@
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from time import perf_counter
 
 import pandas as pd
 from scipy.stats import mode
 
 from . import yfc_ticker
+from . import yfc_cache_manager as yfcm
 from . import yfc_utils as yfcu
 
 def download(tickers,
@@ -158,11 +161,72 @@ def download_one(ticker, start=None, end=None, max_age=None,
                   prepost=False, proxy=None, rounding=False,
                   keepna=False, session=None):
     dat = yfc_ticker.Ticker(ticker, session=session)
-    df = dat.history(
-            period=period, interval=interval, max_age=max_age,
-            start=start, end=end, prepost=prepost,
-            actions=actions, adjust_divs=adjust_divs,
-            adjust_splits=adjust_splits, proxy=proxy,
-            rounding=rounding, keepna=keepna
-    )
+    try:
+        df = dat.history(
+                period=period, interval=interval, max_age=max_age,
+                start=start, end=end, prepost=prepost,
+                actions=actions, adjust_divs=adjust_divs,
+                adjust_splits=adjust_splits, proxy=proxy,
+                rounding=rounding, keepna=keepna
+        )
+    finally:
+        # Runs in pool worker, which exits without running atexit handlers
+        yfcm._FlushAccessLog()
     return df
+
+
+def read_cached(tickers, object_name, threads=True, stack=False, return_stats=False, columns=None):
+    """
+    Read one cached object, e.g. 'history-1d', 'info' or 'dividends',
+    for many tickers in parallel. Only reads cache, never fetches.
+
+    Returns dict ticker -> object, missing tickers omitted.
+    If stack=True, combine into one DataFrame/Series indexed by ticker.
+    If return_stats=True, also return dict with #tickers, #found,
+    bytes read and elapsed seconds.
+    If columns set, only return those columns of tables. Arrow & Parquet
+    price tables then only decode those columns.
+    """
+    tickers = tickers if isinstance(tickers, (list, set, tuple)) else tickers.replace(',', ' ').split()
+    tickers = sorted(set([ticker.upper() for ticker in tickers]))
+
+    # Load options before threads start
+    yfcm.GetBackend()
+
+    def _read_one(tkr):
+        obj = yfcm.ReadCacheDatum(tkr, object_name, columns=columns)
+        if obj is None:
+            return None, 0
+        return obj, yfcm.GetCacheDatumNbytes(tkr, object_name)
+
+    t0 = perf_counter()
+    if threads:
+        if threads is True:
+            threads = min(32, multiprocessing.cpu_count()*4)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(_read_one, tickers))
+    else:
+        results = [_read_one(tkr) for tkr in tickers]
+    elapsed = perf_counter() - t0
+
+    objs = {tickers[i]: results[i][0] for i in range(len(tickers)) if results[i][0] is not None}
+    stats = {"tickers": len(tickers), "found": len(objs),
+             "bytes": sum([r[1] for r in results]), "elapsed": elapsed}
+
+    if stack:
+        objs = stack_cached(objs)
+    if return_stats:
+        return objs, stats
+    return objs
+
+
+def stack_cached(objs):
+    # Combine per-ticker objects into one table, indexed by ticker
+    if len(objs) == 0:
+        return pd.DataFrame()
+    values = list(objs.values())
+    if all([isinstance(v, (pd.DataFrame, pd.Series)) for v in values]):
+        return pd.concat(values, keys=objs.keys(), names=["Ticker"])
+    if all([isinstance(v, dict) for v in values]):
+        return pd.DataFrame.from_dict(objs, orient='index')
+    return pd.Series(objs)
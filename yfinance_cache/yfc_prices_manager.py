@@ -5,10 +5,13 @@ from . import yfc_dat as yfcd
 from . import yfc_time as yfct
 from . import yfc_utils as yfcu
 from . import yfc_logging as yfcl
+from . import yfc_upgrade as yfcup
 
 import numpy as np
 import pandas as pd
 import pytz
+import hashlib
+import threading
 # import itertools
 from scipy import ndimage as _ndimage
 from datetime import datetime, date, time, timedelta
@@ -19,6 +22,35 @@ import click
 import logging
 
 
+# Counts of PriceHistory.get() calls served by fast path, vs full check.
+# Shared by all threads, so only touch under lock.
+_fast_path_stats = {"hits": 0, "misses": 0}
+_fast_path_lock = threading.Lock()
+
+
+def _CountFastPath(key):
+    with _fast_path_lock:
+        _fast_path_stats[key] += 1
+
+
+def GetFastPathStats():
+    with _fast_path_lock:
+        stats = dict(_fast_path_stats)
+    n = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / n if n > 0 else None
+    return stats
+
+
+def ResetFastPathStats():
+    with _fast_path_lock:
+        _fast_path_stats["hits"] = 0
+        _fast_path_stats["misses"] = 0
+
+
+# Intervals that can be aggregated from 1d, see DerivedPriceHistory
+derived_intervals = [yfcd.Interval.Week, yfcd.Interval.Months1, yfcd.Interval.Months3]
+
+
 # TODOs:
 # - when filling a missing interval with NaNs, try to reconstruct first
 
@@ -56,6 +88,8 @@ class HistoriesManager:
             if key in yfcd.intervalToString.keys():
                 if key == yfcd.Interval.Days1:
                     self.histories[key] = PriceHistory(self, self.ticker, self.exchange, self.tzName, key, self.session, self.proxy, repair=True, contiguous=True)
+                elif key in derived_intervals and yfcm.IsDeriveIntervalsEnabled():
+                    self.histories[key] = DerivedPriceHistory(self, self.ticker, self.exchange, self.tzName, key, self.session, self.proxy)
                 else:
                     self.histories[key] = PriceHistory(self, self.ticker, self.exchange, self.tzName, key, self.session, self.proxy, repair=True, contiguous=False)
             elif key == "Events":
@@ -110,6 +144,24 @@ class EventsHistory:
         else:
             self.splits = None
 
+        # Changes on every change to events. Price tables record version
+        # they were adjusted to, so can skip searching for new events.
+        self.version = self._calcVersion()
+
+    def _calcVersion(self):
+        # Hash of events tables, not a counter in metadata: if events metadata
+        # or tables are lost then refetched, can't repeat a version already
+        # recorded by a price table. 0 = no events cached.
+        if self.divs is None and self.splits is None:
+            return 0
+        sha = hashlib.sha1()
+        for df in [self.divs, self.splits]:
+            if df is None:
+                sha.update(b"None")
+            else:
+                sha.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return int.from_bytes(sha.digest()[:8], 'little')
+
     def GetDivs(self, start, end=None):
         yfcu.TypeCheckDateStrict(start, "start")
         if end is not None:
@@ -235,8 +287,10 @@ class EventsHistory:
                 else:
                     self.splits = pd.concat([self.splits, splits_df[cols]], sort=True).sort_index()
                 yfcm.StoreCacheDatum(self.ticker, "splits", self.splits)
+                self.version = self._calcVersion()
             elif self_splits_modified:
                 yfcm.StoreCacheDatum(self.ticker, "splits", self.splits)
+                self.version = self._calcVersion()
 
         yfcl.TraceExit("UpdateSplits() returning")
 
@@ -326,12 +380,215 @@ class EventsHistory:
                 else:
                     self.divs = pd.concat([self.divs, divs_df[cols]], sort=True).sort_index()
                 yfcm.StoreCacheDatum(self.ticker, "dividends", self.divs)
+                self.version = self._calcVersion()
             elif self_divs_modified:
                 yfcm.StoreCacheDatum(self.ticker, "dividends", self.divs)
+                self.version = self._calcVersion()
 
         yfcl.TraceExit("UpdateDividends() returning")
 
 
+class DerivedPriceHistory:
+    # Multi-day interval aggregated from cached 1d prices, instead of fetched
+    # & stored separately. Enabled by option 'cache.derive_intervals'.
+    # Weeks start Monday, months & quarters on calendar boundaries.
+
+    def __init__(self, manager, ticker, exchange, tzName, interval, session, proxy):
+        if not isinstance(manager, HistoriesManager):
+            raise TypeError(f"'manager' must be HistoriesManager not {type(manager)}")
+        if interval not in derived_intervals:
+            raise ValueError(f"'interval' must be one of: {derived_intervals}")
+        yfcu.TypeCheckStr(ticker, "ticker")
+        yfcu.TypeCheckStr(exchange, "exchange")
+        yfcu.TypeCheckStr(tzName, "tzName")
+
+        self.manager = manager
+        self.ticker = ticker
+        self.exchange = exchange
+        self.tzName = tzName
+        self.interval = interval
+        self.session = session
+        self.proxy = proxy
+
+        self.dat = yf.Ticker(self.ticker, session=self.session)
+        self.tz = ZoneInfo(self.tzName)
+
+        self.itd = yfcd.intervalToTimedelta[self.interval]
+        self.istr = yfcd.intervalToString[self.interval]
+        self.interday = True
+        self.intraday = False
+        self.multiday = True
+        self._freq = {yfcd.Interval.Week: "W-SUN", yfcd.Interval.Months1: "M", yfcd.Interval.Months3: "Q"}[self.interval]
+
+    @property
+    def h(self):
+        # Aggregate of all cached 1d prices
+        h1d = self.manager.GetHistory(yfcd.Interval.Days1).h
+        if h1d is None or h1d.empty:
+            return None
+        return self._aggregate(h1d)
+
+    def _barStarts(self, index):
+        return index.tz_localize(None).to_period(self._freq).start_time
+
+    def _barStartDate(self, d):
+        return self._barStarts(pd.DatetimeIndex([d]))[0].date()
+
+    def _barEndDate(self, d):
+        # Start date of next bar
+        return (pd.Period(d, self._freq) + 1).start_time.date()
+
+    def _aggregate(self, h1d):
+        starts = self._barStarts(h1d.index)
+        f_new = np.append(True, starts[1:] != starts[:-1])
+        first = np.where(f_new)[0]
+        last = np.append(first[1:], len(h1d)) - 1
+        bar_of_row = np.cumsum(f_new) - 1
+
+        # Adjust any split inside bar so prices comparable to bar's last day
+        csf = h1d["CSF"].to_numpy()
+        f = csf / csf[last][bar_of_row]
+        ohlc = {c: h1d[c].to_numpy() * f for c in ["Open", "High", "Low", "Close"]}
+
+        # Ignore rows YFC inserted for missing intervals (NaN prices), like Yahoo does
+        n = len(h1d)
+        rows = np.arange(n)
+        def _first_valid(x):
+            i = np.minimum.reduceat(np.where(np.isnan(x), n, rows), first)
+            return np.where(i < n, x[np.minimum(i, n-1)], np.nan)
+        def _last_valid(x):
+            i = np.maximum.reduceat(np.where(np.isnan(x), -1, rows), first)
+            return np.where(i >= 0, x[np.maximum(i, 0)], np.nan)
+
+        h = pd.DataFrame(index=pd.DatetimeIndex(starts[first]).tz_localize(self.tz))
+        h["Open"] = _first_valid(ohlc["Open"])
+        h["High"] = np.fmax.reduceat(ohlc["High"], first)
+        h["Low"] = np.fmin.reduceat(ohlc["Low"], first)
+        h["Close"] = _last_valid(ohlc["Close"])
+        h["Volume"] = np.round(np.add.reduceat(h1d["Volume"].to_numpy() / f, first)).astype('int')
+        h["Dividends"] = np.add.reduceat(h1d["Dividends"].to_numpy() * f, first)
+        ss = h1d["Stock Splits"].to_numpy()
+        ss = np.multiply.reduceat(np.where(ss == 0.0, 1.0, ss), first)
+        h["Stock Splits"] = np.where(ss == 1.0, 0.0, ss)
+
+        # Bar only final once ended
+        d_now = pd.Timestamp.utcnow().tz_convert(self.tz).date()
+        bar_complete = np.array([self._barEndDate(d) <= d_now for d in h.index.date])
+        h["Final?"] = np.logical_and.reduceat(h1d["Final?"].to_numpy(), first) & bar_complete
+        h["C-Check?"] = np.logical_and.reduceat(h1d["C-Check?"].to_numpy(), first)
+        h["Repaired?"] = np.logical_or.reduceat(h1d["Repaired?"].to_numpy(), first)
+        for c in h1d.columns:
+            if c not in h.columns:
+                # FetchDate, factors & last-adjust times of bar's last day
+                h[c] = h1d[c].to_numpy()[last]
+        return h[[c for c in h1d.columns]]
+
+    def get(self, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True, prepost=False, adjust_splits=False, adjust_divs=False, quiet=False, copy=True):
+        if start is None and end is None and period is None:
+            raise ValueError("Must provide value for one of: 'start', 'end', 'period'")
+
+        d_now = pd.Timestamp.utcnow().tz_convert(self.tz).date()
+        if period is not None:
+            if period == yfcd.Period.Max:
+                start = date(yfcd.yf_min_year, 1, 1)
+            elif period == yfcd.Period.Ytd:
+                start = date(d_now.year, 1, 1)
+            else:
+                if isinstance(period, yfcd.Period):
+                    period = yfcd.periodToTimedelta[period]
+                start = d_now - period
+            end = d_now + timedelta(days=1)
+        else:
+            if isinstance(start, datetime):
+                start = start.astimezone(self.tz).date()
+            if isinstance(end, datetime):
+                end = end.astimezone(self.tz).date()
+            if start is None:
+                start = date(yfcd.yf_min_year, 1, 1)
+            if end is None:
+                end = d_now + timedelta(days=1)
+
+        # Fetch whole bars of 1d. Also need end of last bar, but 1d
+        # can't be requested past tomorrow.
+        start_d = self._barStartDate(start)
+        end_d = min(self._barEndDate(end - timedelta(days=1)), d_now + timedelta(days=1))
+        if start_d >= end_d:
+            return None
+
+        hist1d = self.manager.GetHistory(yfcd.Interval.Days1)
+        h1d = hist1d.get(start_d, end_d, max_age=max_age, trigger_at_market_close=trigger_at_market_close, repair=repair, quiet=quiet, copy=False)
+        if h1d is None or h1d.empty:
+            return h1d
+
+        h = self._aggregate(h1d)
+        if adjust_splits:
+            for c in ["Open", "High", "Low", "Close", "Dividends"]:
+                h[c] *= h["CSF"]
+            h["Volume"] = (h["Volume"]/h["CSF"]).round(0).astype('int')
+            h = h.drop("CSF", axis=1)
+        if adjust_divs:
+            for c in ["Open", "High", "Low", "Close"]:
+                h[c] *= h["CDF"]
+            h = h.drop("CDF", axis=1)
+        return h
+
+    def GetView(self, view_key, **kwargs):
+        # Nothing cached to change, so repeat requests rely on 1d fast path
+        return None
+
+    def IsViewRequested(self, view_key, **kwargs):
+        return False
+
+    def StoreView(self, view_key, df, **kwargs):
+        pass
+
+    def _verifyCachedPrices(self, rtol=0.0001, vol_rtol=0.004, correct=False, discard_old=False, quiet=True, debug=False, incremental=True):
+        # Compare bars aggregated from cached 1d against Yahoo's own.
+        # Nothing cached to correct, fix 1d instead.
+        yfcu.TypeCheckBool(quiet, "quiet")
+        yfcu.TypeCheckBool(debug, "debug")
+        if debug:
+            quiet = False
+
+        h = self.h
+        if h is None:
+            return True
+        h = h[h["Final?"].to_numpy()]
+        if h.empty:
+            return True
+
+        yfcl.TraceEnter(f"PM::_verifyCachedPrices-{self.istr}(derived)")
+
+        df_yf = self.dat.history(interval=self.istr, start=h.index[0].date(), end=self._barEndDate(h.index[-1].date()), auto_adjust=False, actions=True, repair=True)
+        if df_yf is None or df_yf.empty:
+            yfcl.TraceExit("PM::_verifyCachedPrices() returning True (no Yahoo data)")
+            return True
+        df_yf = df_yf[~df_yf.index.duplicated(keep="first")]
+        df_yf.index = self._barStarts(df_yf.index.tz_convert(self.tz)).tz_localize(self.tz)
+
+        # Match Yahoo: split-adjusted prices, div-adjusted 'Adj Close'
+        h = h[h.index.isin(df_yf.index)]
+        df_yf = df_yf.loc[h.index]
+        for c in ["Open", "High", "Low", "Close"]:
+            h[c] = h[c].to_numpy() * h["CSF"].to_numpy()
+        h["Adj Close"] = h["Close"].to_numpy() * h["CDF"].to_numpy()
+        h["Volume"] = (h["Volume"].to_numpy() / h["CSF"].to_numpy()).round()
+
+        f_diff = pd.Series(np.full(h.shape[0], False), h.index)
+        for c in ["Open", "High", "Low", "Close", "Adj Close"]:
+            f_diff |= ~np.isclose(h[c].to_numpy(), df_yf[c].to_numpy(), rtol=rtol)
+        f_diff |= ~np.isclose(h["Volume"].to_numpy(), df_yf["Volume"].to_numpy(), rtol=vol_rtol)
+
+        v = not f_diff.any()
+        if not v and not quiet:
+            print(f"{self.ticker}: {self.istr}: {f_diff.sum()}/{len(f_diff)} bars aggregated from 1d differ to Yahoo:")
+            cols = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+            print(pd.concat([h.loc[f_diff, cols], df_yf.loc[f_diff, cols]], axis=1, keys=["YFC", "Yahoo"]))
+
+        yfcl.TraceExit(f"PM::_verifyCachedPrices() returning {v}")
+        return v
+
+
 class PriceHistory:
     def __init__(self, manager, ticker, exchange, tzName, interval, session, proxy, repair=True, contiguous=False):
         if isinstance(interval, str):
@@ -365,6 +622,7 @@ class PriceHistory:
 
         # Load from cache
         self.cache_key = "history-"+self.istr
+        self._h_version = 0
         self.h = self._getCachedPrices()
         self._reviewNewDivs()
 
@@ -382,36 +640,64 @@ class PriceHistory:
 
     def _getCachedPrices(self):
         h = None
+        self._h_mapped = False
         if yfcm.IsDatumCached(self.ticker, self.cache_key):
             h = yfcm.ReadCacheDatum(self.ticker, self.cache_key)
+            self._h_mapped = yfcm.IsDatumMemoryMapped(self.ticker, self.cache_key)
 
         if h is not None and h.empty:
             h = None
         elif h is not None:
-            h_modified = False
-
             # h = yfcu.CustomNanCheckingDataFrame(h)
 
-            if "Adj Close" in h.columns:
-                raise Exception("Adj Close in cached h")
-
-            f_dups = h.index.duplicated()
-            if f_dups.any():
-                raise Exception("{}: These timepoints have been duplicated: {}".format(self.ticker, h.index[f_dups]))
-
-            f_na = np.isnan(h["CDF"].to_numpy())
-            if f_na.any():
-                h["CDF"] = h["CDF"].fillna(method="bfill").fillna(method="ffill")
-                f_na = h["CDF"].isna()
-                if f_na.any():
-                    raise Exception("CDF NaN repair failed")
-                h_modified = True
-
-            if h_modified:
-                yfcm.StoreCacheDatum(self.ticker, self.cache_key, h)
+            schema = yfcm.GetCacheDatumSchema(self.ticker, self.cache_key)
+            if schema < yfcm.schema_version:
+                # Cache not migrated offline, so upgrade now
+                h = yfcup.UpgradeData(self.cache_key, h, schema)
+            if schema < yfcm.schema_version or yfcm.IsStrictMode() or not yfcm.IsDatumValidated(self.ticker, self.cache_key):
+                # Validated data is trusted, so only check once
+                repaired = schema < yfcm.schema_version or h["CDF"].isna().any()
+                h = self._validateCachedPrices(h)
+                if not yfcm.IsReadOnly():
+                    if repaired:
+                        yfcm.StoreCacheDatum(self.ticker, self.cache_key, h, validated=True)
+                    else:
+                        yfcm.MarkDatumValidated(self.ticker, self.cache_key)
 
+        self._h_hashes = self._hashCachedPrices(h)
+        self._events_version = None
+        if h is not None:
+            self._events_version = yfcm.ReadCacheMetadata(self.ticker, self.cache_key, "EventsVersion")
         return h
 
+    def _hashCachedPrices(self, df):
+        # Row hashes of what is stored in cache, so next write can append only changed rows
+        if df is None or not yfcm.IsSegmentLogEnabled():
+            return None
+        return pd.util.hash_pandas_object(df, index=True)
+
+    def _ensureCachedPricesWritable(self):
+        # Memory-mapped columns are read-only, so copy before modifying in-place
+        if self._h_mapped and self.h is not None:
+            self.h = self.h.copy()
+        self._h_mapped = False
+
+    def _validateCachedPrices(self, df):
+        # Enforce invariants of cached table. Data written by _updatedCachedPrices()
+        # is marked validated, so loads can skip this.
+        if "Adj Close" in df.columns:
+            raise Exception("Adj Close in cached h")
+
+        f_dups = df.index.duplicated()
+        if f_dups.any():
+            raise Exception("{}: These timepoints have been duplicated: {}".format(self.ticker, df.index[f_dups]))
+
+        if df["CDF"].isna().any():
+            df["CDF"] = df["CDF"].bfill().ffill()
+            if df["CDF"].isna().any():
+                raise Exception("CDF NaN repair failed")
+        return df
+
     def _updatedCachedPrices(self, df):
         yfcu.TypeCheckDataFrame(df, "df")
 
@@ -425,7 +711,26 @@ class PriceHistory:
 
         if df.empty:
             df = None
-        yfcm.StoreCacheDatum(self.ticker, self.cache_key, df)
+        else:
+            df = self._validateCachedPrices(df)
+
+        hashes = self._hashCachedPrices(df)
+        if (hashes is not None) and (self._h_hashes is not None) and yfcm.IsDatumCached(self.ticker, self.cache_key):
+            # Append only new/changed rows as a delta segment. Row hash includes index,
+            # so changed row = hash not in cache.
+            f_upsert = ~np.isin(hashes.to_numpy(), self._h_hashes.to_numpy())
+            deletes = self._h_hashes.index[~self._h_hashes.index.isin(df.index)]
+            n_delta = np.sum(f_upsert) + len(deletes)
+            if n_delta == 0:
+                # Cache already up-to-date
+                pass
+            elif n_delta < 0.5*df.shape[0]:
+                yfcm.StoreCacheDatumSegment(self.ticker, self.cache_key, df[f_upsert], deletes, validated=True)
+            else:
+                yfcm.StoreCacheDatum(self.ticker, self.cache_key, df, validated=True)
+        else:
+            yfcm.StoreCacheDatum(self.ticker, self.cache_key, df, validated=True)
+        self._h_hashes = hashes
 
         self.h = df
 
@@ -445,7 +750,16 @@ class PriceHistory:
                     yfcm.StoreCacheDatum(self.ticker, "new_divs", cached_new_divs)
                 yfcm.WriteCacheMetadata(self.ticker, "new_divs", "locked", None)
 
-    def get(self, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True, prepost=False, adjust_splits=False, adjust_divs=False, quiet=False):
+    def get(self, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True, prepost=False, adjust_splits=False, adjust_divs=False, quiet=False, copy=True):
+        # Fast path: same request as an earlier full check, that nothing since
+        # can have changed: no row expired, no new interval, no new event.
+        fresh_key = (start, end, period, max_age, trigger_at_market_close, repair)
+        fresh = self._getFresh(fresh_key)
+        if fresh is not None:
+            _CountFastPath("hits")
+            return self._sliceAndAdjust(*fresh[1], adjust_splits, adjust_divs, copy)
+        _CountFastPath("misses")
+
         if start is None and end is None and period is None:
             raise ValueError("Must provide value for one of: 'start', 'end', 'period'")
         if start is not None:
@@ -510,7 +824,8 @@ class PriceHistory:
         elif debug_yfc:
             print(log_msg)
 
-        self._applyNewEvents()
+        if not yfcm.IsReadOnly():
+            self._applyNewEvents()
 
         try:
             yf_lag = yfcd.exchangeToYfLag[self.exchange]
@@ -627,7 +942,10 @@ class PriceHistory:
                             expired = True
                         else:
                             raise e
-                    if expired:
+                    if expired and yfcm.IsReadOnly():
+                        # Can't refresh, so keep
+                        yfcm.MarkStale(self.ticker, self.cache_key)
+                    elif expired:
                         self.h = self.h.iloc[:idx0]
                         h_interval_dts = h_interval_dts[:idx0]
 
@@ -648,7 +966,15 @@ class PriceHistory:
                 f_repair[self.h['FetchDate'] > cutoff_dts] = False
                 if f_repair.any():
                     f_nfinal = f_nfinal | f_repair
-                for idx in np.where(f_nfinal)[0]:
+                idx_nfinal = np.where(f_nfinal)[0]
+                if len(idx_nfinal) > 0:
+                    try:
+                        expired[idx_nfinal] = yfct.IsPriceDatapointExpired_batch(h_interval_dts[idx_nfinal], self.h["FetchDate"].iloc[idx_nfinal], f_repair[idx_nfinal], max_age, self.exchange, self.interval, yf_lag=yf_lag, triggerExpiryOnClose=trigger_at_market_close)
+                        idx_nfinal = []
+                    except yfcd.TimestampOutsideIntervalException:
+                        # Some row outside exchange schedule, so check rows one-by-one
+                        pass
+                for idx in idx_nfinal:
                     # repaired = False
                     repaired = f_repair[idx]
                     h_interval_dt = h_interval_dts[idx]
@@ -656,18 +982,29 @@ class PriceHistory:
                     try:
                         expired_idx = yfct.IsPriceDatapointExpired(h_interval_dt, fetch_dt, repaired, max_age, self.exchange, self.interval, yf_lag=yf_lag, triggerExpiryOnClose=trigger_at_market_close)
                     except yfcd.TimestampOutsideIntervalException as e:
-                        if f_na[idx0]:
+                        if f_na[idx]:
                             # YFC must have inserted a row of NaNs, wrongly thinking exchange should have been open here.
                             expired_idx = True
                         else:
                             raise e
                     expired[idx] = expired_idx
-                if expired.any():
+                if expired.any() and yfcm.IsReadOnly():
+                    yfcm.MarkStale(self.ticker, self.cache_key)
+                elif expired.any():
                     self.h = self.h.drop(self.h.index[expired])
                     h_interval_dts = h_interval_dts[~expired]
             if self.h.empty:
                 self.h = None
 
+        if yfcm.IsReadOnly():
+            # Serve cached data as-is, never fetch
+            h_copy = None
+            if self.h is not None:
+                h_copy = self._sliceAndAdjust(start, end, start_dt, end_dt, adjust_splits, adjust_divs, copy)
+            if yfcl.IsTracingEnabled():
+                yfcl.TraceExit(f"PriceHistory-{self.istr}.get() returning read-only")
+            return h_copy
+
         ranges_to_fetch = []
         if self.h is None:
             # Simple, just fetch the requested data
@@ -906,6 +1243,7 @@ class PriceHistory:
                 # fetch "sparse" fairly contiguously.
                 # - apply split-adjustment
                 OHLC = ['Open', 'High', 'Low', 'Close']
+                self._ensureCachedPricesWritable()
                 csf = self.h['CSF'].to_numpy()
                 for c in OHLC:
                     self.h[c] *= csf
@@ -929,10 +1267,12 @@ class PriceHistory:
                 self._updatedCachedPrices(self.h)
 
         # Now prices have been repaired, can send out dividends
+        new_divs_pending = False
         cached_new_divs = yfcm.ReadCacheDatum(self.ticker, "new_divs")
         if self.interval == yfcd.Interval.Days1 and cached_new_divs is not None and not cached_new_divs.empty:
             cached_new_divs_locked = yfcm.ReadCacheMetadata(self.ticker, "new_divs", "locked")
             yfcl.TracePrint(f"cached_new_divs_locked = {cached_new_divs_locked}")
+            new_divs_pending = cached_new_divs_locked is not None
             if cached_new_divs_locked is None:
                 f_dups = cached_new_divs.index.duplicated()
                 if f_dups.any():
@@ -969,13 +1309,121 @@ class PriceHistory:
                     yfcl.TracePrint("releasing lock on cached_new_divs")
                     yfcm.StoreCacheDatum(self.ticker, "new_divs", None)  # delete
 
+        h_copy = self._sliceAndAdjust(start, end, start_dt, end_dt, adjust_splits, adjust_divs, copy)
+
+        if not trigger_at_market_close and not new_divs_pending:
+            # Expiry on market close not predictable, so no fast path
+            fresh_until = self._calcFreshUntil(dt_now, max_age, yf_lag)
+            if fresh_until is not None:
+                self._fresh[fresh_key] = (fresh_until, (start, end, start_dt, end_dt), self._getEventsSnapshot())
+
+        log_msg = f"PriceHistory-{self.istr}.get() returning"
+        if h_copy.empty:
+            log_msg += " empty df"
+        else:
+            log_msg += f" DF {h_copy.index[0]} -> {h_copy.index[-1]}"
+        if yfcl.IsTracingEnabled():
+            yfcl.TraceExit(log_msg)
+        elif debug_yfc:
+            print(log_msg)
+
+        return h_copy
+
+    @property
+    def h(self):
+        return self._h
+
+    @h.setter
+    def h(self, h):
+        self._h = h
+        self._hChanged()
+
+    def _hChanged(self):
+        # Cached prices changed, so fast-path entries & views are invalid.
+        # Views also record version, in case a change misses this.
+        self._fresh = {}
+        self._views = {}
+        self._h_version += 1
+
+    def _getFresh(self, fresh_key):
+        # Fast-path entry of a get() request, if still valid
+        fresh = self._fresh.get(fresh_key)
+        if fresh is None or self.h is None:
+            return None
+        fresh_until, slc, events = fresh
+        if pd.Timestamp.utcnow() < fresh_until and self._eventsUnchanged(events):
+            return fresh
+        return None
+
+    def _getView(self, fresh_key, view_key):
+        view = self._views.get((fresh_key, view_key))
+        if view is None:
+            return None
+        fresh, h_version, df = view
+        if fresh is not self._getFresh(fresh_key) or h_version != self._h_version:
+            # Table or events changed since view built
+            del self._views[(fresh_key, view_key)]
+            return None
+        return view
+
+    def GetView(self, view_key, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True):
+        # Table that caller built from an earlier get() with same arguments,
+        # valid while that get() would still take fast path.
+        fresh_key = (start, end, period, max_age, trigger_at_market_close, repair)
+        view = self._getView(fresh_key, view_key)
+        if view is None or view[2] is None:
+            return None
+        _CountFastPath("hits")
+        return view[2]
+
+    def IsViewRequested(self, view_key, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True):
+        # Whether view was stored, or only requested, since cached prices last changed
+        fresh_key = (start, end, period, max_age, trigger_at_market_close, repair)
+        return self._getView(fresh_key, view_key) is not None
+
+    def StoreView(self, view_key, df, start=None, end=None, period=None, max_age=None, trigger_at_market_close=False, repair=True):
+        # df=None only records that view was requested
+        fresh_key = (start, end, period, max_age, trigger_at_market_close, repair)
+        fresh = self._getFresh(fresh_key)
+        if fresh is not None:
+            self._views[(fresh_key, view_key)] = (fresh, self._h_version, df)
+
+    def _getEventsSnapshot(self):
+        return self.manager.GetHistory("Events").version
+
+    def _eventsUnchanged(self, snapshot):
+        return self.manager.GetHistory("Events").version == snapshot
+
+    def _calcFreshUntil(self, dt_now, max_age, yf_lag):
+        # Earliest time that a repeat get() could need to fetch: a non-final row expiring,
+        # a new interval opening, or date changing. Capped at max_age.
+        if self.h is None or self.h.empty:
+            return None
+        fresh_until = dt_now + max_age
+        f_nfinal = ~self.h["Final?"].to_numpy() | self.h["Repaired?"].to_numpy() | self.h["Close"].isna().to_numpy()
+        if f_nfinal.any():
+            fresh_until = min(fresh_until, self.h["FetchDate"][f_nfinal].min() + max_age)
+        try:
+            if self.interday:
+                next_open = yfct.GetTimestampNextSession(self.exchange, dt_now)["market_open"]
+            else:
+                next_open = yfct.GetTimestampNextInterval(self.exchange, dt_now, self.interval, ignore_breaks=True)["interval_open"]
+        except Exception:
+            return None
+        fresh_until = min(fresh_until, next_open + yf_lag)
+        midnight = datetime.combine(dt_now.date() + timedelta(days=1), time(0), ZoneInfo(self.tzName))
+        return min(fresh_until, midnight)
+
+    def _sliceAndAdjust(self, start, end, start_dt, end_dt, adjust_splits, adjust_divs, copy=True):
         if "Adj Close" in self.h.columns:
             raise Exception("Adj Close in self.h")
 
         if (start is not None) and (end is not None):
-            h_copy = self.h.loc[start_dt:end_dt-timedelta(milliseconds=1)].copy()
+            h_copy = self.h.loc[start_dt:end_dt-timedelta(milliseconds=1)]
         else:
-            h_copy = self.h.copy()
+            h_copy = self.h
+        if copy or adjust_splits or adjust_divs:
+            h_copy = h_copy.copy()
 
         if adjust_splits:
             for c in ["Open", "High", "Low", "Close", "Dividends"]:
@@ -987,16 +1435,6 @@ class PriceHistory:
                 h_copy[c] *= h_copy["CDF"]
             h_copy = h_copy.drop("CDF", axis=1)
 
-        log_msg = f"PriceHistory-{self.istr}.get() returning"
-        if h_copy.empty:
-            log_msg += " empty df"
-        else:
-            log_msg += f" DF {h_copy.index[0]} -> {h_copy.index[-1]}"
-        if yfcl.IsTracingEnabled():
-            yfcl.TraceExit(log_msg)
-        elif debug_yfc:
-            print(log_msg)
-
         return h_copy
 
     def _fetchAndAddRanges_contiguous(self, pstr, ranges_to_fetch, prepost, debug, quiet=False):
@@ -1291,11 +1729,38 @@ class PriceHistory:
         elif debug_yfc:
             print(log_msg)
 
-    def _verifyCachedPrices(self, rtol=0.0001, vol_rtol=0.004, correct=False, discard_old=False, quiet=True, debug=False):
+    def _getMonthChecksums(self, df):
+        # Checksum of each calendar month of rows, keyed by year*100+month
+        if df is None or df.empty:
+            return {}
+        row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+        months = df.index.year.to_numpy()*100 + df.index.month.to_numpy()
+        keys, starts = np.unique(months, return_index=True)
+        ends = np.append(starts[1:], len(months))
+        return {int(k): hashlib.sha1(row_hashes[i0:i1].tobytes()).hexdigest() for k, i0, i1 in zip(keys, starts, ends)}
+
+    def _recordVerifiedMonths(self, months):
+        # Remember checksum of months that matched Yahoo, so next verify
+        # can skip them if unchanged
+        if self.h is None or self.h.empty:
+            return
+        checksums = self._getMonthChecksums(self.h)
+        verified = yfcm.ReadCacheMetadata(self.ticker, self.cache_key, "Verified")
+        if verified is None:
+            verified = {}
+        verified = {m: v for m, v in verified.items() if checksums.get(m) == v[0]}
+        dt_now = pd.Timestamp.utcnow()
+        for m in months:
+            if m in checksums:
+                verified[int(m)] = (checksums[m], dt_now)
+        yfcm.WriteCacheMetadata(self.ticker, self.cache_key, "Verified", verified)
+
+    def _verifyCachedPrices(self, rtol=0.0001, vol_rtol=0.004, correct=False, discard_old=False, quiet=True, debug=False, incremental=True):
         yfcu.TypeCheckBool(correct, "correct")
         yfcu.TypeCheckBool(discard_old, "discard_old")
         yfcu.TypeCheckBool(quiet, "quiet")
         yfcu.TypeCheckBool(debug, "debug")
+        yfcu.TypeCheckBool(incremental, "incremental")
 
         if self.h is None or self.h.empty:
             return True
@@ -1326,6 +1791,19 @@ class PriceHistory:
         td_1d = pd.Timedelta("1D")
         dt_now = pd.Timestamp.utcnow().tz_convert(ZoneInfo("UTC"))
 
+        # Skip months unchanged since they last matched Yahoo
+        months = self.h.index.year.to_numpy()*100 + self.h.index.month.to_numpy()
+        verified = yfcm.ReadCacheMetadata(self.ticker, self.cache_key, "Verified") if incremental else None
+        if verified is not None:
+            checksums = self._getMonthChecksums(self.h)
+            months_unchanged = [m for m, v in verified.items() if checksums.get(m) == v[0]]
+            f_skip = np.isin(months, months_unchanged)
+            if f_skip.any():
+                if debug:
+                    msg = f"skipping {len(months_unchanged)} months unchanged since verified"
+                    yfcl.TracePrint(msg) if yfcl.IsTracingEnabled() else print(f"{self.ticker}: " + msg)
+                h = h[~f_skip]
+
         def _aggregate_yfdf_daily(df):
             df2 = df.copy()
             df2["_date"] = df2.index.date
@@ -1408,6 +1886,10 @@ class PriceHistory:
 
                 h = h.loc[fetch_start_min:]
 
+        # Months with every row checked in this pass
+        f_checked = self.h.index.isin(h.index)
+        months_checked = np.setdiff1d(months[f_checked], months[~f_checked])
+
         if not h.empty:
             # Fetch YF data
             start_dt = h.index[0]
@@ -1583,6 +2065,7 @@ class PriceHistory:
                 # yfcm.StoreCacheDatum(self.ticker, self.cache_key, h)
                 yfcm.StoreCacheDatum(self.ticker, self.cache_key, h_new)
                 self.h = self._getCachedPrices()
+            self._recordVerifiedMonths(months_checked)
 
             yfcl.TraceExit(f"PM::_verifyCachedPrices-{self.istr}() returning True")
             return True
@@ -1667,6 +2150,8 @@ class PriceHistory:
         if h_modified:
             yfcm.StoreCacheDatum(self.ticker, self.cache_key, h)
             self.h = self._getCachedPrices()
+        diff_dts = f_diff_all.index[f_diff_all.to_numpy()]
+        self._recordVerifiedMonths(np.setdiff1d(months_checked, diff_dts.year*100 + diff_dts.month))
 
         yfcl.TraceExit(f"PM::_verifyCachedPrices-{self.istr}() returning False")
         return False
@@ -3851,9 +4336,56 @@ class PriceHistory:
 
         return df
 
+    def _calcEventAdjustments(self, events, adj, last_adjust_col):
+        # Adjust row by event if row before event, and row last adjusted before event fetched.
+        # Returns per row: product of 'adj' of those events, and new last-adjust time.
+        # Also per event: first & last row adjusted, -1 if none.
+        # Rows last adjusted at same time share same events, so one cumulative pass per group.
+        def _utc(x):
+            return pd.DatetimeIndex(x).tz_convert("UTC").tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        row_dts = _utc(self.h.index)
+        last_adjust = _utc(self.h[last_adjust_col])
+        ev_dts = _utc(events.index)
+        ev_fetch = _utc(events["FetchDate"])
+
+        n = len(row_dts)
+        factors = np.ones(n)
+        last_adjust_new = last_adjust.copy()
+        idx_first = np.full(len(ev_dts), n)
+        idx_last = np.full(len(ev_dts), -1)
+
+        groups, inv = np.unique(last_adjust, return_inverse=True)
+        order = np.argsort(inv, kind="stable")
+        bounds = np.searchsorted(inv[order], np.arange(len(groups)+1))
+        for g in range(len(groups)):
+            f_ev = ev_fetch > groups[g]
+            if not f_ev.any():
+                continue
+            rows = order[bounds[g]:bounds[g+1]]
+            # Suffix product & max over events after each row
+            adj_sfx = np.append(np.cumprod(adj[f_ev][::-1])[::-1], 1.0)
+            fetch_sfx = np.append(np.maximum.accumulate(ev_fetch[f_ev][::-1])[::-1], groups[g])
+            k = np.searchsorted(ev_dts[f_ev], row_dts[rows], side="right")
+            factors[rows] = adj_sfx[k]
+            last_adjust_new[rows] = np.maximum(last_adjust[rows], fetch_sfx[k])
+
+            ev_idx = np.where(f_ev)[0]
+            nb = np.searchsorted(row_dts[rows], ev_dts[f_ev], side="left")
+            f = nb > 0
+            idx_first[ev_idx[f]] = np.minimum(idx_first[ev_idx[f]], rows[0])
+            idx_last[ev_idx[f]] = np.maximum(idx_last[ev_idx[f]], rows[nb[f]-1])
+
+        tz = self.h[last_adjust_col].dt.tz
+        last_adjust_new = pd.Series(pd.DatetimeIndex(last_adjust_new).tz_localize("UTC").tz_convert(tz), index=self.h.index)
+        return factors, last_adjust_new, idx_first, idx_last
+
     def _applyNewEvents(self):
         if self.h is None or self.h.empty:
             return
+        events_version = self.manager.GetHistory("Events").version
+        if self._events_version == events_version:
+            # Already adjusted for all events
+            return
 
         # debug = False
         # debug = True
@@ -3868,6 +4400,7 @@ class PriceHistory:
         lastSplitAdjustDt_min = self.h["LastSplitAdjustDt"].min()
         splits_since = self.manager.GetHistory("Events").GetSplitsFetchedSince(lastSplitAdjustDt_min)
         if splits_since is not None and not splits_since.empty:
+            self._ensureCachedPricesWritable()
             f_sup = splits_since["Superseded split"] != 0.0
             if f_sup.any():
                 for dt in splits_since.index[f_sup]:
@@ -3910,44 +4443,21 @@ class PriceHistory:
 
                         self.h.loc[f, "CSF"] *= split["Stock Splits"]
 
-            LastSplitAdjustDt_new = self.h["LastSplitAdjustDt"].copy()
-            for dt in splits_since.index:
-                split = splits_since.loc[dt]
-                f1 = self.h.index < dt
-                f2 = self.h["LastSplitAdjustDt"] < split["FetchDate"]
-                f = f1 & f2
-                if f.any():
-                    # msg = f"{self.ticker}: {self.istr}: Applying split {split['Stock Splits']} @ {dt.date()}"
-                    # indices = np.where(f)[0]
-                    # msg += f" across intervals "
-                    # if self.interday:
-                    #     msg += f"{self.h.index[indices[0]].date()} -> {self.h.index[indices[-1]].date()} (inc)"
-                    # else:
-                    #     msg += f"{self.h.index[indices[0]]} -> {self.h.index[indices[-1]]}"
-                    # msg += f" last CSF = {self.h['CSF'].iloc[indices[-1]]:.5f}"
-                    # if yfcl.IsTracingEnabled():
-                    #     yfcl.TracePrint(msg)
-                    # elif debug:
-                    #     print(f"{self.ticker}: " + msg)
-                    log_msg = f"{self.istr}: Applying split [dt={dt.date()} {split['Stock Splits']} fetch={split['FetchDate'].strftime('%Y-%m-%d %H:%M:%S%z')}]"
-                    indices = np.where(f)[0]
-                    log_msg += " across intervals "
-                    if self.interday:
-                        log_msg += f"{self.h.index[indices[0]].date()} -> {self.h.index[indices[-1]].date()} (inc)"
-                    else:
-                        log_msg += f"{self.h.index[indices[0]]} -> {self.h.index[indices[-1]]}"
-                    h_lastRow = self.h.loc[self.h.index[indices[-1]]]
-                    log_msg += f". Last CSF = {h_lastRow['CSF']:.5f} @ {h_lastRow['LastSplitAdjustDt'].strftime('%Y-%m-%d %H:%M:%S%z')}"
-                    self.manager.LogEvent("info", "PriceManager", log_msg)
-                    # if yfcl.IsTracingEnabled():
-                    #     yfcl.TracePrint(log_msg)
-                    # elif debug:
-                    #     print(f"{self.ticker}: "+log_msg)
-
-                    if isinstance(self.h["CSF"].iloc[0], (int, np.int64)):
-                        self.h["CSF"] = self.h["CSF"].astype(float)
-                    self.h.loc[f, "CSF"] /= split["Stock Splits"]
-                    LastSplitAdjustDt_new.loc[f] = np.maximum(LastSplitAdjustDt_new[f], split["FetchDate"])
+            splits_since = splits_since.sort_index()
+            factors, LastSplitAdjustDt_new, idx_first, idx_last = self._calcEventAdjustments(splits_since, splits_since["Stock Splits"].to_numpy(), "LastSplitAdjustDt")
+            for i in np.where(idx_last >= 0)[0]:
+                dt = splits_since.index[i]
+                split = splits_since.iloc[i]
+                log_msg = f"{self.istr}: Applying split [dt={dt.date()} {split['Stock Splits']} fetch={split['FetchDate'].strftime('%Y-%m-%d %H:%M:%S%z')}]"
+                log_msg += " across intervals "
+                if self.interday:
+                    log_msg += f"{self.h.index[idx_first[i]].date()} -> {self.h.index[idx_last[i]].date()} (inc)"
+                else:
+                    log_msg += f"{self.h.index[idx_first[i]]} -> {self.h.index[idx_last[i]]}"
+                h_lastRow = self.h.iloc[idx_last[i]]
+                log_msg += f". Last CSF = {h_lastRow['CSF']:.5f} @ {h_lastRow['LastSplitAdjustDt'].strftime('%Y-%m-%d %H:%M:%S%z')}"
+                self.manager.LogEvent("info", "PriceManager", log_msg)
+            self.h["CSF"] = self.h["CSF"].to_numpy(dtype=float) / factors
             self.h["LastSplitAdjustDt"] = LastSplitAdjustDt_new
 
             h_modified = True
@@ -3960,6 +4470,7 @@ class PriceHistory:
             lastDivAdjustDt_min = self.h["LastDivAdjustDt"].min()
         divs_since = self.manager.GetHistory("Events").GetDivsFetchedSince(lastDivAdjustDt_min)
         if divs_since is not None and not divs_since.empty:
+            self._ensureCachedPricesWritable()
             f_sup = divs_since["Superseded back adj."] != 0.0
             if f_sup.any():
                 for dt in divs_since.index[f_sup]:
@@ -4020,36 +4531,29 @@ class PriceHistory:
 
                         self.h.loc[f, "CDF"] /= div["Superseded back adj."]
 
-            LastDivAdjustDt_new = self.h["LastDivAdjustDt"].copy()
-            for dt in divs_since.index:
-                div = divs_since.loc[dt]
-                f1 = self.h.index < dt
-                f2 = self.h["LastDivAdjustDt"] < div["FetchDate"]
-                f = f1 & f2
-                if f.any():
-                    log_msg = f"{self.istr}: Applying div [dt={dt.date()} {div['Dividends']} adj={div['Back Adj.']:.5f} fetch={div['FetchDate'].strftime('%Y-%m-%d %H:%M:%S%z')}]"
-                    indices = np.where(f)[0]
-                    log_msg += " across intervals "
-                    if self.interday:
-                        log_msg += f"{self.h.index[indices[0]].date()} -> {self.h.index[indices[-1]].date()} (inc)"
-                    else:
-                        log_msg += f"{self.h.index[indices[0]]} -> {self.h.index[indices[-1]]}"
-                    h_lastRow = self.h.loc[self.h.index[indices[-1]]]
-                    log_msg += f". Last CDF = {h_lastRow['CDF']:.5f} @ {h_lastRow['LastDivAdjustDt'].strftime('%Y-%m-%d %H:%M:%S%z')}"
-                    self.manager.LogEvent("info", "PriceManager", log_msg)
-                    # if yfcl.IsTracingEnabled():
-                    #     yfcl.TracePrint(log_msg)
-                    # elif debug:
-                    #     print(f"{self.ticker}: "+log_msg)
-
-                    self.h.loc[f, "CDF"] *= div["Back Adj."]
-                    LastDivAdjustDt_new[f] = np.maximum(LastDivAdjustDt_new[f], div["FetchDate"])
+            divs_since = divs_since.sort_index()
+            factors, LastDivAdjustDt_new, idx_first, idx_last = self._calcEventAdjustments(divs_since, divs_since["Back Adj."].to_numpy(), "LastDivAdjustDt")
+            for i in np.where(idx_last >= 0)[0]:
+                dt = divs_since.index[i]
+                div = divs_since.iloc[i]
+                log_msg = f"{self.istr}: Applying div [dt={dt.date()} {div['Dividends']} adj={div['Back Adj.']:.5f} fetch={div['FetchDate'].strftime('%Y-%m-%d %H:%M:%S%z')}]"
+                log_msg += " across intervals "
+                if self.interday:
+                    log_msg += f"{self.h.index[idx_first[i]].date()} -> {self.h.index[idx_last[i]].date()} (inc)"
+                else:
+                    log_msg += f"{self.h.index[idx_first[i]]} -> {self.h.index[idx_last[i]]}"
+                h_lastRow = self.h.iloc[idx_last[i]]
+                log_msg += f". Last CDF = {h_lastRow['CDF']:.5f} @ {h_lastRow['LastDivAdjustDt'].strftime('%Y-%m-%d %H:%M:%S%z')}"
+                self.manager.LogEvent("info", "PriceManager", log_msg)
+            self.h["CDF"] = self.h["CDF"].to_numpy() * factors
             self.h["LastDivAdjustDt"] = LastDivAdjustDt_new
 
             h_modified = True
 
         if h_modified:
             self._updatedCachedPrices(self.h)
+        self._events_version = events_version
+        yfcm.WriteCacheMetadata(self.ticker, self.cache_key, "EventsVersion", events_version)
 
         log_msg = "PM::_applyNewEvents() returning"
         if yfcl.IsTracingEnabled():
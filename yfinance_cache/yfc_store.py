@@ -0,0 +1,277 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# Storage backends for cache files. Cache manager addresses files by their
+# directory-layout path, and backend decides where bytes actually live:
+# - DirectoryStore: one file per object, in one folder per ticker
+# - SqliteStore: all files as BLOB rows in one SQLite database (WAL mode)
+
+backends = ["directory", "sqlite"]
+
+# mkstemp() creates files readable only by owner, but cache may be shared,
+# so give files same permissions as open() would
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def _LockFile(f):
+    # Blocks until this process holds exclusive lock on open file 'f'
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after 10 seconds
+                pass
+
+
+def _UnlockFile(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def ConnectReadOnly(db_fp):
+    # Open SQLite database for reading, takes no locks that block other readers.
+    # A WAL database needs its -shm file, which cannot be created if folder
+    # is read-only e.g. a read-only mount. Then open as immutable: nothing
+    # can write there anyway.
+    conn = sqlite3.connect(f"file:{db_fp}?mode=ro", uri=True, isolation_level=None, check_same_thread=False, timeout=30)
+    try:
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    except sqlite3.OperationalError:
+        conn.close()
+        conn = sqlite3.connect(f"file:{db_fp}?mode=ro&immutable=1", uri=True, isolation_level=None, check_same_thread=False, timeout=30)
+    return conn
+
+
+class DirectoryStore:
+    name = "directory"
+
+    def __init__(self, root):
+        self.root = root
+
+    def close(self):
+        pass
+
+    def local_path(self, fp):
+        # Real file path, e.g. for memory-mapping
+        return fp
+
+    def isfile(self, fp):
+        return os.path.isfile(fp)
+
+    def isdir(self, dp):
+        return os.path.isdir(dp)
+
+    def makedirs(self, dp):
+        os.makedirs(dp, exist_ok=True)
+
+    def listdir(self, dp):
+        if not os.path.isdir(dp):
+            return []
+        return os.listdir(dp)
+
+    def stat(self, fp):
+        # Returns (mtime_ns, size, version)
+        st = os.stat(fp)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def getsize(self, fp):
+        return os.path.getsize(fp)
+
+    def read(self, fp):
+        with open(fp, 'rb') as inData:
+            return inData.read()
+
+    def read_range(self, fp, offset, length):
+        with open(fp, 'rb') as inData:
+            inData.seek(offset)
+            return inData.read(length)
+
+    def write(self, fp, data):
+        # Write to temporary file then rename, so readers never see partial file
+        dp = os.path.dirname(fp)
+        os.makedirs(dp, exist_ok=True)
+        # Temporary file name unique per writer, as processes can write same file
+        fd, tmp_fp = tempfile.mkstemp(dir=dp, prefix=os.path.basename(fp) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as outData:
+                outData.write(data)
+            os.chmod(tmp_fp, 0o666 & ~_umask)
+            os.replace(tmp_fp, fp)
+        except BaseException:
+            if os.path.isfile(tmp_fp):
+                os.remove(tmp_fp)
+            raise
+
+    def update(self, fp, fn):
+        # Read-modify-write safe against other processes: fn(old bytes or None)
+        # returns new bytes, or None to leave file unchanged.
+        # Writers lock a separate file, as write() replaces the file itself.
+        lock_fp = os.path.join(self.root, "_YFC_", "locks", os.path.relpath(fp, self.root) + ".lock")
+        self.makedirs(os.path.dirname(lock_fp))
+        with open(lock_fp, 'a+b') as lf:
+            _LockFile(lf)
+            try:
+                data = fn(self.read(fp) if os.path.isfile(fp) else None)
+                if data is not None:
+                    self.write(fp, data)
+            finally:
+                _UnlockFile(lf)
+
+    def remove(self, fp):
+        os.remove(fp)
+
+    def rmtree(self, dp):
+        if os.path.isdir(dp):
+            shutil.rmtree(dp)
+
+    def prune_dirs(self, dp):
+        # Remove empty directories under and including 'dp'
+        if not os.path.isdir(dp):
+            return
+        for root, dirs, files in os.walk(dp, topdown=False):
+            if len(os.listdir(root)) == 0:
+                os.rmdir(root)
+
+
+class SqliteStore:
+    name = "sqlite"
+
+    def __init__(self, root, db_fp, read_only=False):
+        self.root = root
+        self.db_fp = db_fp
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = ConnectReadOnly(db_fp)
+            return
+        dp = os.path.dirname(db_fp)
+        if not os.path.isdir(dp):
+            os.makedirs(dp)
+        self._conn = sqlite3.connect(db_fp, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # AUTOINCREMENT so replacing a row always gives new id, used as file version
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL UNIQUE, data BLOB NOT NULL, mtime_ns INTEGER NOT NULL)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _key(self, fp):
+        return os.path.relpath(fp, self.root).replace(os.sep, '/')
+
+    def _prefix_args(self, dp):
+        # Range covering all keys under directory: '/' sorts just before '0'
+        k = self._key(dp)
+        return (k + '/', k + '0')
+
+    def local_path(self, fp):
+        return None
+
+    def isfile(self, fp):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM files WHERE path=?", (self._key(fp),)).fetchone()
+        return row is not None
+
+    def isdir(self, dp):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM files WHERE path>=? AND path<? LIMIT 1", self._prefix_args(dp)).fetchone()
+        return row is not None
+
+    def makedirs(self, dp):
+        # Directories are implicit in paths
+        pass
+
+    def listdir(self, dp):
+        k = self._key(dp)
+        if k == '.':
+            q, args, n = "SELECT DISTINCT substr(path, 1, instr(path, '/')-1) FROM files", (), 0
+        else:
+            q, args, n = "SELECT path FROM files WHERE path>=? AND path<?", self._prefix_args(dp), len(k)+1
+        with self._lock:
+            rows = self._conn.execute(q, args).fetchall()
+        return sorted(set([r[0][n:].split('/')[0] for r in rows]))
+
+    def stat(self, fp):
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, length(data), id FROM files WHERE path=?", (self._key(fp),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(fp)
+        return tuple(row)
+
+    def getsize(self, fp):
+        return self.stat(fp)[1]
+
+    def read(self, fp):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM files WHERE path=?", (self._key(fp),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(fp)
+        return row[0]
+
+    def read_range(self, fp, offset, length):
+        with self._lock:
+            row = self._conn.execute("SELECT substr(data, ?, ?) FROM files WHERE path=?", (offset+1, length, self._key(fp))).fetchone()
+        if row is None:
+            raise FileNotFoundError(fp)
+        return row[0]
+
+    def write(self, fp, data):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files (path, data, mtime_ns) VALUES (?,?,?)", (self._key(fp), sqlite3.Binary(data), time.time_ns()))
+
+    def write_many(self, items):
+        # items = [(fp, data), ...], written in one transaction
+        now = time.time_ns()
+        rows = [(self._key(fp), sqlite3.Binary(data), now) for fp, data in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO files (path, data, mtime_ns) VALUES (?,?,?)", rows)
+            self._conn.execute("COMMIT")
+
+    def update(self, fp, fn):
+        # Read-modify-write in one transaction, which blocks other writers
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM files WHERE path=?", (self._key(fp),)).fetchone()
+                data = fn(None if row is None else row[0])
+                if data is not None:
+                    self._conn.execute("INSERT OR REPLACE INTO files (path, data, mtime_ns) VALUES (?,?,?)", (self._key(fp), sqlite3.Binary(data), time.time_ns()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, fp):
+        with self._lock:
+            n = self._conn.execute("DELETE FROM files WHERE path=?", (self._key(fp),)).rowcount
+        if n == 0:
+            raise FileNotFoundError(fp)
+
+    def rmtree(self, dp):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path>=? AND path<?", self._prefix_args(dp))
+
+    def prune_dirs(self, dp):
+        # Directories are implicit in paths
+        pass
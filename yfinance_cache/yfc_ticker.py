@@ -12,7 +12,6 @@ import pandas as pd
 import datetime
 from dateutil.relativedelta import relativedelta
 from zoneinfo import ZoneInfo
-import os
 import re
 # from time import perf_counter
 
@@ -80,7 +79,8 @@ class Ticker:
                 keepna=False,
                 proxy=None, rounding=False,
                 debug=True, quiet=False,
-                trigger_at_market_close=False):
+                trigger_at_market_close=False,
+                copy=True, columns=None):
 
         # t0 = perf_counter()
 
@@ -160,6 +160,13 @@ class Ticker:
         if start_dt is not None and end_dt is not None and start_dt >= end_dt:
             raise ValueError("start must be < end")
 
+        if columns is not None:
+            if isinstance(columns, str):
+                columns = [columns]
+            columns = list(columns)
+            if "Adj Close" in columns and adjust_divs:
+                raise ValueError("'Adj Close' only available if adjust_divs=False")
+
         if debug_yfc:
             print("- start_dt={} , end_dt={}".format(start_dt, end_dt))
 
@@ -230,11 +237,23 @@ class Ticker:
 
         hist = self._histories_manager.GetHistory(interval)
         if period is not None:
-            h = hist.get(start=None, end=None, period=period, max_age=max_age, trigger_at_market_close=trigger_at_market_close, quiet=quiet)
+            get_args = {"start": None, "end": None, "period": period}
         elif interday:
-            h = hist.get(start_d, end_d, period=None, max_age=max_age, trigger_at_market_close=trigger_at_market_close, quiet=quiet)
+            get_args = {"start": start_d, "end": end_d, "period": None}
         else:
-            h = hist.get(start_dt, end_dt, period=None, max_age=max_age, trigger_at_market_close=trigger_at_market_close, quiet=quiet)
+            get_args = {"start": start_dt, "end": end_dt, "period": None}
+        get_args["max_age"] = max_age
+        get_args["trigger_at_market_close"] = trigger_at_market_close
+
+        # Repeat request & cached prices unchanged = reuse table presented last time
+        view_key = (start_dt, end_dt, keepna, adjust_splits, adjust_divs, rounding, None if columns is None else tuple(columns))
+        h = hist.GetView(view_key, **get_args)
+        if h is not None:
+            yfcl.TraceExit("Ticker::history() returning cached view")
+            return h.copy() if copy else h
+
+        # Cached prices only read until adjusted into new table
+        h = hist.get(**get_args, quiet=quiet, copy=False)
         if (h is None) or h.shape[0] == 0:
             msg = f"YFC: history() exiting without price data (tkr={self.ticker}"
             if start_dt is not None or end_dt is not None:
@@ -247,48 +266,80 @@ class Ticker:
 
         # t2_sync = perf_counter()
 
-        f_dups = h.index.duplicated()
-        if f_dups.any():
-            raise Exception("{}: These timepoints have been duplicated: {}".format(self.ticker, h.index[f_dups]))
+        if yfcm.IsStrictMode():
+            # Cached prices validated when written
+            f_dups = h.index.duplicated()
+            if f_dups.any():
+                raise Exception("{}: These timepoints have been duplicated: {}".format(self.ticker, h.index[f_dups]))
 
         # Present table for user:
         h_copied = False
         if (start_dt is not None) and (end_dt is not None):
-            h = h.loc[start_dt:end_dt-datetime.timedelta(milliseconds=1)].copy()
-            h_copied = True
+            h = h.loc[start_dt:end_dt-datetime.timedelta(milliseconds=1)]
 
+        mask_nan_or_zero = None
         if not keepna:
             price_data_cols = [c for c in yfcd.yf_data_cols if c in h.columns]
             mask_nan_or_zero = (np.isnan(h[price_data_cols].to_numpy()) | (h[price_data_cols].to_numpy() == 0)).all(axis=1)
-            if mask_nan_or_zero.any():
-                h = h.drop(h.index[mask_nan_or_zero])
-                h_copied = True
+            if not mask_nan_or_zero.any():
+                mask_nan_or_zero = None
+        if columns is not None:
+            missing = [c for c in columns if c not in h.columns and c != "Adj Close"]
+            if len(missing) > 0:
+                raise ValueError(f"columns {missing} not in price table")
+            # Copy only requested columns, plus what is needed to adjust them
+            load_cols = [c for c in columns if c != "Adj Close"]
+            ohlc = ["Open", "High", "Low", "Close"]
+            if "Adj Close" in columns or (rounding and any([c in load_cols for c in ohlc])):
+                load_cols.append("Close")
+            if adjust_splits and any([c in load_cols for c in ohlc+["Dividends", "Volume"]]):
+                load_cols.append("CSF")
+            if "Adj Close" in columns or (adjust_divs and any([c in load_cols for c in ohlc])):
+                load_cols.append("CDF")
+            load_cols = list(dict.fromkeys(load_cols))
+            if mask_nan_or_zero is None:
+                h = h[load_cols]
+            else:
+                h = h.loc[~mask_nan_or_zero, load_cols]
+            h_copied = True
+        elif mask_nan_or_zero is not None:
+            h = h.drop(h.index[mask_nan_or_zero])
+            h_copied = True
         # t3_filter = perf_counter()
 
         if h.shape[0] == 0:
             h = None
         else:
-            if adjust_splits:
+            if adjust_splits and "CSF" in h.columns:
                 if not h_copied:
                     h = h.copy()
+                    h_copied = True
                 for c in ["Open", "Close", "Low", "High", "Dividends"]:
-                    h[c] = np.multiply(h[c].to_numpy(), h["CSF"].to_numpy())
-                h["Volume"] = np.round(np.divide(h["Volume"].to_numpy(), h["CSF"].to_numpy()), 0).astype('int')
+                    if c in h.columns:
+                        h[c] = np.multiply(h[c].to_numpy(), h["CSF"].to_numpy())
+                if "Volume" in h.columns:
+                    h["Volume"] = np.round(np.divide(h["Volume"].to_numpy(), h["CSF"].to_numpy()), 0).astype('int')
             if adjust_divs:
+                if "CDF" in h.columns:
+                    if not h_copied:
+                        h = h.copy()
+                        h_copied = True
+                    for c in ["Open", "Close", "Low", "High"]:
+                        if c in h.columns:
+                            h[c] = np.multiply(h[c].to_numpy(), h["CDF"].to_numpy())
+            elif columns is None or "Adj Close" in columns:
                 if not h_copied:
                     h = h.copy()
-                for c in ["Open", "Close", "Low", "High"]:
-                    h[c] = np.multiply(h[c].to_numpy(), h["CDF"].to_numpy())
-            else:
-                if not h_copied:
-                    h = h.copy()
+                    h_copied = True
                 h["Adj Close"] = np.multiply(h["Close"].to_numpy(), h["CDF"].to_numpy())
-            h = h.drop(["CSF", "CDF"], axis=1)
+            if columns is None:
+                h = h.drop(["CSF", "CDF"], axis=1)
 
-            if rounding:
+            if rounding and "Close" in h.columns:
                 # Round to 4 sig-figs
                 if not h_copied:
                     h = h.copy()
+                    h_copied = True
                 f_na = h["Close"].isna()
                 na = f_na.any()
                 if na:
@@ -299,12 +350,16 @@ class Ticker:
                 else:
                     last_close = h["Close"].iloc[-1]
                 rnd = yfcu.CalculateRounding(last_close, 4)
-                for c in ["Open", "Close", "Low", "High"]:
+                for c in [c for c in ["Open", "Close", "Low", "High"] if c in h.columns]:
                     if na:
                         h.loc[f_nna, c] = np.round(h.loc[f_nna, c].to_numpy(), rnd)
                     else:
                         h[c] = np.round(h[c].to_numpy(), rnd)
 
+            if columns is not None and list(h.columns) != columns:
+                # Discard columns only loaded to adjust
+                h = h[columns]
+
             if debug_yfc:
                 print("- h:")
                 cols = [c for c in ["Close", "Dividends", "Volume", "CDF", "CSF"] if c in h.columns]
@@ -331,6 +386,24 @@ class Ticker:
         # t_adjust *= 100/t_sum
         # print("TIME %:        setup={:.1f}%  sync={:.1f}%  filter={:.1f}%  adjust={:.1f}%".format(t_setup, t_sync, t_filter, t_adju
 
+        if h is not None:
+            # Stored view is shared with later calls, so protect from in-place writes.
+            # Table just built is not shared yet, so on a miss return it without
+            # copying, unless caller's in-place writes could reach stored view.
+            if not copy:
+                h = yfcu.SetReadOnly(h)
+                hist.StoreView(view_key, h, **get_args)
+            elif yfcu.IsCopyOnWrite():
+                # Writes to either table copy first
+                hist.StoreView(view_key, yfcu.SetReadOnly(h), **get_args)
+            elif hist.IsViewRequested(view_key, **get_args):
+                # Repeat request, so worth a copy to serve later repeats
+                hist.StoreView(view_key, yfcu.SetReadOnly(h), **get_args)
+                h = h.copy()
+            else:
+                # Only keep view if requested again
+                hist.StoreView(view_key, None, **get_args)
+
         return h
 
     def _getCachedPrices(self, interval, proxy=None):
@@ -347,7 +420,7 @@ class Ticker:
 
     def _getExchangeAndTz(self):
         if self._tz is not None and self._exchange is not None:
-            return self._tz, self._exchange
+            return self._exchange, self._tz
 
         exchange, tz_name = None, None
         try:
@@ -367,9 +440,9 @@ class Ticker:
             raise Exception(f"{self.ticker}: exchange and timezone not available")
         self._tz = tz_name
         self._exchange = exchange
-        return self._tz, self._exchange
+        return self._exchange, self._tz
 
-    def verify_cached_prices(self, rtol=0.0001, vol_rtol=0.005, correct=False, discard_old=False, quiet=True, debug=False, debug_interval=None):
+    def verify_cached_prices(self, rtol=0.0001, vol_rtol=0.005, correct=False, discard_old=False, quiet=True, debug=False, debug_interval=None, incremental=True):
         if debug:
             quiet = False
         if debug_interval is not None and isinstance(debug_interval, str):
@@ -394,7 +467,7 @@ class Ticker:
         # First verify 1d
         dt0 = self._histories_manager.GetHistory(interval)._getCachedPrices().index[0]
         self.history(start=dt0.date(), quiet=quiet, trigger_at_market_close=True)  # ensure have all dividends
-        v = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug)
+        v = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug, incremental)
         if debug_interval == yfcd.Interval.Days1:
             yfcl.TraceExit(f"Ticker::verify_cached_prices() returning {v} (1st pass)")
             return v
@@ -407,7 +480,7 @@ class Ticker:
             self.history(start=dt0.date(), quiet=quiet)
 
             # repeat verification, because 'fetch backporting' may be buggy
-            v2 = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug)
+            v2 = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug, incremental)
             if not v2 and debug:
                 yfcl.TraceExit(f"Ticker::verify_cached_prices() returning {v2} (post-correction)")
                 return v2
@@ -433,9 +506,9 @@ class Ticker:
                 continue
             istr = yfcd.intervalToString[interval]
             cache_key = "history-"+istr
-            if not yfcm.IsDatumCached(self.ticker, cache_key):
+            if not yfcm.IsDatumCached(self.ticker, cache_key) and not self._isIntervalDerived(interval):
                 continue
-            vi = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug)
+            vi = self._verify_cached_prices_interval(interval, rtol, vol_rtol, correct, discard_old, quiet, debug, incremental)
             yfcl.TracePrint(f"{istr}: vi={vi}")
 
             if not vi and correct:
@@ -449,7 +522,7 @@ class Ticker:
 
         return v
 
-    def _verify_cached_prices_interval(self, interval, rtol=0.0001, vol_rtol=0.005, correct=False, discard_old=False, quiet=True, debug=False):
+    def _verify_cached_prices_interval(self, interval, rtol=0.0001, vol_rtol=0.005, correct=False, discard_old=False, quiet=True, debug=False, incremental=True):
         if debug:
             quiet = False
 
@@ -463,7 +536,7 @@ class Ticker:
 
         istr = yfcd.intervalToString[interval]
         cache_key = "history-"+istr
-        if not yfcm.IsDatumCached(self.ticker, cache_key):
+        if not yfcm.IsDatumCached(self.ticker, cache_key) and not self._isIntervalDerived(interval):
             return True
 
         yfcl.TraceEnter(f"Ticker::_verify_cached_prices_interval(tkr={self.ticker}, {fn_locals})")
@@ -472,11 +545,15 @@ class Ticker:
             exchange, tz_name = self._getExchangeAndTz()
             self._histories_manager = yfcp.HistoriesManager(self.ticker, exchange, tz_name, self.session, proxy=None)
 
-        v = self._histories_manager.GetHistory(interval)._verifyCachedPrices(rtol, vol_rtol, correct, discard_old, quiet, debug)
+        v = self._histories_manager.GetHistory(interval)._verifyCachedPrices(rtol, vol_rtol, correct, discard_old, quiet, debug, incremental)
 
         yfcl.TraceExit(f"Ticker::_verify_cached_prices_interval() returning {v}")
         return v
 
+    def _isIntervalDerived(self, interval):
+        # Aggregated from 1d, so verify against Yahoo's aggregates
+        return yfcm.IsDeriveIntervalsEnabled() and interval in yfcp.derived_intervals and yfcm.IsDatumCached(self.ticker, "history-1d")
+
     def _process_user_dt(self, dt):
         d = None
         exchange, tz_name = self._getExchangeAndTz()
@@ -515,7 +592,7 @@ class Ticker:
             self._info, md = yfcm.ReadCacheDatum(self.ticker, "info", True)
             if 'FetchDate' not in self._info.keys():
                 fp = yfcm.GetFilepath(self.ticker, 'info')
-                mod_dt = datetime.datetime.fromtimestamp(os.path.getmtime(fp))
+                mod_dt = yfcm.GetFileModifiedTime(fp)
                 self._info['FetchDate'] = mod_dt
                 yfcm.WriteCacheMetadata(self.ticker, "info", 'LastCheck', mod_dt)
 
@@ -527,6 +604,9 @@ class Ticker:
                 yfcm.WriteCacheMetadata(self.ticker, "info", 'LastCheck', md['LastCheck'])
             if max(self._info['FetchDate'], md['LastCheck']) + max_age > pd.Timestamp.now():
                 return self._info
+            if yfcm.IsReadOnly():
+                yfcm.MarkStale(self.ticker, "info")
+                return self._info
 
         i = self.dat.info
         i['FetchDate'] = pd.Timestamp.now()
@@ -892,11 +972,14 @@ class Ticker:
                 self._calendar = yfcm.ReadCacheDatum(self.ticker, "calendar")
                 if 'FetchDate' not in self._calendar.keys():
                     fp = yfcm.GetFilepath(self.ticker, 'info')
-                    mod_dt = datetime.datetime.fromtimestamp(os.path.getmtime(fp))
+                    mod_dt = yfcm.GetFileModifiedTime(fp)
                     self._calendar['FetchDate'] = mod_dt
 
         if (self._calendar is not None) and (self._calendar['FetchDate'] + max_age) > pd.Timestamp.now():
             return self._calendar
+        if (self._calendar is not None) and yfcm.IsReadOnly():
+            yfcm.MarkStale(self.ticker, "calendar")
+            return self._calendar
 
         c = self.dat.calendar
         c['FetchDate'] = pd.Timestamp.now()
@@ -974,12 +1057,15 @@ class Ticker:
         return self._yf_lag
 
 
-def verify_cached_tickers_prices(session=None, rtol=0.0001, vol_rtol=0.005, correct=False, halt_on_fail=True, resume_from_tkr=None, debug_tkr=None, debug_interval=None):
+def verify_cached_tickers_prices(session=None, rtol=0.0001, vol_rtol=0.005, correct=False, halt_on_fail=True, resume_from_tkr=None, debug_tkr=None, debug_interval=None, incremental=True):
     """
     :Parameters:
         session:
             Recommend providing a 'requests_cache' session, in case
             you have to abort and resume verification (likely).
+        incremental: bool
+            Skip months of prices unchanged since they last matched Yahoo.
+            False to verify everything.
         resume_from_tkr: str
             Resume verification from this ticker (alphabetical order).
             Because maybe you had to abort verification partway.
@@ -993,8 +1079,7 @@ def verify_cached_tickers_prices(session=None, rtol=0.0001, vol_rtol=0.005, corr
             raise Exception("'debug_interval' if str must be one of: {}".format(yfcd.intervalStrToEnum.keys()))
         debug_interval = yfcd.intervalStrToEnum[debug_interval]
 
-    d = yfcm.GetCacheDirpath()
-    tkrs = [x for x in os.listdir(d) if not x.startswith("exchange-") and os.path.isdir(os.path.join(d, x)) and '_' not in x]
+    tkrs = yfcm.GetCachedTickers()
     # tkrs = tkrs[:5]
     # tkrs = tkrs[:20]
     # tkrs = tkrs[tkrs.index("DDOG"):]
@@ -1036,7 +1121,7 @@ def verify_cached_tickers_prices(session=None, rtol=0.0001, vol_rtol=0.005, corr
         dat = Ticker(tkr, session=session)
 
         try:
-            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=correct, discard_old=correct, quiet=not debug, debug=debug, debug_interval=debug_interval)
+            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=correct, discard_old=correct, quiet=not debug, debug=debug, debug_interval=debug_interval, incremental=incremental)
         except yfcd.NoPriceDataInRangeException as e:
             print(str(e) + " - is it delisted? Aborting verification so you can investigate.")
             return
@@ -1044,10 +1129,10 @@ def verify_cached_tickers_prices(session=None, rtol=0.0001, vol_rtol=0.005, corr
             return
 
         if correct:
-            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=correct, discard_old=False, quiet=not debug, debug=debug, debug_interval=debug_interval)
+            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=correct, discard_old=False, quiet=not debug, debug=debug, debug_interval=debug_interval, incremental=incremental)
 
         if not v:
-            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=False, discard_old=False, quiet=False, debug=True, debug_interval=debug_interval)
+            v = dat.verify_cached_prices(rtol=rtol, vol_rtol=vol_rtol, correct=False, discard_old=False, quiet=False, debug=True, debug_interval=debug_interval, incremental=incremental)
             if halt_on_fail:
                 raise Exception(f"{tkr}: verify failing")
             else:
@@ -1080,10 +1080,14 @@ def GetTimestampCurrentInterval_batch(exchange, ts, interval, discardTimes=None,
         t0 = ts[0]
         tl = ts[len(ts)-1]
         tis = GetExchangeScheduleIntervals(exchange, interval, t0-itd, tl+itd, ignore_breaks=ignore_breaks)
-        tz_tis = tis[0].left.tzinfo
-        if ts[0].tzinfo != tz_tis:
-            ts = [t.astimezone(tz_tis) for t in ts]
-        idx = tis.get_indexer(ts)
+        if tis is None:
+            # Exchange closed throughout
+            idx = np.full(n, -1)
+        else:
+            tz_tis = tis[0].left.tzinfo
+            if ts[0].tzinfo != tz_tis:
+                ts = [t.astimezone(tz_tis) for t in ts]
+            idx = tis.get_indexer(ts)
         f = idx != -1
 
         intervals = pd.DataFrame(index=ts)
@@ -1784,6 +1788,114 @@ def IsPriceDatapointExpired(intervalStart, fetch_dt, repaired, max_age, exchange
     return False
 
 
+def IsPriceDatapointExpired_batch(intervalStart, fetch_dt, repaired, max_age, exchange, interval, ignore_breaks=False, triggerExpiryOnClose=True, yf_lag=None, dt_now=None):
+    # Array version of IsPriceDatapointExpired(), same logic but schedule lookups done once
+    if isinstance(intervalStart, list):
+        intervalStart = np.array(intervalStart)
+    yfcu.TypeCheckNpArray(intervalStart, "intervalStart")
+    if len(intervalStart) > 0:
+        yfcu.TypeCheckIntervalDt(intervalStart[0], interval, "intervalStart", strict=False)
+    yfcu.TypeCheckTimedelta(max_age, "max_age")
+    yfcu.TypeCheckStr(exchange, "exchange")
+    yfcu.TypeCheckInterval(interval, "interval")
+    yfcu.TypeCheckBool(triggerExpiryOnClose, "triggerExpiryOnClose")
+
+    n = len(intervalStart)
+    if n == 0:
+        return np.array([], dtype=bool)
+    if len(fetch_dt) != n:
+        raise ValueError(f"'fetch_dt' length {len(fetch_dt)} != 'intervalStart' length {n}")
+    repaired = np.broadcast_to(np.asarray(repaired, dtype=bool), (n,))
+
+    tz = ZoneInfo(GetExchangeTzName(exchange))
+    if dt_now is not None:
+        yfcu.TypeCheckDatetime(dt_now, "dt_now")
+        dt_now = pd.Timestamp(dt_now).tz_convert(tz)
+    else:
+        dt_now = pd.Timestamp.utcnow().tz_convert(tz)
+    if yf_lag is not None:
+        yfcu.TypeCheckTimedelta(yf_lag, "yf_lag")
+    else:
+        yf_lag = GetExchangeDataDelay(exchange)
+
+    fetch_dt = pd.DatetimeIndex(pd.to_datetime(fetch_dt, utc=True)).tz_convert(tz)
+
+    # Interval lookups on sorted unique starts, then map back
+    starts, inv = np.unique(intervalStart, return_inverse=True)
+    intervals = GetTimestampCurrentInterval_batch(exchange, starts, interval, ignore_breaks=ignore_breaks)
+    f_na = intervals["interval_open"].isna().to_numpy()
+    if f_na.any():
+        raise yfcd.TimestampOutsideIntervalException(exchange, interval, starts[np.where(f_na)[0][0]])
+    intervalEnd = intervals["interval_close"]
+    if isinstance(intervalEnd.iloc[0], datetime):
+        intervalEnd_d = np.array([x.astimezone(tz).date() for x in intervalEnd])[inv]
+        intervalEnd = pd.DatetimeIndex(pd.to_datetime(intervalEnd, utc=True)).tz_convert(tz)[inv]
+    else:
+        intervalEnd_d = intervalEnd.to_numpy()[inv]
+        intervalEnd = pd.DatetimeIndex([pd.Timestamp(d) for d in intervalEnd_d]).tz_localize(tz)
+
+    lastDataDt = CalcIntervalLastDataDt_batch(exchange, starts, interval, ignore_breaks=ignore_breaks, yf_lag=yf_lag)
+    lastDataDt = pd.DatetimeIndex(pd.to_datetime(lastDataDt, utc=True)).tz_convert(tz)[inv]
+    f = lastDataDt.isna()
+    if f.any():
+        # Exchange closed during interval, so data cannot update after it
+        lastDataDt = lastDataDt.where(~f, intervalEnd + yf_lag)
+    lastDataDt = lastDataDt + pd.to_timedelta(np.where(repaired, 7, 0), unit='D')
+
+    # Fetched after last Yahoo update = not expired
+    if interval in [yfcd.Interval.Days1, yfcd.Interval.Week]:
+        f_closed = np.asarray(fetch_dt >= lastDataDt)
+    else:
+        f_closed = np.asarray(fetch_dt > lastDataDt)
+
+    expire_dt = fetch_dt + max_age
+    f_aged = np.asarray(expire_dt <= dt_now) & ~f_closed
+    expired = np.full(n, False)
+    if f_aged.any():
+        sched = GetExchangeSchedule(exchange, (expire_dt[f_aged].min() - yf_lag).date(), dt_now.date() + timedelta(days=1))
+        if sched is None:
+            opens = pd.DatetimeIndex([], tz=tz)
+            closes = closes_ivl = opens
+        else:
+            opens = pd.DatetimeIndex(sched["open"]).tz_convert(tz)
+            closes = pd.DatetimeIndex(sched["close"]).tz_convert(tz)
+            closes_ivl = closes
+            if "auction" in sched.columns:
+                # Match IsTimestampInActiveSession() & GetExchangeScheduleIntervals()
+                auction_close = pd.DatetimeIndex(sched["auction"]).tz_convert(tz) + yfcd.exchangeAuctionDuration[exchange]
+                closes = closes.where(~(auction_close > closes), auction_close)
+                closes_ivl = auction_close
+
+        def _in_session(ts):
+            idx = opens.searchsorted(ts, side="right") - 1
+            f = idx >= 0
+            f[f] = ts[f] < closes[idx[f]]
+            return f
+
+        f_active = _in_session(expire_dt - yf_lag)
+        f_active = f_active | _in_session(pd.DatetimeIndex([dt_now - yf_lag]))[0]
+
+        # Any session wholly between expire_dt and dt_now
+        f_sesh_done = np.asarray((closes_ivl <= dt_now) & (opens <= pd.Timestamp.utcnow()))
+        f_sesh_after = np.flip(np.logical_or.accumulate(np.flip(f_sesh_done)))
+        idx = opens.searchsorted(expire_dt, side="left")
+        f_traded = np.full(n, False)
+        f_in = idx < len(opens)
+        f_traded[f_in] = f_sesh_after[idx[f_in]]
+        f_traded = f_traded & np.asarray(expire_dt < dt_now)
+
+        expired = f_aged & (f_active | f_traded)
+
+    if triggerExpiryOnClose:
+        f_trigger = np.asarray((fetch_dt < lastDataDt) & (lastDataDt <= dt_now))
+        if interval in [yfcd.Interval.Days1, yfcd.Interval.Week]:
+            fetch_d = np.array([x.date() for x in fetch_dt])
+            f_trigger = f_trigger | ((fetch_d <= intervalEnd_d) & (dt_now.date() > intervalEnd_d))
+        expired = expired | (f_trigger & ~f_closed)
+
+    return expired
+
+
 def IdentifyMissingIntervals(exchange, start, end, interval, knownIntervalStarts, week7days=True, ignore_breaks=False):
     yfcu.TypeCheckStr(exchange, "exchange")
     yfcu.TypeCheckDateEasy(start, "start")
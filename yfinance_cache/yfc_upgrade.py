@@ -1,8 +1,15 @@
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
 
 from . import yfc_cache_manager as yfcm
+from . import yfc_utils as yfcu
 
 def _init_options():
+    if yfcm.IsReadOnly():
+        return
     d = yfcm.GetCacheDirpath()
     yfc_dp = os.path.join(d, "_YFC_")
     state_fp = os.path.join(yfc_dp, "have-initialised-options")
@@ -25,3 +32,111 @@ def _init_options():
         os.makedirs(yfc_dp)
     with open(state_fp, 'w'):
         pass
+
+
+# Upgrades of cached objects between schema versions, see yfcm.schema_version.
+# Run offline over whole cache with MigrateCacheSchema(), so loads never pay for them.
+
+def _upgrade_data_v0(objectName, data):
+    if objectName.startswith("history-") and isinstance(data, pd.DataFrame) and not data.empty:
+        # Columns added since first versions
+        if "Repaired?" not in data.columns:
+            data["Repaired?"] = False
+        if "C-Check?" not in data.columns:
+            data["C-Check?"] = False
+        for c in ["LastDivAdjustDt", "LastSplitAdjustDt"]:
+            if c not in data.columns:
+                data[c] = data["FetchDate"]
+
+        # Repair NaN CDF, was done on every load
+        if "CDF" in data.columns and data["CDF"].isna().any():
+            data["CDF"] = data["CDF"].bfill().ffill()
+            if data["CDF"].isna().any():
+                raise Exception("CDF NaN repair failed")
+    return data
+
+_data_upgrades = {0: _upgrade_data_v0}
+
+
+def UpgradeData(objectName, data, schema):
+    # Upgrade object data from 'schema' version to current, in memory
+    for v in range(schema, yfcm.schema_version):
+        data = _data_upgrades[v](objectName, data)
+    return data
+
+
+def UpgradeDatum(ticker, objectName):
+    # Rewrite cached object if old schema, or not in current storage format.
+    # Returns True if rewritten.
+    schema = yfcm.GetCacheDatumSchema(ticker, objectName)
+    if schema == yfcm.schema_version and yfcm.IsDatumStorageCurrent(ticker, objectName):
+        return False
+    data = yfcm.ReadCacheDatum(ticker, objectName)
+    if data is None:
+        # Expired so deleted
+        return True
+    data = UpgradeData(objectName, data, schema)
+    if yfcm.IsObjectInPackedData(objectName):
+        yfcm.StoreCachePackedDatum(ticker, objectName, data)
+    else:
+        yfcm.StoreCacheDatum(ticker, objectName, data)
+    return True
+
+
+def _init_migrate_worker(cache_dp):
+    yfcm.SetCacheDirpath(cache_dp)
+
+
+def _migrate_ticker(ticker):
+    n = 0
+    for objectName in yfcm.ListCachedObjects(ticker):
+        if UpgradeDatum(ticker, objectName):
+            n += 1
+    return ticker, n
+
+
+def MigrateCacheSchema(processes=None, resume=True, progress=True):
+    """
+    Upgrade every cached object to current schema version and storage
+    options (price_format, codec), using a process pool over tickers.
+    Completed tickers are recorded, so an interrupted migration resumes
+    where it stopped unless resume=False.
+    Returns number of objects rewritten.
+    """
+    if yfcm.IsReadOnly():
+        raise Exception("Cache is read-only, cannot migrate")
+    d = yfcm.GetCacheDirpath()
+    yfc_dp = os.path.join(d, "_YFC_")
+    state_fp = os.path.join(yfc_dp, "schema-migration-progress.txt")
+
+    done = set()
+    if os.path.isfile(state_fp):
+        if resume:
+            with open(state_fp, 'r') as f:
+                done = set(f.read().split())
+        else:
+            os.remove(state_fp)
+    if not os.path.isdir(yfc_dp):
+        os.makedirs(yfc_dp)
+
+    # Build manifest now if missing, else every worker would try
+    tickers = yfcm.GetCachedTickers(include_exchanges=True)
+    tickers = [t for t in tickers if t not in done]
+
+    n = 0
+    # Spawn not fork, so workers don't inherit open SQLite connections
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx, initializer=_init_migrate_worker, initargs=(d,)) as pool, open(state_fp, 'a') as f:
+        futures = [pool.submit(_migrate_ticker, t) for t in tickers]
+        for i, future in enumerate(as_completed(futures)):
+            ticker, n_tkr = future.result()
+            n += n_tkr
+            f.write(ticker + '\n')
+            f.flush()
+            if progress:
+                yfcu.display_progress_bar(i + 1, len(tickers))
+    if progress:
+        print("")
+    os.remove(state_fp)
+    yfcm.ClearMemoryCache()
+    return n
@@ -184,6 +184,33 @@ def CalculateRounding(n, sigfigs):
         return sigfigs - GetSigFigs(round(n))
 
 
+def IsCopyOnWrite():
+    # Pandas 3 always Copy-on-Write, earlier versions if opted-in
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def SetReadOnly(df):
+    # Returns DataFrame sharing data with 'df', but in-place writes
+    # can't change that data.
+    if IsCopyOnWrite():
+        # Writes to shallow copy already copy first
+        return df.copy(deep=False)
+    # Else rebuild from read-only views of each column.
+    # Timezone-aware columns have no read-only numpy form, so copied.
+    cols = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.DatetimeTZDtype):
+            cols[c] = s.copy()
+        else:
+            a = s.to_numpy().view()
+            a.setflags(write=False)
+            cols[c] = a
+    return pd.DataFrame(cols, index=df.index, copy=False)
+
+
 def GetCSF0(df):
     if "Stock Splits" not in df:
         raise Exception("DataFrame does not contain column 'Stock Splits")